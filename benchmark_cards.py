@@ -0,0 +1,56 @@
+"""
+Benchmark de generación de cartillas de bingo
+Compara la creación individual con BingoCard() frente a la generación en lote
+y mide cuántas series de 6 cartillas (1-90 sin repetir) se generan por segundo
+"""
+
+import sys
+import time
+from bingo_card import (
+    BingoCard, generate_cards, generate_strips, get_layout_table, get_layouts_by_counts
+)
+
+
+def measure(func, repeat=3):
+    """Ejecuta func varias veces y retorna el mejor tiempo en segundos"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def bench_cards(num_cards):
+    """Compara BingoCard() en bucle contra generate_cards(n)"""
+    start = time.perf_counter()
+    table = get_layout_table()
+    print(f"Tabla de distribuciones: {len(table)} entradas en {time.perf_counter() - start:.3f}s")
+    
+    loop_time = measure(lambda: [BingoCard(card_id=i) for i in range(num_cards)])
+    batch_time = measure(lambda: generate_cards(num_cards))
+    
+    print(f"BingoCard() en bucle : {num_cards / loop_time:12,.0f} cartillas/s")
+    print(f"generate_cards(n)    : {num_cards / batch_time:12,.0f} cartillas/s")
+    print(f"Aceleración          : {loop_time / batch_time:.2f}x")
+
+
+def bench_strips(num_strips):
+    """Mide la generación de series de 6 cartillas"""
+    start = time.perf_counter()
+    groups = get_layouts_by_counts()
+    print(f"Distribuciones agrupadas: {len(groups)} firmas en {time.perf_counter() - start:.3f}s")
+    
+    strips_time = measure(lambda: generate_strips(num_strips))
+    print(f"generate_strips(n)   : {num_strips / strips_time:12,.0f} series/s")
+
+
+if __name__ == "__main__":
+    num_cards = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"=== Benchmark de cartillas ({num_cards} cartillas) ===\n")
+    bench_cards(num_cards)
+    num_strips = num_cards // 6
+    print(f"\n=== Benchmark de series ({num_strips} series) ===\n")
+    bench_strips(num_strips)
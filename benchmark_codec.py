@@ -0,0 +1,57 @@
+"""
+Benchmark de los códecs del protocolo (wire_codec)
+Compara JSON con el códec binario en bytes por partida y en tiempo de
+serialización/deserialización, usando los mensajes que envía el servidor a un
+jugador interactivo durante una partida completa de 90 bolas
+"""
+
+import random
+import sys
+from bingo_card import BingoCard
+from benchmark_cards import measure
+from wire_codec import decode, encode
+
+
+def game_messages(seed=0):
+    """Mensajes que recibe un jugador en una partida: estado, cartilla, 90 sorteos y marcas"""
+    rng = random.Random(seed)
+    card = BingoCard(card_id="ana")
+    order = rng.sample(range(1, 91), 90)
+    messages = [
+        {"type": "game_state", "game_started": True, "drawn_numbers": order[:30],
+         "current_number": order[29], "game_id": 1, "seq": 30, "total_players": 120, "game_mode": 90},
+        {"type": "assign_card", "card": card.to_dict()},
+        {"type": "assign_card", "card": card.to_packed_dict()},
+    ]
+    for seq, number in enumerate(order, 1):
+        messages.append({"type": "new_number", "game_id": 1, "seq": seq, "number": number})
+        if card.mark_number(number):
+            messages.append({"type": "mark_confirmed", "number": number,
+                             "marked_count": card.marked_count(), "total": card.total_numbers()})
+    messages.append({"type": "bingo_result", "valid": True, "player": "ana", "card": card.to_dict()})
+    return messages
+
+
+def bench_codec(codec, messages):
+    """Retorna (bytes totales, µs de encode por mensaje, µs de decode por mensaje)"""
+    frames = [encode(m, codec) for m in messages]
+    size = sum(len(f.encode('utf-8')) if isinstance(f, str) else len(f) for f in frames)
+    encode_time = measure(lambda: [encode(m, codec) for m in messages])
+    decode_time = measure(lambda: [decode(f) for f in frames])
+    per_message = 1e6 / len(messages)
+    return size, encode_time * per_message, decode_time * per_message
+
+
+if __name__ == "__main__":
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    messages = [m for seed in range(games) for m in game_messages(seed)]
+    print(f"=== Benchmark de códecs ({games} partidas, {len(messages)} mensajes) ===\n")
+    results = {codec: bench_codec(codec, messages) for codec in ("json", "binary")}
+    for codec, (size, encode_us, decode_us) in results.items():
+        print(f"{codec:7s}: {size / games:8,.0f} bytes/partida · "
+              f"encode {encode_us:6.2f} µs/msg · decode {decode_us:6.2f} µs/msg")
+    json_size, binary_size = results["json"][0], results["binary"][0]
+    print(f"\nAhorro del códec binario: {1 - binary_size / json_size:.1%} de los bytes")
+
+    state = messages[0]
+    print(f"Instantánea game_state: JSON {len(encode(state))} bytes · binario {len(encode(state, 'binary'))} bytes")
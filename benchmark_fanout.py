@@ -0,0 +1,172 @@
+"""
+Prueba de carga del reparto a espectadores (fanout_worker + event_bus)
+
+Levanta en esta máquina el servidor autoritativo con bus de eventos, N procesos de
+reparto en el puerto público y varios procesos cliente que abren en total S conexiones
+de espectador. Con todas conectadas sortea una serie de números y mide, para cada uno,
+cuántos espectadores lo recibieron y con qué latencia (reloj monotónico del sistema,
+común a todos los procesos).
+
+Uso:
+    python benchmark_fanout.py --spectators 10000 --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import websockets
+
+from fanout_worker import start_workers
+from multiplayer_server import BingachoServer
+from wire_codec import decode, iter_messages
+
+CONNECT_CONCURRENCY = 200  # Conexiones en curso a la vez por proceso cliente
+
+
+async def spectator(url, arrivals, connected, deflate):
+    """Una conexión de espectador: se registra y anota cuándo llega cada número"""
+    async with websockets.connect(url, compression="deflate" if deflate else None,
+                                  ping_interval=None, open_timeout=60, max_queue=None) as ws:
+        await ws.send(json.dumps({"type": "register", "nickname": "bench", "role": "spectator", "batch": True}))
+        async for frame in ws:
+            now = time.monotonic()
+            for message in iter_messages(decode(frame)):
+                if message.get("type") == "new_number":
+                    arrivals.setdefault(message["number"], []).append(now)
+                elif message.get("type") == "game_state":
+                    # Registrado en el proceso de reparto: ya recibe los sorteos
+                    connected.set()
+
+
+async def run_clients(url, count, deflate):
+    """
+    Proceso cliente: abre count espectadores, avisa con 'ready' y espera 'stop' por stdin
+
+    Al terminar escribe en stdout una línea JSON con las conexiones logradas y los
+    instantes de llegada de cada número.
+    """
+    arrivals = {}
+    gate = asyncio.Semaphore(CONNECT_CONCURRENCY)
+    events = [asyncio.Event() for _ in range(count)]
+    failures = 0
+
+    async def open_one(event):
+        nonlocal failures
+        async with gate:
+            task = asyncio.create_task(spectator(url, arrivals, event, deflate))
+            done, _ = await asyncio.wait([task, asyncio.create_task(event.wait())],
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if task in done:
+                failures += 1
+        return task
+
+    tasks = await asyncio.gather(*[open_one(event) for event in events])
+    connected = sum(event.is_set() for event in events)
+    print(f"ready {connected} {failures}", flush=True)
+
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, sys.stdin.readline)
+    for task in tasks:
+        task.cancel()
+    print(json.dumps({"connected": connected, "arrivals": arrivals}), flush=True)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else float('nan')
+
+
+async def run_benchmark(args):
+    bus_path = os.path.join(tempfile.gettempdir(), f"bingacho-bench-{os.getpid()}.sock")
+    upstream_port = args.port + 100
+    server = BingachoServer(host='127.0.0.1', port=upstream_port, bus_path=bus_path, compression=args.deflate)
+    server_task = asyncio.create_task(server.start())
+    while server.server is None:
+        await asyncio.sleep(0.05)
+
+    workers = start_workers(args.workers, bus_path, f"ws://127.0.0.1:{upstream_port}", '127.0.0.1', args.port)
+    clients = []
+    try:
+        while len(server.bus.subscribers) < args.workers:
+            await asyncio.sleep(0.05)
+
+        print(f"\n=== Reparto: {args.spectators:,} espectadores, {args.workers} procesos de reparto, "
+              f"{args.client_processes} procesos cliente ===\n")
+        start = time.perf_counter()
+        per_process = [args.spectators // args.client_processes + (i < args.spectators % args.client_processes)
+                       for i in range(args.client_processes)]
+        for count in per_process:
+            clients.append(await asyncio.create_subprocess_exec(
+                sys.executable, os.path.abspath(__file__), '--client', str(count), '--port', str(args.port),
+                *(['--deflate'] if args.deflate else []),
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, limit=64 * 1024 * 1024))
+        connected = 0
+        for client in clients:
+            _, ok, failed = (await client.stdout.readline()).decode().split()
+            connected += int(ok)
+        print(f"Conectados: {connected:,}/{args.spectators:,} en {time.perf_counter() - start:.1f}s")
+
+        sent_at = {}
+        numbers = random.sample(range(1, 91), args.draws)
+        for number in numbers:
+            sent_at[number] = time.monotonic()
+            await server.handle_new_number(number)
+            await asyncio.sleep(args.interval)
+        await asyncio.sleep(2.0)
+
+        arrivals = {}
+        for client in clients:
+            client.stdin.write(b"stop\n")
+            await client.stdin.drain()
+            result = json.loads(await client.stdout.readline())
+            for number, times in result["arrivals"].items():
+                arrivals.setdefault(int(number), []).extend(times)
+            await client.wait()
+
+        latencies = []
+        delivered = []
+        for number in numbers:
+            times = arrivals.get(number, [])
+            delivered.append(len(times))
+            latencies.extend((t - sent_at[number]) * 1000 for t in times)
+        print(f"Sorteos: {len(numbers)} · entregas {sum(delivered):,}/{len(numbers) * connected:,} "
+              f"(mínimo por sorteo {min(delivered):,})")
+        print(f"Latencia sorteo -> espectador: p50 {percentile(latencies, 0.5):.0f} ms · "
+              f"p99 {percentile(latencies, 0.99):.0f} ms · máx {max(latencies, default=float('nan')):.0f} ms")
+        print(f"Eventos publicados en el bus: {server.bus.events_published}")
+    finally:
+        for client in clients:
+            if client.returncode is None:
+                client.kill()
+        for worker in workers:
+            worker.terminate()
+        await server.stop()
+        server_task.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga del reparto a espectadores")
+    parser.add_argument('--spectators', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--client-processes', type=int, default=4)
+    parser.add_argument('--draws', type=int, default=10)
+    parser.add_argument('--interval', type=float, default=0.5, help="Segundos entre sorteos")
+    parser.add_argument('--port', type=int, default=8790)
+    parser.add_argument('--deflate', action='store_true', help="Negociar permessage-deflate")
+    parser.add_argument('--client', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.client is not None:
+        asyncio.run(run_clients(f"ws://127.0.0.1:{args.port}", args.client, args.deflate))
+    else:
+        asyncio.run(run_benchmark(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,10 +2,261 @@
 Módulo para generar cartillas de bingo aleatorias
 """
 
+import base64
 import random
+from array import array
+from itertools import combinations
+
+# Rangos oficiales de cada columna en el bingo español:
+# Columna 1 (0): 1-9, columnas 2-8: decenas completas, columna 9 (8): 80-90
+COLUMN_RANGES = tuple(
+    range(1, 10) if col == 0 else range(80, 91) if col == 8 else range(col * 10, col * 10 + 10)
+    for col in range(9)
+)
+
+# Máscaras de 9 bits con exactamente 5 columnas ocupadas (126 posibles por fila)
+ROW_MASKS = tuple(sum(1 << c for c in cols) for cols in combinations(range(9), 5))
+FULL_ROW_MASK = 0x1FF
+
+# Filas ocupadas para cada patrón de 3 bits de una columna (bit r = fila r ocupada)
+_COLUMN_PATTERN_ROWS = tuple(tuple(r for r in range(3) if pattern >> r & 1) for pattern in range(8))
+
+# Combinaciones ordenadas de k números de cada columna: _COLUMN_COMBOS[col][k]
+# Elegir una al azar equivale a sorted(random.sample(rango, k)) sin ordenar en cada cartilla
+_COLUMN_COMBOS = tuple(
+    tuple(tuple(combinations(column_range, k)) for k in range(4))
+    for column_range in COLUMN_RANGES
+)
+
+# Cada máscara de fila de 9 bits expandida a dígitos en base 4 (un dígito por columna),
+# de modo que sumar las 3 filas da el número de celdas ocupadas en cada columna
+_BASE4_SPREAD = tuple(sum(4 ** c for c in range(9) if mask >> c & 1) for mask in range(512))
+
+# Cada máscara de fila de 9 bits expandida a un grupo de 3 bits por columna: combinando
+# las 3 filas (fila r en el bit r de cada grupo) salen los patrones de todas las columnas
+_COLUMN_SPREAD = tuple(sum(1 << 3 * c for c in range(9) if mask >> c & 1) for mask in range(512))
+
+_MASK90 = (1 << 90) - 1
+
+# Números de cada columna que sobran tras dar 1 a cada cartilla de una serie de 6
+_STRIP_EXTRAS = tuple(len(column_range) - 6 for column_range in COLUMN_RANGES)
+
+_layout_table = None
+_column_fills_table = None
+_layouts_by_counts = None
+
+
+def build_layout_table():
+    """
+    Enumera todas las distribuciones válidas de celdas de una cartilla 3x9
+    (5 números por fila, al menos 1 por columna).
+    
+    Cada distribución se guarda empaquetada en 27 bits: fila 0 en los bits 0-8,
+    fila 1 en los bits 9-17 y fila 2 en los bits 18-26.
+    
+    Returns:
+        array('I') con las 735.210 distribuciones válidas
+    """
+    # Para cada conjunto de columnas obligatorias, filas de 5 que lo contienen
+    supersets = [[m for m in ROW_MASKS if m & required == required] for required in range(512)]
+    table = array('I')
+    for row0 in ROW_MASKS:
+        for row1 in ROW_MASKS:
+            base = row0 | row1 << 9
+            missing = FULL_ROW_MASK & ~(row0 | row1)
+            table.extend(base | row2 << 18 for row2 in supersets[missing])
+    return table
+
+
+def get_layout_table():
+    """Retorna la tabla de distribuciones (se construye una sola vez bajo demanda)"""
+    global _layout_table
+    if _layout_table is None:
+        _layout_table = build_layout_table()
+    return _layout_table
+
+
+def _column_fills():
+    """
+    Columnas ya rellenas para cada columna y patrón de 3 bits (índice col * 8 + patrón);
+    se construye una sola vez bajo demanda para generate_cards
+    
+    Cada opción es (tupla de 3 valores con None en huecos, máscara triple), donde la
+    máscara triple lleva los números de la fila r en los bits 90*r a 90*r+89: sumar las
+    de las 9 columnas da de una vez las máscaras de las 3 filas de la cartilla.
+    """
+    global _column_fills_table
+    if _column_fills_table is None:
+        table = []
+        for col in range(9):
+            for rows in _COLUMN_PATTERN_ROWS:
+                options = []
+                for column_numbers in _COLUMN_COMBOS[col][len(rows)]:
+                    fill = [None, None, None]
+                    triple = 0
+                    for row, number in zip(rows, column_numbers):
+                        fill[row] = number
+                        triple |= 1 << (90 * row + number - 1)
+                    options.append((tuple(fill), triple))
+                table.append(tuple(options))
+        _column_fills_table = tuple(table)
+    return _column_fills_table
+
+
+def layout_column_counts(layout):
+    """Retorna la firma (base 4) con cuántas celdas ocupa la distribución en cada columna"""
+    return _BASE4_SPREAD[layout & 0x1FF] + _BASE4_SPREAD[layout >> 9 & 0x1FF] + _BASE4_SPREAD[layout >> 18]
+
+
+def get_layouts_by_counts():
+    """
+    Agrupa la tabla de distribuciones por número de celdas en cada columna
+    (se construye una sola vez bajo demanda)
+    
+    Returns:
+        Diccionario {firma en base 4: array('I') de distribuciones}
+    """
+    global _layouts_by_counts
+    if _layouts_by_counts is None:
+        groups = {}
+        for layout in get_layout_table():
+            signature = layout_column_counts(layout)
+            group = groups.get(signature)
+            if group is None:
+                group = groups[signature] = array('I')
+            group.append(layout)
+        _layouts_by_counts = groups
+    return _layouts_by_counts
+
+
+def random_layout(rng=random):
+    """
+    Elige una distribución válida de celdas de forma uniforme en tiempo constante
+    
+    Args:
+        rng: Generador aleatorio con método randrange (por defecto el módulo random)
+        
+    Returns:
+        Entero de 27 bits con la distribución (ver build_layout_table)
+    """
+    table = get_layout_table()
+    return table[rng.randrange(len(table))]
+
+
+def seeded_grid(game_seed, serial):
+    """Genera la grilla 3x9 determinada por (game_seed, serial)"""
+    rng = SeededRandom(game_seed, serial)
+    return _fill_layout(random_layout(rng), rng)
+
+
+def _fill_layout(layout, rng):
+    """
+    Rellena una distribución de celdas con números ordenados por columna
+    
+    Args:
+        layout: Distribución empaquetada en 27 bits
+        rng: Generador aleatorio con método random
+        
+    Returns:
+        Lista de listas 3x9 con los números (None para espacios vacíos)
+    """
+    card = [[None] * 9, [None] * 9, [None] * 9]
+    rand = rng.random
+    for col in range(9):
+        pattern = (layout >> col & 1) | (layout >> (8 + col) & 2) | (layout >> (16 + col) & 4)
+        rows = _COLUMN_PATTERN_ROWS[pattern]
+        combos = _COLUMN_COMBOS[col][len(rows)]
+        column_numbers = combos[int(rand() * len(combos))]
+        for row, number in zip(rows, column_numbers):
+            card[row][col] = number
+    return card
+
+
+_MASK64 = (1 << 64) - 1
+
+
+def _mix64(value):
+    """Mezcla de 64 bits (finalizador de splitmix64) para derivar hashes de una huella"""
+    value = (value ^ (value >> 30)) * 0xBF58476D1CE4E5B9 & _MASK64
+    value = (value ^ (value >> 27)) * 0x94D049BB133111EB & _MASK64
+    return value ^ (value >> 31)
+
+
+class SeededRandom:
+    """
+    Generador splitmix64 estable para cartillas direccionables por (semilla, serie)
+    
+    A diferencia de random.Random, su secuencia está fijada por este módulo y es fácil
+    de reproducir en otros lenguajes (web/player.html la implementa con BigInt), de modo
+    que una cartilla impresa o de un móvil se puede regenerar y verificar sin el servidor.
+    Solo implementa lo que usan random_layout y _fill_layout.
+    """
+    
+    __slots__ = ('_state',)
+    
+    GOLDEN = 0x9E3779B97F4A7C15
+    
+    def __init__(self, game_seed, serial):
+        self._state = _mix64(_mix64(game_seed & _MASK64) ^ (serial & _MASK64))
+    
+    def next64(self):
+        """Retorna el siguiente entero de 64 bits"""
+        self._state = (self._state + self.GOLDEN) & _MASK64
+        return _mix64(self._state)
+    
+    def random(self):
+        """Retorna un float en [0, 1) con 53 bits aleatorios"""
+        return (self.next64() >> 11) * (1.0 / (1 << 53))
+    
+    def randrange(self, stop):
+        """Retorna un entero en [0, stop)"""
+        return self.next64() % stop
+
+
+def numbers_to_mask(numbers):
+    """Convierte un iterable de números (se ignoran los None) en una máscara de bits"""
+    mask = 0
+    for number in numbers:
+        if number is not None:
+            mask |= 1 << (number - 1)
+    return mask
+
+
+def mask_to_numbers(mask):
+    """Convierte una máscara de bits en la lista ordenada de números que contiene"""
+    numbers = []
+    while mask:
+        low = mask & -mask
+        numbers.append(low.bit_length())
+        mask ^= low
+    return numbers
+
 
 class BingoCard:
-    """Clase para representar y generar una cartilla de bingo"""
+    """
+    Clase para representar y generar una cartilla de bingo
+    
+    Internamente la cartilla se guarda como máscaras de bits de 90 bits (el número n
+    ocupa el bit n-1): una máscara por cada línea ganadora (las filas en el bingo de
+    90 bolas), la máscara de toda la cartilla y la de números marcados. Así marcar,
+    comprobar línea y comprobar bingo son operaciones de bits de coste constante.
+    La vista `numbers` (lista 3x9 con None) se mantiene para el renderizado y la
+    serialización.
+    
+    También lleva contadores de números pendientes por línea y por cartilla, que se
+    decrementan al marcar, para responder "cuántos faltan" sin recorrer la cartilla.
+    """
+    
+    __slots__ = (
+        'card_id', '_numbers', '_line_masks', '_mask', '_marked_mask',
+        '_line_remaining', '_remaining', '_lines', '_seed'
+    )
+    
+    MAX_NUMBER = 90
+    ROWS = 3
+    COLUMNS = 9
+    CARD_BYTES = 15  # to_bytes: un byte por número, fila por fila
+    MARK_BYTES = 12  # máscara de marcados de 90 bits
     
     def __init__(self, card_id=None):
         """
@@ -15,8 +266,111 @@ class BingoCard:
             card_id: ID único para la cartilla (opcional)
         """
         self.card_id = card_id
-        self.numbers = self.generate_card()
-        self.marked = set()  # Conjunto de números marcados
+        self._seed = None
+        self._set_numbers(self.generate_card())
+    
+    @classmethod
+    def from_seed(cls, game_seed, serial, card_id=None, keep_grid=True):
+        """
+        Crea la cartilla determinada por (game_seed, serial)
+        
+        La misma pareja produce siempre la misma grilla (ver SeededRandom), así que
+        basta con guardar o enviar la semilla y el número de serie.
+        
+        Args:
+            game_seed: Semilla de la partida (entero de hasta 53 bits para que viaje en JSON)
+            serial: Número de serie de la cartilla dentro de la partida
+            card_id: ID de la cartilla (por defecto, el número de serie)
+            keep_grid: Si es False no se guarda la grilla; `numbers` la regenera al pedirla
+        """
+        card = cls.__new__(cls)
+        card.card_id = serial if card_id is None else card_id
+        card._seed = (game_seed, serial)
+        card._set_numbers(cls._grid_from_seed(game_seed, serial))
+        if not keep_grid:
+            card._numbers = None
+        return card
+    
+    @staticmethod
+    def _grid_from_seed(game_seed, serial):
+        """Grilla determinada por (game_seed, serial) para este tipo de cartilla"""
+        return seeded_grid(game_seed, serial)
+    
+    @staticmethod
+    def _grid_from_bytes(data):
+        """Reconstruye la grilla 3x9 a partir de los 15 números fila por fila"""
+        grid = [[None] * 9, [None] * 9, [None] * 9]
+        for index, number in enumerate(data):
+            grid[index // 5][min(number // 10, 8)] = number
+        return grid
+    
+    @staticmethod
+    def _build_line_masks(numbers):
+        """Máscaras de las líneas ganadoras de la grilla (en 90 bolas, las 3 filas)"""
+        return tuple(numbers_to_mask(row) for row in numbers)
+        
+    def _set_numbers(self, numbers):
+        """Asigna la grilla de números, recalcula las máscaras y limpia las marcas"""
+        self._numbers = numbers
+        self._line_masks = self._build_line_masks(numbers)
+        self._mask = numbers_to_mask(number for row in numbers for number in row)
+        self._set_marked_mask(0)
+    
+    def _set_marked_mask(self, marked_mask):
+        """Asigna la máscara de marcados y recalcula los contadores de pendientes"""
+        self._marked_mask = marked_mask
+        self._line_remaining = [(line_mask & ~marked_mask).bit_count() for line_mask in self._line_masks]
+        self._remaining = (self._mask & ~marked_mask).bit_count()
+        self._lines = self._line_remaining.count(0)
+    
+    @property
+    def numbers(self):
+        """Grilla de números de la cartilla (None para espacios vacíos)"""
+        if self._numbers is None:
+            return self._grid_from_seed(*self._seed)
+        return self._numbers
+    
+    @numbers.setter
+    def numbers(self, numbers):
+        self._seed = None
+        self._set_numbers(numbers)
+    
+    @property
+    def seed(self):
+        """Tupla (game_seed, serial) si la cartilla es direccionable por semilla, si no None"""
+        return self._seed
+    
+    @property
+    def marked(self):
+        """Conjunto de números marcados (se construye a partir de la máscara)"""
+        return set(mask_to_numbers(self._marked_mask))
+    
+    @marked.setter
+    def marked(self, numbers):
+        # Misma validación que mark_number: los valores no válidos (p. ej. de un from_dict
+        # con datos externos) se ignoran en lugar de romper el desplazamiento de bits
+        valid = (n for n in numbers if type(n) is int and 0 < n <= self.MAX_NUMBER)
+        self._set_marked_mask(numbers_to_mask(valid) & self._mask)
+    
+    @property
+    def mask(self):
+        """Máscara de bits con todos los números de la cartilla"""
+        return self._mask
+    
+    @property
+    def row_masks(self):
+        """Tupla con la máscara de bits de cada fila"""
+        return self._line_masks[:self.ROWS]
+    
+    @property
+    def line_masks(self):
+        """Tupla con la máscara de bits de cada línea ganadora (filas y, en 75 bolas, columnas y diagonales)"""
+        return self._line_masks
+    
+    @property
+    def marked_mask(self):
+        """Máscara de bits con los números marcados"""
+        return self._marked_mask
         
     def generate_card(self):
         """
@@ -27,104 +381,14 @@ class BingoCard:
         - Los números en cada columna están ordenados de menor a mayor de arriba a abajo.
         - Un total de exactamente 15 números.
         
+        La distribución de celdas se elige de manera uniforme entre todas las válidas
+        usando la tabla precalculada (ver build_layout_table).
+        
         Returns:
             Lista de listas con los números de la cartilla (None para espacios vacíos)
         """
-        # Bucle de reintento hasta que encontremos una distribución válida de celdas
-        while True:
-            # 1. Decidir cuántos números colocar por columna.
-            # Cada una de las 9 columnas debe tener al menos 1 número, y máximo 3 (debido a las 3 filas).
-            # Total de números en la cartilla = 15.
-            col_counts = [1] * 9  # Comenzamos con 1 número en cada una de las 9 columnas (quedan 6 por distribuir)
-            
-            # Distribuir los 6 números restantes aleatoriamente sin exceder el máximo de 3 por columna
-            extra_pool = list(range(9))
-            random.shuffle(extra_pool)
-            extras_added = 0
-            for col_idx in extra_pool:
-                if extras_added < 6:
-                    add = random.randint(1, 2)
-                    if col_counts[col_idx] + add <= 3:
-                        if extras_added + add <= 6:
-                            col_counts[col_idx] += add
-                            extras_added += add
-                        else:
-                            needed = 6 - extras_added
-                            if col_counts[col_idx] + needed <= 3:
-                                col_counts[col_idx] += needed
-                                extras_added += needed
-            
-            # Verificar si logramos distribuir exactamente 15 celdas
-            if sum(col_counts) != 15:
-                continue
-                
-            # 2. Intentar asignar las filas de las columnas asegurando exactamente 5 números por fila
-            # Representamos la matriz de celdas activas: 3 filas x 9 columnas
-            grid = [[False] * 9 for _ in range(3)]
-            row_counts = [0, 0, 0]
-            
-            # Buscaremos una solución válida usando Backtracking de forma muy rápida
-            def solve(col):
-                if col == 9:
-                    # Condición de éxito: todas las filas deben tener exactamente 5 números
-                    return all(r == 5 for r in row_counts)
-                
-                count = col_counts[col]
-                # Todas las combinaciones posibles de filas para este recuento de columna (1, 2 o 3 celdas ocupadas)
-                import itertools
-                combos = list(itertools.combinations(range(3), count))
-                random.shuffle(combos)  # Aleatorizar para variar las cartillas
-                
-                for combo in combos:
-                    # Validar si al agregar estas filas superamos el límite de 5 números por fila
-                    if any(row_counts[r] >= 5 for r in combo):
-                        continue
-                    
-                    # Colocar
-                    for r in combo:
-                        grid[r][col] = True
-                        row_counts[r] += 1
-                        
-                    if solve(col + 1):
-                        return True
-                        
-                    # Deshacer (Backtrack)
-                    for r in combo:
-                        grid[r][col] = False
-                        row_counts[r] -= 1
-                        
-                return False
-            
-            # Si encontramos una distribución de celdas válida, procedemos a llenarla con números
-            if solve(0):
-                card = [[None] * 9 for _ in range(3)]
-                for col in range(9):
-                    # Asignar los rangos oficiales de números para cada columna en el bingo español:
-                    # Columna 1 (0): 1-9 (9 números)
-                    # Columnas 2-8 (1-7): decenas completas (ej. Col 2: 10-19, Col 3: 20-29, etc.)
-                    # Columna 9 (8): 80-90 (11 números)
-                    if col == 0:
-                        start_num = 1
-                        end_num = 9
-                    elif col == 8:
-                        start_num = 80
-                        end_num = 90
-                    else:
-                        start_num = col * 10
-                        end_num = start_num + 9
-                        
-                    # Obtener números ordenados únicos para esta columna
-                    num_needed = col_counts[col]
-                    column_numbers = random.sample(range(start_num, end_num + 1), num_needed)
-                    column_numbers.sort()
-                    
-                    # Colocar en la cartilla
-                    placed = 0
-                    for row in range(3):
-                        if grid[row][col]:
-                            card[row][col] = column_numbers[placed]
-                            placed += 1
-                return card
+        layout = random_layout()
+        return _fill_layout(layout, random)
     
     def mark_number(self, number):
         """
@@ -136,16 +400,63 @@ class BingoCard:
         Returns:
             True si el número estaba en la cartilla, False si no
         """
-        # Buscar el número en la cartilla
-        for row in self.numbers:
-            if number in row:
-                self.marked.add(number)
-                return True
-        return False
+        if type(number) is not int or not 0 < number <= self.MAX_NUMBER:
+            return False
+        bit = 1 << (number - 1)
+        if not self._mask & bit:
+            return False
+        if not self._marked_mask & bit:
+            self._marked_mask |= bit
+            self._remaining -= 1
+            remaining = self._line_remaining
+            for line, line_mask in enumerate(self._line_masks):
+                if line_mask & bit:
+                    remaining[line] -= 1
+                    if not remaining[line]:
+                        self._lines += 1
+        return True
     
     def is_marked(self, number):
         """Verifica si un número está marcado"""
-        return number in self.marked
+        if type(number) is not int or number < 1:
+            return False
+        return bool(self._marked_mask >> (number - 1) & 1)
+    
+    def reset_marks(self):
+        """Desmarca todos los números de la cartilla"""
+        self._set_marked_mask(0)
+    
+    def marked_count(self):
+        """Retorna cuántos números están marcados"""
+        return self._marked_mask.bit_count()
+    
+    def total_numbers(self):
+        """Retorna cuántos números tiene la cartilla"""
+        return self._mask.bit_count()
+    
+    def remaining(self):
+        """Retorna cuántos números le faltan a la cartilla para BINGO"""
+        return self._remaining
+    
+    def row_remaining(self):
+        """Retorna una tupla con cuántos números le faltan a cada fila"""
+        return tuple(self._line_remaining[:self.ROWS])
+    
+    def line_remaining(self):
+        """Retorna una tupla con cuántos números le faltan a cada línea ganadora"""
+        return tuple(self._line_remaining)
+    
+    def best_row_remaining(self):
+        """Retorna cuántos números le faltan a la línea más avanzada"""
+        return min(self._line_remaining)
+    
+    def has_line(self):
+        """Verifica en O(1) si hay al menos una línea completa"""
+        return self._lines > 0
+    
+    def lines_count(self):
+        """Retorna cuántas líneas están completas"""
+        return self._lines
     
     def check_line(self):
         """
@@ -154,13 +465,7 @@ class BingoCard:
         Returns:
             True si hay al menos una línea completa, False si no
         """
-        for row in self.numbers:
-            # Obtener solo los números válidos de la fila (sin None)
-            valid_numbers = [num for num in row if num is not None]
-            # Verificar si todos los números válidos están marcados
-            if all(num in self.marked for num in valid_numbers):
-                return True
-        return False
+        return self._lines > 0
     
     def check_bingo(self):
         """
@@ -169,13 +474,7 @@ class BingoCard:
         Returns:
             True si todos los números están marcados, False si no
         """
-        # Obtener todos los números válidos de la cartilla
-        all_numbers = []
-        for row in self.numbers:
-            all_numbers.extend([num for num in row if num is not None])
-        
-        # Verificar si todos están marcados
-        return all(num in self.marked for num in all_numbers)
+        return self._remaining == 0
     
     def get_numbers(self):
         """Retorna la lista de números de la cartilla"""
@@ -185,22 +484,111 @@ class BingoCard:
         """Retorna el conjunto de números marcados"""
         return self.marked
     
-    def to_dict(self):
-        """Convierte la cartilla a un diccionario para serialización"""
+    def to_dict(self, compact=False):
+        """
+        Convierte la cartilla a un diccionario para serialización
+        
+        Args:
+            compact: Si es True y la cartilla es direccionable por semilla, omite la
+                grilla y envía solo game_seed y serial (el receptor la regenera)
+        """
+        data = {
+            'card_id': self.card_id,
+            'game_mode': self.MAX_NUMBER,
+            'marked': mask_to_numbers(self._marked_mask)
+        }
+        if self._seed is not None:
+            data['game_seed'], data['serial'] = self._seed
+        if not (compact and self._seed is not None):
+            data['numbers'] = self.numbers
+        return data
+    
+    def to_bytes(self, include_marks=False):
+        """
+        Serializa la cartilla en formato binario compacto
+        
+        Los números se guardan fila por fila, un byte cada uno (15 bytes en 90 bolas,
+        24 en 75). La columna de cada número se deduce de su valor, así que la grilla
+        se reconstruye exactamente. Con include_marks se añade la máscara de marcados
+        (12 bytes en 90 bolas, 10 en 75) en little-endian.
+        """
+        data = bytes(number for row in self.numbers for number in row if number is not None)
+        if include_marks:
+            data += self._marked_mask.to_bytes(self.MARK_BYTES, 'little')
+        return data
+    
+    @classmethod
+    def from_bytes(cls, data, card_id=None):
+        """
+        Crea una cartilla desde el formato de to_bytes (el tipo se deduce de la longitud)
+        
+        Raises:
+            ValueError: Si la longitud no corresponde a ningún tipo de cartilla
+        """
+        if cls is BingoCard:
+            for card_class in (BingoCard, BingoCard75):
+                if len(data) in (card_class.CARD_BYTES, card_class.CARD_BYTES + card_class.MARK_BYTES):
+                    cls = card_class
+                    break
+            else:
+                raise ValueError(f"Longitud de cartilla binaria no válida: {len(data)} bytes")
+        card = cls.__new__(cls)
+        card.card_id = card_id
+        card._seed = None
+        card._set_numbers(cls._grid_from_bytes(data[:cls.CARD_BYTES]))
+        if len(data) > cls.CARD_BYTES:
+            marked = int.from_bytes(data[cls.CARD_BYTES:cls.CARD_BYTES + cls.MARK_BYTES], 'little')
+            card._set_marked_mask(marked & card._mask)
+        return card
+    
+    def to_packed_dict(self):
+        """Diccionario para JSON con la cartilla en binario compacto codificado en base64"""
         return {
             'card_id': self.card_id,
-            'numbers': self.numbers,
-            'marked': list(self.marked)
+            'game_mode': self.MAX_NUMBER,
+            'packed': base64.b64encode(self.to_bytes(include_marks=bool(self._marked_mask))).decode('ascii')
         }
     
     @classmethod
     def from_dict(cls, data):
-        """Crea una cartilla desde un diccionario"""
-        card = cls(card_id=data.get('card_id'))
-        card.numbers = data['numbers']
-        card.marked = set(data.get('marked', []))
+        """Crea una cartilla desde un diccionario (con grilla, binario empaquetado o game_seed y serial)"""
+        if 'packed' in data:
+            return cls.from_bytes(base64.b64decode(data['packed']), card_id=data.get('card_id'))
+        if cls is BingoCard:
+            numbers = data.get('numbers')
+            game_mode = data.get('game_mode', 75 if numbers is not None and len(numbers) == 5 else 90)
+            cls = card_class_for_mode(game_mode)
+        if 'numbers' not in data:
+            card = cls.from_seed(data['game_seed'], data['serial'], card_id=data.get('card_id'))
+        else:
+            card = cls.__new__(cls)
+            card.card_id = data.get('card_id')
+            card._seed = None
+            card._set_numbers(data['numbers'])
+        card.marked = data.get('marked', [])
         return card
     
+    def layout(self):
+        """Retorna la distribución de celdas ocupadas empaquetada en bits (bit fila*COLUMNS+columna)"""
+        layout = 0
+        columns = self.COLUMNS
+        for r, row in enumerate(self.numbers):
+            shift = r * columns
+            for c, number in enumerate(row):
+                if number is not None:
+                    layout |= 1 << (shift + c)
+        return layout
+    
+    def fingerprint(self):
+        """
+        Huella canónica de la cartilla (117 bits, cabe en 128)
+        
+        Combina la máscara de 90 bits de sus números con la distribución de 27 bits.
+        Como los números de cada columna van ordenados, dos cartillas tienen la misma
+        huella si y solo si tienen la misma grilla.
+        """
+        return self.layout() << self.MAX_NUMBER | self._mask
+    
     def __str__(self):
         """Representación en string de la cartilla para debug"""
         result = f"Cartilla ID: {self.card_id}\n"
@@ -209,7 +597,7 @@ class BingoCard:
             for num in row:
                 if num is None:
                     row_str.append("  ")
-                elif num in self.marked:
+                elif self.is_marked(num):
                     row_str.append(f"[{num:2d}]")
                 else:
                     row_str.append(f" {num:2d} ")
@@ -217,23 +605,446 @@ class BingoCard:
         return result
 
 
-def generate_unique_cards(num_cards):
+def fingerprint64(fingerprint):
+    """Reduce una huella de 128 bits a 64 bits bien mezclados"""
+    return _mix64((fingerprint & _MASK64) ^ _mix64(fingerprint >> 64))
+
+
+# Rangos de las columnas B-I-N-G-O del bingo de 75 bolas
+COLUMN_RANGES_75 = tuple(range(col * 15 + 1, col * 15 + 16) for col in range(5))
+
+
+def _fill_75(rng):
+    """
+    Rellena una cartilla 5x5 de 75 bolas con centro libre
+    
+    Args:
+        rng: Generador aleatorio con método random
+        
+    Returns:
+        Lista de listas 5x5 con los números (None en el centro libre)
+    """
+    rand = rng.random
+    card = [[None] * 5 for _ in range(5)]
+    for col, column_range in enumerate(COLUMN_RANGES_75):
+        pool = list(column_range)
+        # Fisher-Yates parcial: los 5 primeros quedan elegidos al azar
+        for i in range(5):
+            j = i + int(rand() * (15 - i))
+            pool[i], pool[j] = pool[j], pool[i]
+        for row in range(5):
+            if not (row == 2 and col == 2):
+                card[row][col] = pool[row]
+    return card
+
+
+def seeded_grid_75(game_seed, serial):
+    """Genera la grilla 5x5 de 75 bolas determinada por (game_seed, serial)"""
+    return _fill_75(SeededRandom(game_seed, serial))
+
+
+class BingoCard75(BingoCard):
+    """
+    Cartilla de 75 bolas: 5x5 con columnas B-I-N-G-O y centro libre
+    
+    Comparte con BingoCard las máscaras de bits, el marcado y los contadores. Las líneas
+    ganadoras son las 5 filas, las 5 columnas y las 2 diagonales; el centro libre no
+    forma parte de ninguna máscara, por lo que cuenta como marcado desde el principio.
+    """
+    
+    __slots__ = ()
+    
+    MAX_NUMBER = 75
+    ROWS = 5
+    COLUMNS = 5
+    CARD_BYTES = 24
+    MARK_BYTES = 10
+    
+    @staticmethod
+    def _grid_from_seed(game_seed, serial):
+        return seeded_grid_75(game_seed, serial)
+    
+    @staticmethod
+    def _grid_from_bytes(data):
+        """Reconstruye la grilla 5x5 a partir de los 24 números fila por fila (sin el centro)"""
+        numbers = iter(data)
+        return [[None if (row == 2 and col == 2) else next(numbers) for col in range(5)] for row in range(5)]
+    
+    @staticmethod
+    def _build_line_masks(numbers):
+        """Máscaras de las 5 filas, las 5 columnas y las 2 diagonales"""
+        lines = [list(row) for row in numbers]
+        lines.extend([numbers[r][c] for r in range(5)] for c in range(5))
+        lines.append([numbers[i][i] for i in range(5)])
+        lines.append([numbers[i][4 - i] for i in range(5)])
+        return tuple(numbers_to_mask(line) for line in lines)
+    
+    def generate_card(self):
+        """
+        Genera una cartilla de 75 bolas: la columna B lleva números del 1-15, I del 16-30,
+        N del 31-45 (4 números y el centro libre), G del 46-60 y O del 61-75
+        
+        Returns:
+            Lista de listas 5x5 con los números (None en el centro libre)
+        """
+        return _fill_75(random)
+
+
+def card_class_for_mode(game_mode):
+    """Retorna la clase de cartilla para el modo de juego (90 o 75 bolas)"""
+    return BingoCard75 if game_mode == 75 else BingoCard
+
+
+def pack_cards(cards, include_marks=False):
+    """
+    Empaqueta varias cartillas del mismo tipo en un único buffer binario
+    
+    Args:
+        cards: Lista de cartillas (todas de 90 o todas de 75 bolas)
+        include_marks: Si es True, cada registro lleva también su máscara de marcados
+        
+    Returns:
+        bytes con los registros de to_bytes concatenados (tamaño fijo por cartilla)
+    """
+    return b''.join(card.to_bytes(include_marks) for card in cards)
+
+
+def unpack_cards(buffer, game_mode=90, include_marks=False, start_id=0):
+    """
+    Desempaqueta un buffer creado con pack_cards
+    
+    Args:
+        buffer: bytes, bytearray o memoryview
+        game_mode: 90 o 75 (tipo de las cartillas empaquetadas)
+        include_marks: Si los registros llevan máscara de marcados
+        start_id: ID de la primera cartilla (las siguientes son consecutivas)
+        
+    Returns:
+        Lista de cartillas
+    """
+    card_class = card_class_for_mode(game_mode)
+    size = card_class.CARD_BYTES + (card_class.MARK_BYTES if include_marks else 0)
+    view = memoryview(buffer)
+    if len(view) % size:
+        raise ValueError(f"El buffer ({len(view)} bytes) no es múltiplo del registro ({size} bytes)")
+    return [
+        card_class.from_bytes(bytes(view[offset:offset + size]), card_id=start_id + i)
+        for i, offset in enumerate(range(0, len(view), size))
+    ]
+
+
+class CardIndex:
+    """
+    Índice de huellas para rechazar cartillas repetidas durante la generación
+    
+    Por defecto guarda las huellas de 64 bits en un set. Con bloom_bits usa en su lugar
+    un filtro de Bloom de tamaño fijo (útil con muchos millones de cartillas): un falso
+    positivo solo hace que se descarte una cartilla nueva y se genere otra.
+    
+    Con max_shared, además rechaza cartillas que compartan más de max_shared números
+    con alguna cartilla ya aceptada (partidas premium). Para eso guarda, por cada número,
+    un entero con un bit por cartilla aceptada que lo contiene: las cartillas que
+    comparten más de max_shared números con una nueva salen de combinar con AND/OR los
+    15 enteros de sus números, operaciones que recorren N/64 palabras en C en lugar de
+    comparar en Python contra cada cartilla. Aun así el coste de cada comprobación crece
+    con N, así que con max_shared el índice admite como mucho MAX_SHARED_CARDS cartillas
+    (de todos modos, compartiendo pocos números no caben muchas más: con max_shared=5
+    no hay ni 125.000 cartillas de 15 números de 1-90 que lo cumplan).
+    """
+    
+    MAX_SHARED_CARDS = 200_000
+    
+    def __init__(self, max_shared=None, bloom_bits=None, bloom_hashes=4):
+        """
+        Args:
+            max_shared: Máximo de números en común entre dos cartillas (None = sin límite)
+            bloom_bits: Tamaño del filtro de Bloom en bits (None = usar un set exacto)
+            bloom_hashes: Número de hashes del filtro de Bloom
+        """
+        self.max_shared = max_shared
+        self._count = 0
+        self._seen = set()
+        self._bloom = bytearray((bloom_bits + 7) // 8) if bloom_bits else None
+        self._bloom_bits = bloom_bits
+        self._bloom_hashes = bloom_hashes
+        self._holders = {}  # {número: bits de las cartillas aceptadas que lo tienen} (solo con max_shared)
+    
+    def __len__(self):
+        return self._count
+    
+    def _bloom_positions(self, key):
+        """Posiciones del filtro de Bloom para una huella de 64 bits (doble hashing)"""
+        step = _mix64(key) | 1
+        return [(key + i * step) % self._bloom_bits for i in range(self._bloom_hashes)]
+    
+    def _contains_key(self, key):
+        """Verifica si una huella de 64 bits ya está en el índice"""
+        if self._bloom is None:
+            return key in self._seen
+        bloom = self._bloom
+        return all(bloom[pos >> 3] >> (pos & 7) & 1 for pos in self._bloom_positions(key))
+    
+    def __contains__(self, card):
+        return self._contains_key(fingerprint64(card.fingerprint()))
+    
+    def shares_too_many(self, card):
+        """Verifica si la cartilla comparte más de max_shared números con alguna aceptada"""
+        if self.max_shared is None:
+            return False
+        holders = self._holders
+        needed = self.max_shared + 1
+        # at_least[j]: cartillas que tienen al menos j de los números vistos hasta ahora
+        at_least = [-1] + [0] * needed
+        for seen, number in enumerate(mask_to_numbers(card.mask), 1):
+            bits = holders.get(number)
+            if not bits:
+                continue
+            for j in range(min(needed, seen), 0, -1):
+                at_least[j] |= at_least[j - 1] & bits
+        return at_least[needed] != 0
+    
+    def add(self, card):
+        """
+        Intenta añadir una cartilla al índice
+        
+        Returns:
+            True si se aceptó, False si está repetida o incumple max_shared
+            
+        Raises:
+            ValueError: Si con max_shared el índice ya tiene MAX_SHARED_CARDS cartillas
+        """
+        if self.max_shared is not None and self._count >= self.MAX_SHARED_CARDS:
+            raise ValueError(f"Con max_shared el índice admite como mucho {self.MAX_SHARED_CARDS} cartillas")
+        key = fingerprint64(card.fingerprint())
+        if self._contains_key(key) or self.shares_too_many(card):
+            return False
+        if self._bloom is None:
+            self._seen.add(key)
+        else:
+            for pos in self._bloom_positions(key):
+                self._bloom[pos >> 3] |= 1 << (pos & 7)
+        if self.max_shared is not None:
+            bit = 1 << self._count
+            holders = self._holders
+            for number in mask_to_numbers(card.mask):
+                holders[number] = holders.get(number, 0) | bit
+        self._count += 1
+        return True
+
+
+def generate_unique_cards(num_cards, max_shared=None, index=None, rng=random, max_rejections=10000):
     """
     Genera múltiples cartillas únicas
     
+    Las cartillas se generan en lote y cada una se comprueba contra un CardIndex, que
+    descarta las repetidas (y, si se indica, las que comparten demasiados números).
+    
+    Args:
+        num_cards: Número de cartillas a generar
+        max_shared: Máximo de números en común entre dos cartillas (None = sin límite)
+        index: CardIndex a reutilizar entre tiradas (opcional, se crea uno si es None)
+        rng: Generador aleatorio (por defecto el módulo random)
+        max_rejections: Rechazos seguidos tolerados antes de abandonar
+        
+    Returns:
+        Lista de cartillas BingoCard con IDs consecutivos desde 0
+        
+    Raises:
+        ValueError: Si no se encuentra una cartilla válida tras max_rejections intentos
+    """
+    if index is None:
+        index = CardIndex(max_shared=max_shared)
+    cards = []
+    rejections = 0
+    while len(cards) < num_cards:
+        for card in generate_cards(num_cards - len(cards), rng=rng):
+            if index.add(card):
+                card.card_id = len(cards)
+                cards.append(card)
+                rejections = 0
+            else:
+                rejections += 1
+                if rejections > max_rejections:
+                    raise ValueError(
+                        f"No se pudieron generar {num_cards} cartillas únicas "
+                        f"(conseguidas {len(cards)} con max_shared={max_shared})"
+                    )
+    return cards
+
+
+def generate_cards(num_cards, start_id=0, rng=random):
+    """
+    Genera cartillas en lote usando la tabla de distribuciones precalculada.
+    
+    Es unas dos veces más rápido que crear BingoCard() en un bucle (ver
+    benchmark_cards): cada columna sale de una tabla con sus números y su aporte a las
+    máscaras de las filas, así que las máscaras se obtienen sumando 9 enteros y los
+    contadores son constantes (5 por fila, 15 en total), sin pasar por _set_numbers.
+    
     Args:
         num_cards: Número de cartillas a generar
+        start_id: ID de la primera cartilla (las siguientes son consecutivas)
+        rng: Generador aleatorio (por defecto el módulo random)
         
     Returns:
         Lista de cartillas BingoCard
     """
+    table = get_layout_table()
+    table_size = len(table)
+    rand = rng.random
+    new_card = BingoCard.__new__
+    column_fills = _column_fills()
+    spread = _COLUMN_SPREAD
     cards = []
-    for i in range(num_cards):
-        card = BingoCard(card_id=i)
+    for card_id in range(start_id, start_id + num_cards):
+        layout = table[int(rand() * table_size)]
+        # Patrón de 3 bits de cada columna, columna 0 en los bits más bajos
+        patterns = spread[layout & 0x1FF] | spread[layout >> 9 & 0x1FF] << 1 | spread[layout >> 18] << 2
+        columns = []
+        rows_mask = 0
+        for base in range(0, 72, 8):
+            options = column_fills[base + (patterns & 7)]
+            patterns >>= 3
+            fill, triple = options[int(rand() * len(options))]
+            columns.append(fill)
+            rows_mask += triple
+        row0, row1, row2 = zip(*columns)
+        line_masks = (rows_mask & _MASK90, rows_mask >> 90 & _MASK90, rows_mask >> 180)
+        card = new_card(BingoCard)
+        card.card_id = card_id
+        card._seed = None
+        card._numbers = [list(row0), list(row1), list(row2)]
+        card._line_masks = line_masks
+        card._mask = line_masks[0] | line_masks[1] | line_masks[2]
+        card._marked_mask = 0
+        card._line_remaining = [5, 5, 5]
+        card._remaining = 15
+        card._lines = 0
         cards.append(card)
     return cards
 
 
+
+def _strip_column_counts(rng):
+    """
+    Decide cuántos números de cada columna lleva cada una de las 6 cartillas de una serie
+    
+    Cada cartilla recibe 1 número por columna y luego se reparten los sobrantes
+    (3 en la columna 0, 4 en las columnas 1-7 y 5 en la columna 8) de forma que cada
+    cartilla sume 15 números y ninguna columna pase de 3. El reparto aleatorio elige
+    entre las cartillas que más números necesitan; si no cuadra se usa el reparto voraz
+    de Gale-Ryser (una unidad por cartilla y columna), que siempre encuentra solución.
+    
+    Returns:
+        Lista de 6 listas con el número de celdas por columna de cada cartilla
+    """
+    rand = rng.random
+    columns = sorted(range(9), key=lambda col: (-_STRIP_EXTRAS[col], rand()))
+    
+    counts = [[1] * 9 for _ in range(6)]
+    needed = [6] * 6
+    for col in columns:
+        for _ in range(_STRIP_EXTRAS[col]):
+            most = 0
+            for k in range(6):
+                if needed[k] > most and counts[k][col] < 3:
+                    most = needed[k]
+            if not most:
+                break
+            candidates = [k for k in range(6) if needed[k] >= most - 1 and needed[k] and counts[k][col] < 3]
+            k = candidates[int(rand() * len(candidates))]
+            counts[k][col] += 1
+            needed[k] -= 1
+    if any(needed):
+        counts = [[1] * 9 for _ in range(6)]
+        needed = [6] * 6
+        for col in columns:
+            order = sorted(range(6), key=lambda k: (-needed[k], rand()))
+            for k in order[:_STRIP_EXTRAS[col]]:
+                counts[k][col] += 1
+                needed[k] -= 1
+    return counts
+
+
+def _place_columns(layout, columns):
+    """
+    Coloca en una distribución los números ya elegidos de cada columna
+    
+    Args:
+        layout: Distribución empaquetada en 27 bits
+        columns: Lista de 9 listas ordenadas con los números de cada columna
+        
+    Returns:
+        Lista de listas 3x9 con los números (None para espacios vacíos)
+    """
+    card = [[None] * 9, [None] * 9, [None] * 9]
+    for col in range(9):
+        pattern = (layout >> col & 1) | (layout >> (8 + col) & 2) | (layout >> (16 + col) & 4)
+        for row, number in zip(_COLUMN_PATTERN_ROWS[pattern], columns[col]):
+            card[row][col] = number
+    return card
+
+
+def generate_strip(start_id=0, rng=random):
+    """
+    Genera una serie de 6 cartillas en la que cada número del 1 al 90 aparece
+    exactamente una vez, respetando los rangos de columna de generate_card.
+    
+    El número de pasos está acotado: un reparto de columnas (con respaldo voraz
+    garantizado) y una distribución de celdas uniforme elegida en tiempo constante
+    entre las de la tabla precalculada con esos recuentos de columna.
+    
+    Args:
+        start_id: ID de la primera cartilla (las siguientes son consecutivas)
+        rng: Generador aleatorio (por defecto el módulo random)
+        
+    Returns:
+        Lista de 6 cartillas BingoCard
+    """
+    by_counts = get_layouts_by_counts()
+    counts = _strip_column_counts(rng)
+    
+    # Barajar cada columna (Fisher-Yates) y repartirla entre las cartillas según sus recuentos
+    rand = rng.random
+    card_columns = [[None] * 9 for _ in range(6)]
+    for col, column_range in enumerate(COLUMN_RANGES):
+        pool = list(column_range)
+        for i in range(len(pool) - 1, 0, -1):
+            j = int(rand() * (i + 1))
+            pool[i], pool[j] = pool[j], pool[i]
+        offset = 0
+        for k in range(6):
+            count = counts[k][col]
+            card_columns[k][col] = sorted(pool[offset:offset + count])
+            offset += count
+    
+    strip = []
+    for k in range(6):
+        signature = sum(count * 4 ** col for col, count in enumerate(counts[k]))
+        layouts = by_counts[signature]
+        card = BingoCard.__new__(BingoCard)
+        card.card_id = start_id + k
+        card._seed = None
+        card._set_numbers(_place_columns(layouts[int(rand() * len(layouts))], card_columns[k]))
+        strip.append(card)
+    return strip
+
+
+def generate_strips(num_strips, start_id=0, rng=random):
+    """
+    Genera series de 6 cartillas en lote
+    
+    Args:
+        num_strips: Número de series a generar
+        start_id: ID de la primera cartilla (cada serie usa 6 IDs consecutivos)
+        rng: Generador aleatorio (por defecto el módulo random)
+        
+    Returns:
+        Lista de series (cada una es una lista de 6 BingoCard)
+    """
+    get_layouts_by_counts()
+    return [generate_strip(start_id + 6 * i, rng) for i in range(num_strips)]
+
 if __name__ == "__main__":
     # Test del generador de cartillas
     print("=== Test de generador de cartillas ===\n")
@@ -30,9 +30,9 @@ class BingoCardRenderer:
         self.number_font = cfg.get_font(int(cell_size * 0.4), bold=True)
         self.title_font = cfg.get_font(int(cell_size * 0.5), bold=True)
         
-        # Calcular dimensiones
-        self.card_width = 9 * (cell_size + self.cell_spacing) + 20
-        self.card_height = 3 * (cell_size + self.cell_spacing) + 80
+        # Calcular dimensiones (3x9 en 90 bolas, 5x5 en 75 bolas)
+        self.card_width = card.COLUMNS * (cell_size + self.cell_spacing) + 20
+        self.card_height = card.ROWS * (cell_size + self.cell_spacing) + 80
     
     def draw(self, show_marked=True, highlight_current=True):
         """
@@ -163,10 +163,10 @@ class BingoCardRenderer:
         x, y = position
         
         # Obtener estadísticas
-        total_numbers = sum(1 for row in self.card.numbers for num in row if num is not None)
-        marked_count = len(self.card.marked)
-        has_line = self.card.check_line()
-        has_bingo = self.card.check_bingo()
+        total_numbers = self.card.total_numbers()
+        marked_count = total_numbers - self.card.remaining()
+        has_line = self.card.has_line()
+        has_bingo = self.card.remaining() == 0
         
         # Fuente para stats
         stats_font = cfg.get_font(24)
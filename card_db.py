@@ -0,0 +1,272 @@
+"""
+Base de datos de cartillas impresas en un archivo mapeado en memoria (mmap)
+
+Las tiradas de cartillas en papel se imprimen de 100.000 en adelante y, cuando alguien
+canta BINGO, el anfitrión tiene que verificar el número de serie en segundos. Este
+módulo guarda cada cartilla en un registro de tamaño fijo y añade un índice de series
+(tabla hash con sondeo lineal), todo en un único archivo que se abre con mmap: buscar
+y verificar una serie lee un par de páginas del disco sin cargar el archivo entero.
+
+Formato (enteros little-endian):
+    Cabecera (64 bytes):
+        magic 'BINGODB\\0', versión (u16), modo de juego (u16), tamaño de registro (u16),
+        relleno (u16), cantidad de cartillas (u64), offset del índice (u64), huecos del índice (u64)
+    Registros (desde el byte 64):
+        serie (u64) + BingoCard.to_bytes() (15 bytes en 90 bolas, 24 en 75)
+    Índice (alineado a 8 bytes):
+        huecos u64 con número de registro + 1 (0 = libre); huecos es potencia de 2
+
+Uso:
+    python card_db.py create salon.db --count 200000 --seed 2024
+    python card_db.py verify salon.db 123456 5 17 23 45 67 89 ...
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+
+from bingo_card import BingoCard, _mix64, card_class_for_mode, generate_cards, mask_to_numbers, numbers_to_mask
+
+MAGIC = b'BINGODB\x00'
+VERSION = 1
+HEADER = struct.Struct('<8sHHHHQQQ')
+HEADER_SIZE = 64
+SERIAL = struct.Struct('<Q')
+SLOT = struct.Struct('<Q')
+
+
+def _index_slots(count):
+    """Huecos del índice: la potencia de 2 que deja la tabla como mucho a la mitad"""
+    slots = 1
+    while slots < count * 2:
+        slots <<= 1
+    return slots
+
+
+def create_database(path, cards, game_mode=90):
+    """
+    Crea el archivo de base de datos a partir de un iterable de cartillas (en streaming)
+
+    Los registros se escriben a medida que llegan, así que cards puede ser un generador
+    de millones de cartillas sin tenerlas todas en memoria. El índice se construye al
+    final sobre el propio archivo mapeado.
+
+    Args:
+        path: Ruta del archivo a crear (se sobrescribe)
+        cards: Iterable de cartillas; card_id (entero) es el número de serie
+        game_mode: 90 o 75 (todas las cartillas deben ser de ese tipo)
+
+    Returns:
+        Cantidad de cartillas escritas
+
+    Raises:
+        ValueError: Si una cartilla no es del modo indicado o hay series repetidas
+    """
+    card_class = card_class_for_mode(game_mode)
+    record_size = SERIAL.size + card_class.CARD_BYTES
+    count = 0
+    with open(path, 'w+b') as f:
+        f.write(bytes(HEADER_SIZE))
+        for card in cards:
+            if card.MAX_NUMBER != game_mode:
+                raise ValueError(f"La cartilla {card.card_id} no es de {game_mode} bolas")
+            f.write(SERIAL.pack(card.card_id))
+            f.write(card.to_bytes())
+            count += 1
+
+        index_offset = (HEADER_SIZE + count * record_size + 7) & ~7
+        slots = _index_slots(count)
+        f.truncate(index_offset + slots * SLOT.size)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, game_mode, record_size, 0, count, index_offset, slots))
+        f.flush()
+
+        with mmap.mmap(f.fileno(), 0) as data:
+            mask = slots - 1
+            for record in range(count):
+                serial = SERIAL.unpack_from(data, HEADER_SIZE + record * record_size)[0]
+                slot = _mix64(serial) & mask
+                while True:
+                    position = index_offset + slot * SLOT.size
+                    stored = SLOT.unpack_from(data, position)[0]
+                    if not stored:
+                        SLOT.pack_into(data, position, record + 1)
+                        break
+                    other = SERIAL.unpack_from(data, HEADER_SIZE + (stored - 1) * record_size)[0]
+                    if other == serial:
+                        raise ValueError(f"Número de serie repetido: {serial}")
+                    slot = (slot + 1) & mask
+            data.flush()
+    return count
+
+
+class CardDatabase:
+    """Base de datos de cartillas abierta en modo solo lectura con mmap"""
+
+    def __init__(self, path):
+        """
+        Abre el archivo y valida la cabecera
+
+        Raises:
+            ValueError: Si el archivo no es una base de datos de cartillas
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} no es una base de datos de cartillas")
+        magic, version, game_mode, record_size, _, count, index_offset, slots = HEADER.unpack_from(self._data)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} no es una base de datos de cartillas")
+        self.game_mode = game_mode
+        self.card_class = card_class_for_mode(game_mode)
+        self.record_size = record_size
+        self.count = count
+        self._index_offset = index_offset
+        self._slot_mask = slots - 1
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Cierra el mapeo y el archivo"""
+        self._data.close()
+        self._file.close()
+
+    def _find(self, serial):
+        """Retorna el offset del registro con esa serie, o None si no existe"""
+        data = self._data
+        slot = _mix64(serial) & self._slot_mask
+        while True:
+            stored = SLOT.unpack_from(data, self._index_offset + slot * SLOT.size)[0]
+            if not stored:
+                return None
+            offset = HEADER_SIZE + (stored - 1) * self.record_size
+            if SERIAL.unpack_from(data, offset)[0] == serial:
+                return offset
+            slot = (slot + 1) & self._slot_mask
+
+    def __contains__(self, serial):
+        return self._find(serial) is not None
+
+    def card(self, serial):
+        """
+        Retorna la cartilla con ese número de serie
+
+        Raises:
+            KeyError: Si la serie no está en la base de datos
+        """
+        offset = self._find(serial)
+        if offset is None:
+            raise KeyError(serial)
+        start = offset + SERIAL.size
+        return self.card_class.from_bytes(self._data[start:start + self.card_class.CARD_BYTES], card_id=serial)
+
+    def verify(self, serial, drawn_numbers, kind='bingo'):
+        """
+        Verifica si la cartilla impresa con esa serie gana con los números sorteados
+
+        Args:
+            serial: Número de serie cantado
+            drawn_numbers: Lista de números sorteados o máscara entera (bit n-1 = número n)
+            kind: 'line', 'bingo' o un objeto patterns.Pattern
+
+        Returns:
+            Diccionario {'serial', 'found', 'valid', 'missing'} donde missing son los números
+            de la cartilla que aún no han salido
+        """
+        try:
+            card = self.card(serial)
+        except KeyError:
+            return {'serial': serial, 'found': False, 'valid': False, 'missing': []}
+        drawn_mask = drawn_numbers if isinstance(drawn_numbers, int) else numbers_to_mask(drawn_numbers)
+        if kind == 'bingo':
+            valid = card.mask & ~drawn_mask == 0
+        elif kind == 'line':
+            valid = any(line & ~drawn_mask == 0 for line in card.line_masks)
+        else:
+            valid = kind.applies_to(card) and kind.matches(card, drawn_mask)
+        return {'serial': serial, 'found': True, 'valid': valid, 'missing': mask_to_numbers(card.mask & ~drawn_mask)}
+
+
+def generate_database(path, count, seed=None, first_serial=1, game_mode=90, chunk=10000):
+    """
+    Genera una tirada de cartillas nuevas directamente en el archivo
+
+    Las cartillas se crean por bloques de chunk con generate_cards, así que la memoria
+    usada no depende de count.
+
+    Args:
+        path: Ruta del archivo a crear
+        count: Cantidad de cartillas
+        seed: Semilla para reproducir la tirada (opcional)
+        first_serial: Número de serie de la primera cartilla
+        game_mode: 90 o 75
+        chunk: Cartillas generadas por bloque
+    """
+    import random
+    rng = random.Random(seed)
+    card_class = card_class_for_mode(game_mode)
+    game_seed = rng.getrandbits(53)
+
+    def stream():
+        for start in range(0, count, chunk):
+            size = min(chunk, count - start)
+            if card_class is BingoCard:
+                yield from generate_cards(size, start_id=first_serial + start, rng=rng)
+            else:
+                for serial in range(first_serial + start, first_serial + start + size):
+                    yield card_class.from_seed(game_seed, serial, card_id=serial)
+
+    return create_database(path, stream(), game_mode)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Base de datos de cartillas impresas de Bingacho")
+    commands = parser.add_subparsers(dest='command', required=True)
+    create = commands.add_parser('create', help="Genera una tirada de cartillas")
+    create.add_argument('path')
+    create.add_argument('--count', type=int, required=True)
+    create.add_argument('--seed', type=int, default=None)
+    create.add_argument('--first-serial', type=int, default=1)
+    create.add_argument('--game-mode', type=int, choices=(90, 75), default=90)
+    verify = commands.add_parser('verify', help="Verifica una serie contra los números sorteados")
+    verify.add_argument('path')
+    verify.add_argument('serial', type=int)
+    verify.add_argument('numbers', type=int, nargs='*')
+    verify.add_argument('--kind', choices=('line', 'bingo'), default='bingo')
+    args = parser.parse_args(argv)
+
+    if args.command == 'create':
+        import time
+        start = time.perf_counter()
+        count = generate_database(args.path, args.count, args.seed, args.first_serial, args.game_mode)
+        elapsed = time.perf_counter() - start
+        print(f"{count:,} cartillas en {args.path} ({os.path.getsize(args.path) / 1e6:.1f} MB, {elapsed:.1f}s)")
+        return 0
+
+    with CardDatabase(args.path) as db:
+        result = db.verify(args.serial, args.numbers, args.kind)
+    if not result['found']:
+        print(f"❌ La serie {args.serial} no existe")
+        return 1
+    if result['valid']:
+        print(f"✅ Serie {args.serial}: {args.kind} válido")
+        return 0
+    print(f"❌ Serie {args.serial}: faltan {result['missing']}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+Almacén vectorizado de cartillas para salones grandes (requiere NumPy)
+
+Guarda N cartillas de 90 bolas en un arreglo contiguo (N, 3, 9) de int8 (0 = hueco)
+y las marcas en un arreglo (N,) de uint32 donde el bit fila*9+columna indica que
+esa celda está marcada. Permite generar, marcar y buscar ganadores de todo el salón
+con operaciones de NumPy en lugar de recorrer objetos BingoCard uno a uno.
+"""
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: solo lo necesita este módulo
+    np = None
+
+from bingo_card import BingoCard, COLUMN_RANGES, get_layout_table
+
+# Bits de cada fila dentro de una distribución/máscara de marcas de 27 bits
+ROW_BITS = (0x1FF, 0x1FF << 9, 0x1FF << 18)
+
+
+def _require_numpy():
+    """Lanza un error claro si NumPy no está instalado"""
+    if np is None:
+        raise ImportError("card_store necesita NumPy: pip install numpy")
+
+
+def number_column(number):
+    """Retorna la columna (0-8) en la que va un número de 1 a 90"""
+    return min(number // 10, 8)
+
+
+class CardStore:
+    """Conjunto de cartillas guardadas en arreglos de NumPy"""
+
+    def __init__(self, numbers, layouts=None, marked=None):
+        """
+        Inicializa el almacén a partir de arreglos ya construidos
+
+        Args:
+            numbers: Arreglo (N, 3, 9) de int8 con los números (0 para huecos)
+            layouts: Arreglo (N,) uint32 con la distribución de celdas (se calcula si es None)
+            marked: Arreglo (N,) uint32 con las celdas marcadas (vacío si es None)
+        """
+        _require_numpy()
+        self.numbers = np.ascontiguousarray(numbers, dtype=np.int8)
+        if layouts is None:
+            cell_bits = np.left_shift(np.uint32(1), np.arange(27, dtype=np.uint32)).reshape(3, 9)
+            layouts = np.bitwise_or.reduce(
+                np.where(self.numbers != 0, cell_bits, np.uint32(0)).reshape(len(self.numbers), 27),
+                axis=1
+            )
+        self.layouts = np.asarray(layouts, dtype=np.uint32)
+        if marked is None:
+            marked = np.zeros(len(self.numbers), dtype=np.uint32)
+        self.marked = np.asarray(marked, dtype=np.uint32)
+
+    def __len__(self):
+        return len(self.numbers)
+
+    @classmethod
+    def generate(cls, num_cards, seed=None):
+        """
+        Genera num_cards cartillas válidas de forma vectorizada
+
+        La distribución de celdas se elige de manera uniforme en la tabla
+        precalculada de bingo_card y los números de cada columna se ordenan
+        de menor a mayor, igual que en BingoCard.generate_card.
+
+        Args:
+            num_cards: Número de cartillas a generar
+            seed: Semilla para numpy.random.default_rng (opcional)
+
+        Returns:
+            Instancia de CardStore
+        """
+        _require_numpy()
+        rng = np.random.default_rng(seed)
+        table = get_layout_table()
+        table = np.frombuffer(table, dtype=f'u{table.itemsize}').astype(np.uint32, copy=False)
+        layouts = table[rng.integers(0, len(table), size=num_cards)]
+
+        numbers = np.zeros((num_cards, 3, 9), dtype=np.int8)
+        row_shifts = np.array([0, 9, 18], dtype=np.uint32)
+        for col, column_range in enumerate(COLUMN_RANGES):
+            # Celdas ocupadas de esta columna en cada cartilla: (N, 3) bool
+            occupied = ((layouts[:, None] >> (row_shifts + col)) & 1).astype(bool)
+            # 3 números distintos al azar de la columna; los sobrantes se empujan al final
+            picks = np.argsort(rng.random((num_cards, len(column_range))), axis=1)[:, :3]
+            picks = (picks + column_range.start).astype(np.int8)
+            count = occupied.sum(axis=1)
+            picks[np.arange(3) >= count[:, None]] = 127
+            picks.sort(axis=1)
+            # La k-ésima celda ocupada recibe el k-ésimo número más pequeño
+            slot = np.clip(np.cumsum(occupied, axis=1) - 1, 0, 2)
+            values = np.take_along_axis(picks, slot, axis=1)
+            numbers[:, :, col] = np.where(occupied, values, 0)
+        return cls(numbers, layouts)
+
+    @classmethod
+    def from_cards(cls, cards):
+        """Crea un almacén a partir de una lista de BingoCard (conserva las marcas)"""
+        _require_numpy()
+        numbers = np.array(
+            [[[n or 0 for n in row] for row in card.numbers] for card in cards],
+            dtype=np.int8
+        ).reshape(len(cards), 3, 9)
+        marked = [
+            sum(1 << (r * 9 + c)
+                for r, row in enumerate(card.numbers)
+                for c, number in enumerate(row)
+                if number is not None and card.is_marked(number))
+            for card in cards
+        ]
+        return cls(numbers, marked=np.array(marked, dtype=np.uint32))
+
+    def mark(self, number):
+        """
+        Marca un número en todas las cartillas que lo contienen
+
+        Args:
+            number: Número sorteado (1-90)
+
+        Returns:
+            Arreglo con los índices de las cartillas que tenían el número
+        """
+        if not 0 < number <= BingoCard.MAX_NUMBER:
+            return np.empty(0, dtype=np.intp)
+        col = number_column(number)
+        cards, rows = np.nonzero(self.numbers[:, :, col] == number)
+        self.marked[cards] |= np.left_shift(np.uint32(1), (rows * 9 + col).astype(np.uint32))
+        return cards
+
+    def mark_many(self, numbers):
+        """Marca una secuencia de números sorteados (por ejemplo, al recuperar una partida)"""
+        for number in numbers:
+            self.mark(number)
+
+    def reset_marks(self):
+        """Desmarca todas las cartillas"""
+        self.marked[:] = 0
+
+    def remaining(self):
+        """Retorna un arreglo (N,) con cuántos números le faltan a cada cartilla"""
+        pending = self.layouts & ~self.marked
+        return np.bitwise_count(pending) if hasattr(np, 'bitwise_count') else np.array(
+            [int(p).bit_count() for p in pending], dtype=np.int64
+        )
+
+    def winners(self, kind='bingo'):
+        """
+        Busca las cartillas ganadoras
+
+        Args:
+            kind: 'line' (al menos una fila completa) o 'bingo' (cartilla completa)
+
+        Returns:
+            Arreglo ordenado con los índices de las cartillas ganadoras
+        """
+        if kind == 'bingo':
+            return np.nonzero(self.marked == self.layouts)[0]
+        if kind == 'line':
+            won = np.zeros(len(self), dtype=bool)
+            for row_bits in ROW_BITS:
+                won |= (self.marked & row_bits) == (self.layouts & row_bits)
+            return np.nonzero(won)[0]
+        raise ValueError(f"Tipo de premio desconocido: {kind}")
+
+    def pattern_winners(self, pattern):
+        """
+        Busca las cartillas que cumplen un patrón de patterns.py (de 90 bolas)
+
+        Las máscaras de celdas del patrón usan el mismo bit fila*9+columna que las
+        marcas del almacén, así que cada alternativa es una comparación vectorizada.
+        Las celdas vacías de la cartilla cuentan como cumplidas.
+
+        Args:
+            pattern: Objeto patterns.Pattern para cartillas 3x9
+
+        Returns:
+            Arreglo ordenado con los índices de las cartillas ganadoras
+        """
+        if pattern.rows != 3 or pattern.columns != 9:
+            raise ValueError(f"El patrón {pattern.name} no es de 90 bolas")
+        won = np.zeros(len(self), dtype=bool)
+        for cells in pattern.alternatives:
+            cells = np.uint32(cells)
+            won |= (self.marked & cells) == (self.layouts & cells)
+        return np.nonzero(won)[0]
+
+    def card(self, index):
+        """
+        Retorna la cartilla index como BingoCard (copia con sus marcas)
+
+        Args:
+            index: Índice de la cartilla en el almacén
+        """
+        grid = [[int(n) or None for n in row] for row in self.numbers[index]]
+        card = BingoCard.from_dict({'card_id': int(index), 'numbers': grid})
+        marked = int(self.marked[index])
+        card.marked = [grid[bit // 9][bit % 9] for bit in range(27) if marked >> bit & 1]
+        return card
+
+    def nbytes(self):
+        """Memoria usada por los arreglos del almacén en bytes"""
+        return self.numbers.nbytes + self.layouts.nbytes + self.marked.nbytes
+
+
+if __name__ == "__main__":
+    import time
+
+    for size in (50000, 200000):
+        start = time.perf_counter()
+        store = CardStore.generate(size, seed=1)
+        elapsed = time.perf_counter() - start
+        print(f"{size} cartillas en {elapsed:.3f}s ({store.nbytes() / 1e6:.1f} MB)")
+
+        start = time.perf_counter()
+        for number in range(1, 91):
+            store.mark(number)
+            store.winners('line')
+        elapsed = time.perf_counter() - start
+        print(f"  90 sorteos con búsqueda de líneas: {elapsed * 1000 / 90:.2f} ms por sorteo")
@@ -0,0 +1,204 @@
+"""
+Cola de salida acotada por conexión para el servidor multijugador
+
+Cada cliente tiene su propia cola y una tarea escritora que la vacía con ws.send.
+Quien hace un broadcast solo encola (sin await), así que un teléfono con mala Wi-Fi
+no frena el reparto al resto del salón. Los mensajes que solo importan en su última
+versión (presencia, frames del espectador) se fusionan: si ya hay uno pendiente del
+mismo tipo, se reemplaza en lugar de encolar otro.
+
+Un cliente que se queda por encima de la marca de agua alta más de stall_timeout
+segundos, o que llega al límite duro de la cola, se desconecta.
+
+Si el cliente anunció batch en el registro, todo lo que se encoló en el mismo tick
+del event loop sale en un único frame: una lista con los mensajes (ver join_frames).
+"""
+
+import asyncio
+from collections import deque
+
+from wire_codec import join_frames
+
+# Tipos de mensaje que se fusionan: {tipo: clave de fusión}
+COALESCE_KEYS = {
+    'player_joined': 'presence',
+    'player_left': 'presence',
+    'spectator_frame': 'spectator_frame',
+}
+
+HIGH_WATER = 64  # Mensajes pendientes a partir de los cuales el cliente se considera lento
+MAX_PENDING = 1024  # Límite duro: al alcanzarlo se desconecta de inmediato
+STALL_TIMEOUT = 5.0  # Segundos que se tolera estar por encima de HIGH_WATER
+MAX_BATCH = 64  # Mensajes como máximo por frame agrupado
+MAX_BATCH_BYTES = 64 * 1024  # Tamaño a partir del cual no se añaden más mensajes al frame
+# Cabeceras IPv4 + TCP sin opciones: asyncio escribe cada frame en cuanto se envía,
+# así que cada frame suele salir en su propio segmento (estimación, sin TLS)
+PACKET_OVERHEAD = 40
+
+
+def ws_header_size(payload_size):
+    """Bytes de cabecera de un frame WebSocket servidor -> cliente (RFC 6455, sin máscara)"""
+    if payload_size < 126:
+        return 2
+    if payload_size < 0x10000:
+        return 4
+    return 10
+
+
+def _frame_size(frame):
+    return len(frame.encode('utf-8')) if isinstance(frame, str) else len(frame)
+
+
+class ClientOutbox:
+    """Cola de salida de una conexión, vaciada por su propia tarea escritora"""
+
+    def __init__(self, websocket, high_water=HIGH_WATER, max_pending=MAX_PENDING,
+                 stall_timeout=STALL_TIMEOUT, batch_codec=None):
+        """
+        Args:
+            websocket: Conexión a la que se escribe
+            high_water: Marca de agua alta (mensajes pendientes)
+            max_pending: Límite duro de mensajes pendientes
+            stall_timeout: Segundos por encima de high_water antes de desconectar
+            batch_codec: Códec de los frames si el cliente acepta mensajes agrupados
+                ('json' o 'binary'); None para enviar un frame por mensaje
+        """
+        self.websocket = websocket
+        self.high_water = high_water
+        self.max_pending = max_pending
+        self.stall_timeout = stall_timeout
+        self.queue = deque()  # (clave de fusión o None, mensaje JSON)
+        self.latest = {}  # {clave de fusión: último mensaje JSON pendiente}
+        self.over_since = None  # Momento en que se superó high_water
+        self.closed = False
+        self.evicted = False
+        self.batch_codec = batch_codec
+        # Estadísticas de transporte (ver stats)
+        self.messages_sent = 0
+        self.frames_sent = 0
+        self.bytes_sent = 0  # Payload de los frames, sin cabeceras
+        self.header_bytes_saved = 0  # Cabeceras ahorradas al agrupar, menos el sobre del batch
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task = self._loop.create_task(self._writer())
+
+    def __len__(self):
+        return len(self.queue)
+
+    def put(self, message_json, coalesce_key=None):
+        """
+        Encola un mensaje ya serializado (no espera al cliente)
+
+        Args:
+            message_json: Mensaje en JSON (o bytes)
+            coalesce_key: Si se indica y ya hay un mensaje pendiente con esa clave,
+                se reemplaza por este en lugar de encolar otro
+
+        Returns:
+            False si la conexión está cerrada o acaba de ser desalojada por lenta
+        """
+        if self.closed:
+            return False
+        if coalesce_key is not None:
+            if coalesce_key in self.latest:
+                self.latest[coalesce_key] = message_json
+                return True
+            self.latest[coalesce_key] = message_json
+            self.queue.append((coalesce_key, None))
+        else:
+            self.queue.append((None, message_json))
+        self._idle.clear()
+        self._wakeup.set()
+
+        pending = len(self.queue)
+        if pending > self.high_water:
+            now = self._loop.time()
+            if self.over_since is None:
+                self.over_since = now
+            if pending >= self.max_pending or now - self.over_since > self.stall_timeout:
+                self.evict()
+                return False
+        return True
+
+    def evict(self):
+        """Descarta lo pendiente y cierra la conexión por consumidor lento"""
+        if self.closed:
+            return
+        self.evicted = True
+        print(f"Cliente lento desconectado ({len(self.queue)} mensajes pendientes)")
+        self.close()
+        try:
+            self._loop.create_task(self.websocket.close(code=1008, reason="slow consumer"))
+        except AttributeError:
+            pass
+
+    def close(self):
+        """Detiene la tarea escritora y libera la cola"""
+        self.closed = True
+        self.queue.clear()
+        self.latest.clear()
+        self._idle.set()
+        self._wakeup.set()
+
+    def stats(self):
+        """
+        Diccionario con los mensajes, frames y bytes enviados por esta conexión
+
+        bytes_saved suma las cabeceras WebSocket ahorradas al agrupar (menos el sobre
+        de la lista) y PACKET_OVERHEAD por cada frame ahorrado
+        """
+        frames_saved = self.messages_sent - self.frames_sent
+        return {
+            'messages': self.messages_sent,
+            'frames': self.frames_sent,
+            'frames_saved': frames_saved,
+            'bytes': self.bytes_sent,
+            'bytes_saved': self.header_bytes_saved + frames_saved * PACKET_OVERHEAD,
+        }
+
+    def _next_frame(self):
+        """Saca de la cola el siguiente frame (agrupando lo pendiente si el cliente lo acepta)"""
+        frames = []
+        size = 0
+        limit = MAX_BATCH if self.batch_codec else 1
+        while self.queue and len(frames) < limit and size < MAX_BATCH_BYTES:
+            key, message = self.queue.popleft()
+            if key is not None:
+                message = self.latest.pop(key)
+            frames.append(message)
+            size += _frame_size(message)
+        self.messages_sent += len(frames)
+        if len(frames) == 1:
+            frame = frames[0]
+        else:
+            frame = join_frames(frames, self.batch_codec)
+            separate = sum(ws_header_size(_frame_size(f)) + _frame_size(f) for f in frames)
+            self.header_bytes_saved += separate - ws_header_size(_frame_size(frame)) - _frame_size(frame)
+        self.frames_sent += 1
+        self.bytes_sent += _frame_size(frame)
+        return frame
+
+    async def drain(self):
+        """Espera a que la cola se vacíe (o se cierre)"""
+        await self._idle.wait()
+
+    async def _writer(self):
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self.over_since = None
+                    self._idle.set()
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                frame = self._next_frame()
+                if len(self.queue) <= self.high_water:
+                    self.over_since = None
+                await self.websocket.send(frame)
+        except Exception:
+            # Conexión cerrada o rota: el servidor la desregistra al terminar handle_client
+            pass
+        finally:
+            self.close()
@@ -0,0 +1,135 @@
+"""
+Bus local de eventos de partida: publicación/suscripción sobre un socket UNIX
+
+El servidor autoritativo (BingachoServer con bus_path) publica cada broadcast de sus
+salas y los procesos de reparto (fanout_worker) se suscriben para reenviarlo a sus
+propias conexiones. Cada evento es una línea JSON:
+    {"room": id, "role": None | "spectator" | ..., "message": {...}}   broadcast de una sala
+    {"room": id, "state": {...}}                                       game_state completo
+    {"room": id, "closed": True}                                       la sala ya no existe
+Al suscribirse, un proceso recibe primero el estado de todas las salas; después, el de
+cada sala que se crea y el cierre de cada sala que se libera.
+
+Un suscriptor que no lee (más de MAX_BUFFER bytes pendientes) se desconecta: al volver
+a suscribirse recibe otra vez el estado completo, igual que un cliente que pide resync.
+"""
+
+import asyncio
+import json
+import os
+
+MAX_BUFFER = 4 * 1024 * 1024  # Bytes pendientes por suscriptor antes de desconectarlo
+LINE_LIMIT = 16 * 1024 * 1024  # Tamaño máximo de un evento (frames del espectador incluidos)
+
+
+def _line(event):
+    return (json.dumps(event) + "\n").encode("utf-8")
+
+
+class EventBus:
+    """Extremo publicador del bus (vive en el event loop del servidor autoritativo)"""
+
+    def __init__(self, path, snapshot=None):
+        """
+        Args:
+            path: Ruta del socket UNIX (se reemplaza si ya existe)
+            snapshot: Función sin argumentos que retorna {room_id: game_state} para
+                los procesos que se suscriben
+        """
+        self.path = path
+        self.snapshot = snapshot
+        self.subscribers = set()  # StreamWriter de cada proceso suscrito
+        self._tasks = set()  # Tareas que atienden a cada suscriptor
+        self.server = None
+        self.events_published = 0
+        self.dropped = 0  # Suscriptores desconectados por no leer
+
+    async def start(self):
+        """Empieza a aceptar suscriptores"""
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._subscriber, path=self.path)
+
+    async def _subscriber(self, reader, writer):
+        self._tasks.add(asyncio.current_task())
+        if self.snapshot is not None:
+            for room_id, state in self.snapshot().items():
+                writer.write(_line({"room": room_id, "state": state}))
+        self.subscribers.add(writer)
+        print(f"Proceso de reparto suscrito al bus ({len(self.subscribers)} suscriptores)")
+        try:
+            # Los suscriptores no envían nada: solo se espera al cierre
+            await reader.read()
+        except ConnectionError:
+            pass
+        finally:
+            self.subscribers.discard(writer)
+            self._tasks.discard(asyncio.current_task())
+            writer.close()
+
+    def publish(self, room_id, message, role=None):
+        """
+        Publica un broadcast de una sala (no espera a los suscriptores)
+
+        Args:
+            room_id: Sala que hizo el broadcast
+            message: Diccionario del mensaje
+            role: Rol destinatario si el broadcast era filtrado (None = todos)
+        """
+        self._publish({"room": room_id, "role": role, "message": message})
+
+    def publish_state(self, room_id, state):
+        """Publica el game_state completo de una sala (al crearla)"""
+        self._publish({"room": room_id, "state": state})
+
+    def publish_closed(self, room_id):
+        """Publica que el servidor cerró una sala: los procesos sueltan su copia"""
+        self._publish({"room": room_id, "closed": True})
+
+    def _publish(self, event):
+        if not self.subscribers:
+            return
+        line = _line(event)
+        self.events_published += 1
+        for writer in list(self.subscribers):
+            if writer.transport.get_write_buffer_size() > MAX_BUFFER:
+                print("Proceso de reparto lento desconectado del bus")
+                self.subscribers.discard(writer)
+                writer.close()
+                self.dropped += 1
+                continue
+            writer.write(line)
+
+    async def stop(self):
+        """Cierra el bus y desconecta a los suscriptores"""
+        if self.server is None:
+            return
+        self.server.close()
+        for writer in list(self.subscribers):
+            writer.close()
+        self.subscribers.clear()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.server.wait_closed()
+        self.server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+async def subscribe(path):
+    """
+    Generador asíncrono de los eventos del bus
+
+    Termina cuando el servidor cierra la conexión (el llamador decide si reintentar).
+
+    Raises:
+        OSError: Si no hay bus escuchando en path
+    """
+    reader, writer = await asyncio.open_unix_connection(path, limit=LINE_LIMIT)
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            yield json.loads(line)
+    finally:
+        writer.close()
@@ -0,0 +1,300 @@
+"""
+Procesos de reparto (fan-out) para servir a miles de espectadores
+
+Cada proceso acepta conexiones WebSocket en el mismo puerto público que los demás
+(SO_REUSEPORT: el kernel reparte las conexiones entrantes entre ellos) y se suscribe al
+bus de eventos del servidor autoritativo (event_bus). Con los eventos mantiene una copia
+de solo lectura de cada sala (MirrorRoom) y la reenvía a sus propias conexiones, así que
+el coste del reparto se divide entre procesos y no comparte el GIL con el juego.
+
+Los roles de solo lectura ('player' y 'spectator') se atienden en el proceso: registro,
+game_state, deltas, resync y ping. Solo hay copia de las salas que existen en el servidor
+(las anuncia el bus): registrarse en otra recibe room_unavailable, y cuando el servidor
+cierra una sala el proceso suelta su copia y avisa a sus conexiones con room_closed. Cualquier otro rol (jugadores interactivos) se
+reenvía tal cual al servidor autoritativo, que sigue siendo el único que valida marcas
+y reclamos.
+
+Uso:
+    python fanout_worker.py --workers 4 --bus /tmp/bingacho.sock --upstream ws://127.0.0.1:8865 --port 8765
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+
+import websockets
+
+from bingo_card import numbers_to_mask
+from event_bus import subscribe
+from input_limits import MAX_FRAME_SIZE, InputLimiter
+from multiplayer_server import DEFAULT_ROOM, MAX_ROOM_ID_LENGTH, MAX_ROOMS, GameRoom, deflate_options
+from wire_codec import CODECS, DECODE_ERRORS, decode, encode
+
+READ_ONLY_ROLES = ("player", "spectator")
+BUS_RETRY = 0.5  # Segundos entre intentos de (re)conexión al bus
+
+
+def reuseport_socket(host, port, backlog=4096):
+    """Socket TCP en escucha que comparte el puerto con los demás procesos (SO_REUSEPORT)"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+class MirrorRoom(GameRoom):
+    """Copia de solo lectura de una sala del servidor autoritativo, alimentada por el bus"""
+
+    def __init__(self, room_id, outboxes):
+        super().__init__(room_id, outboxes=outboxes)
+        self.total_players = 0  # Jugadores de la sala en el servidor autoritativo
+
+    def game_state(self):
+        state = super().game_state()
+        state["total_players"] = self.total_players
+        return state
+
+    def apply_state(self, state):
+        """
+        Reemplaza el estado por un game_state completo del servidor
+
+        Returns:
+            True si la partida o sus sorteos cambiaron respecto a la copia
+        """
+        changed = state.get("game_id") != self.game_id or state.get("seq") != len(self.drawn_numbers)
+        self.game_started = state.get("game_started", False)
+        self.drawn_numbers = list(state.get("drawn_numbers", []))
+        self.drawn_mask = numbers_to_mask(self.drawn_numbers)
+        self.current_number = state.get("current_number")
+        self.game_id = state.get("game_id", self.game_id)
+        self.game_mode = state.get("game_mode", self.game_mode)
+        self.total_players = state.get("total_players", self.total_players)
+        return changed
+
+    def apply(self, message):
+        """Actualiza la copia con un broadcast de la sala (mismo efecto que en el servidor)"""
+        msg_type = message.get("type")
+        if msg_type == "new_number":
+            self.current_number = message["number"]
+            if message.get("seq", 0) > len(self.drawn_numbers):
+                self.drawn_numbers.append(message["number"])
+                self.drawn_mask |= 1 << (message["number"] - 1)
+        elif msg_type == "game_started":
+            self.game_started = True
+        elif msg_type == "game_reset":
+            self.game_started = False
+            self.drawn_numbers = []
+            self.drawn_mask = 0
+            self.current_number = None
+            self.game_paused = False
+            self.game_id = message.get("game_id", self.game_id + 1)
+        elif msg_type == "game_paused":
+            self.game_paused = True
+        elif msg_type == "game_resumed":
+            self.game_paused = False
+        elif msg_type in ("player_joined", "player_left"):
+            self.total_players = message.get("total_players", self.total_players)
+
+
+class FanoutWorker:
+    """Proceso de reparto: conexiones de solo lectura servidas desde las copias de las salas"""
+
+    def __init__(self, bus_path, upstream_url, host='0.0.0.0', port=8765, worker_id=0, compression=True):
+        """
+        Args:
+            bus_path: Ruta del socket UNIX del bus de eventos
+            upstream_url: URL del servidor autoritativo para los roles que no son de solo lectura
+            host: Dirección de escucha
+            port: Puerto público (compartido con los demás procesos)
+            worker_id: Número del proceso (solo para los mensajes de consola)
+            compression: Activa permessage-deflate (mismos ajustes que el servidor)
+        """
+        self.bus_path = bus_path
+        self.upstream_url = upstream_url
+        self.host = host
+        self.port = port
+        self.worker_id = worker_id
+        self.compression = compression
+        self.rooms = {}  # {room_id: MirrorRoom}
+        self.outboxes = {}  # {websocket: ClientOutbox}
+        self.connections = {}  # {websocket: MirrorRoom}
+        self.proxied = 0  # Conexiones reenviadas al servidor autoritativo
+        self.server = None
+
+    def room(self, room_id=None):
+        """Retorna la copia de una sala (None si el servidor no la anunció)"""
+        return self.rooms.get(DEFAULT_ROOM if room_id is None else room_id)
+
+    async def close_room(self, room_id):
+        """Suelta la copia de una sala que el servidor cerró (sus conexiones quedan sin registrar)"""
+        room = self.rooms.pop(room_id, None)
+        if room is None:
+            return
+        await room.broadcast_message({"type": "room_closed", "room": room_id})
+        for websocket in list(room.clients):
+            room.leave(websocket)
+            self.connections.pop(websocket, None)
+
+    async def apply(self, event):
+        """Aplica un evento del bus a la copia de su sala y lo reenvía a sus conexiones"""
+        room_id = event["room"]
+        if event.get("closed"):
+            await self.close_room(room_id)
+            return
+        room = self.rooms.get(room_id)
+        if room is None:
+            if len(self.rooms) >= MAX_ROOMS:
+                return
+            room = self.rooms[room_id] = MirrorRoom(room_id, self.outboxes)
+        if "state" in event:
+            # Suscripción nueva (o tras reconectar al bus): quien tenga otra versión recibe el estado
+            if room.apply_state(event["state"]) and room.clients:
+                await room.broadcast_message(room.game_state())
+            return
+        message = event["message"]
+        room.apply(message)
+        await room.broadcast_message_filtered(message, event.get("role"))
+
+    async def handle_client(self, websocket):
+        """Atiende una conexión: registro local para roles de solo lectura, proxy para el resto"""
+        limiter = InputLimiter()  # Mismos límites que en el servidor autoritativo
+        try:
+            async for frame in websocket:
+                if not limiter.admit_frame(frame):
+                    continue
+                try:
+                    data = decode(frame)
+                except DECODE_ERRORS:
+                    limiter.reject()
+                    continue
+                msg_type = limiter.admit(data)
+                if msg_type is None:
+                    continue
+                room = self.connections.get(websocket)
+                if room is None:
+                    if msg_type != "register":
+                        continue
+                    role = data.get("role", "player")
+                    if role not in READ_ONLY_ROLES:
+                        await self.proxy(websocket, frame)
+                        return
+                    room_id = data.get("room")
+                    if not isinstance(room_id, str) or not 0 < len(room_id) <= MAX_ROOM_ID_LENGTH:
+                        room_id = None
+                    codec = data.get("codec") if data.get("codec") in CODECS else "json"
+                    room = self.room(room_id)
+                    if room is None:
+                        await websocket.send(encode({"type": "room_unavailable", "room": room_id}, codec))
+                        continue
+                    room.join(websocket, data.get("nickname", "anon"), role, codec=codec,
+                              batch=bool(data.get("batch")), packed_cards=bool(data.get("packed_cards")))
+                    self.connections[websocket] = room
+                    await room.send_game_state(websocket)
+                    continue
+
+                if msg_type == "resync":
+                    await room.handle_resync(websocket, data.get("game_id"), data.get("seq"))
+                elif msg_type == "ping":
+                    room.send_to(websocket, {"type": "pong"})
+                # El resto (sorteos, reinicios...) solo lo acepta el servidor autoritativo
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except Exception as e:
+            print(f"Error en cliente (proceso {self.worker_id}): {e}")
+        finally:
+            outbox = self.outboxes.pop(websocket, None)
+            if outbox is not None:
+                outbox.close()
+            room = self.connections.pop(websocket, None)
+            if room is not None:
+                room.leave(websocket)
+
+    async def proxy(self, websocket, first_frame):
+        """Reenvía la conexión al servidor autoritativo en ambos sentidos hasta que una se cierre"""
+        self.proxied += 1
+        async with websockets.connect(self.upstream_url, compression=None) as upstream:
+            await upstream.send(first_frame)
+
+            async def pump(source, target):
+                async for frame in source:
+                    await target.send(frame)
+
+            tasks = [asyncio.create_task(pump(websocket, upstream)), asyncio.create_task(pump(upstream, websocket))]
+            try:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    async def run(self):
+        """Escucha en el puerto compartido y sigue el bus (reconectando si se corta)"""
+        options = deflate_options() if self.compression else {"compression": None}
+        self.server = await websockets.serve(self.handle_client, sock=reuseport_socket(self.host, self.port),
+                                             ping_interval=20, ping_timeout=20, max_size=MAX_FRAME_SIZE,
+                                             **options)
+        print(f"Proceso de reparto {self.worker_id} escuchando en {self.host}:{self.port}")
+        while True:
+            try:
+                async for event in subscribe(self.bus_path):
+                    await self.apply(event)
+            except OSError:
+                pass
+            await asyncio.sleep(BUS_RETRY)
+
+
+def run_worker(bus_path, upstream_url, host='0.0.0.0', port=8765, worker_id=0):
+    """Punto de entrada de un proceso de reparto"""
+    try:
+        asyncio.run(FanoutWorker(bus_path, upstream_url, host, port, worker_id).run())
+    except KeyboardInterrupt:
+        pass
+
+
+def start_workers(count, bus_path, upstream_url, host='0.0.0.0', port=8765):
+    """
+    Lanza count procesos de reparto en el mismo puerto
+
+    Cada uno es un intérprete nuevo que ejecuta este módulo (no hereda pygame, la
+    ventana ni los hilos del juego). Se detienen con terminate().
+
+    Returns:
+        Lista de subprocess.Popen
+    """
+    script = os.path.abspath(__file__)
+    return [
+        subprocess.Popen([sys.executable, script, '--workers', '1', '--id', str(worker_id), '--bus', bus_path,
+                          '--upstream', upstream_url, '--host', host, '--port', str(port)])
+        for worker_id in range(count)
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Procesos de reparto de Bingacho")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--id', type=int, default=0, help="Número del proceso (con --workers 1)")
+    parser.add_argument('--bus', required=True, help="Socket UNIX del bus del servidor")
+    parser.add_argument('--upstream', required=True, help="URL del servidor autoritativo")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+    if args.workers == 1:
+        run_worker(args.bus, args.upstream, args.host, args.port, args.id)
+        return 0
+    processes = start_workers(args.workers, args.bus, args.upstream, args.host, args.port)
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
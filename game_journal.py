@@ -0,0 +1,187 @@
+"""
+Diario de la partida (append-only) para recuperarse de una caída del servidor
+
+Cada cambio de estado de una sala (sorteos, registros, cartillas asignadas, marcas,
+reclamos de bingo...) se añade como una línea JSON con un número de secuencia creciente
+(campo "n"). Un hilo escritor agrupa lo que llegó mientras hacía el fsync anterior y lo
+escribe con un único fsync (group commit), así que el event loop solo serializa y encola.
+
+Cada SNAPSHOT_EVERY registros se escribe una instantánea completa del estado de todas
+las salas (<path>.snap, reemplazada de forma atómica) y el diario se vacía. Al arrancar
+se carga la instantánea y se aplican solo los registros posteriores a su "n", de modo
+que una caída entre la instantánea y el vaciado no duplica eventos. Una última línea
+incompleta (caída a mitad de escritura) se descarta.
+"""
+
+import json
+import os
+import queue
+import threading
+
+SNAPSHOT_EVERY = 1000  # Registros entre instantáneas
+
+
+class _Snapshot:
+    """Instantánea pendiente de escribir (el estado ya es una copia hecha en el event loop)"""
+
+    def __init__(self, state):
+        self.state = state
+
+
+class GameJournal:
+    """Diario de eventos con escritura agrupada en un hilo propio"""
+
+    def __init__(self, path, snapshot=None, snapshot_every=SNAPSHOT_EVERY):
+        """
+        Args:
+            path: Ruta del diario (la instantánea se guarda en path + '.snap')
+            snapshot: Función sin argumentos que retorna el estado completo de las salas
+                ({room_id: estado}); se llama en el hilo del event loop
+            snapshot_every: Registros entre instantáneas
+        """
+        self.path = path
+        self.snapshot_path = path + '.snap'
+        self.snapshot = snapshot
+        self.snapshot_every = snapshot_every
+        self.lsn = 0  # Número de secuencia del último registro
+        self.since_snapshot = 0
+        self._snapshot_due = False
+        self.commits = 0  # fsyncs del diario
+        self.snapshots = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    def load(self):
+        """
+        Lee la instantánea y los registros posteriores, y deja el diario listo para seguir
+
+        Returns:
+            Tupla (estado de las salas de la instantánea o {}, lista de registros a aplicar)
+        """
+        rooms = {}
+        start = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as f:
+                snapshot = json.load(f)
+            rooms = snapshot['rooms']
+            start = snapshot['n']
+        self.lsn = start
+
+        records = []
+        if os.path.exists(self.path):
+            valid = 0
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    valid += len(line)
+                    if record['n'] > start:
+                        records.append(record)
+                        self.lsn = record['n']
+            if valid < os.path.getsize(self.path):
+                # Cola de una escritura interrumpida por la caída
+                with open(self.path, 'r+b') as f:
+                    f.truncate(valid)
+        self.since_snapshot = len(records)
+        return rooms, records
+
+    def open(self):
+        """Arranca el hilo escritor"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._writer, name="bingacho-journal", daemon=True)
+            self._thread.start()
+
+    def append(self, record):
+        """
+        Añade un registro (no espera al disco)
+
+        El llamador registra un cambio justo antes o después de aplicarlo, sin await de
+        por medio; por eso la instantánea que toca se toma al llegar el registro siguiente,
+        cuando el anterior ya está aplicado en el estado.
+
+        Args:
+            record: Diccionario serializable en JSON; se le añade el número de secuencia "n"
+        """
+        if self._snapshot_due:
+            self.write_snapshot()
+        self.lsn += 1
+        line = json.dumps({'n': self.lsn, **record}, separators=(',', ':')) + '\n'
+        self._queue.put(line.encode('utf-8'))
+        self.since_snapshot += 1
+        if self.snapshot is not None and self.since_snapshot >= self.snapshot_every:
+            self._snapshot_due = True
+
+    def write_snapshot(self):
+        """Encola una instantánea del estado actual; al escribirla se vacía el diario"""
+        self._queue.put(_Snapshot({'n': self.lsn, 'rooms': self.snapshot()}))
+        self.since_snapshot = 0
+        self._snapshot_due = False
+
+    def flush(self):
+        """Bloquea hasta que todo lo añadido hasta ahora esté en disco (pruebas y apagado)"""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        """Escribe una instantánea final, vacía la cola y detiene el hilo escritor"""
+        if self._thread is None:
+            return
+        if self.snapshot is not None:
+            self.write_snapshot()
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def _write_snapshot_file(self, state):
+        temporary = self.snapshot_path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(json.dumps(state, separators=(',', ':')).encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.snapshot_path)
+        directory = os.open(os.path.dirname(os.path.abspath(self.snapshot_path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        self.snapshots += 1
+
+    def _writer(self):
+        with open(self.path, 'ab') as f:
+            running = True
+            while running:
+                # Todo lo que se encoló mientras se hacía el fsync anterior va en este
+                batch = [self._queue.get()]
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                pending = bytearray()
+                waiters = []
+                for item in batch:
+                    if item is None:
+                        running = False
+                    elif isinstance(item, bytes):
+                        pending += item
+                    elif isinstance(item, _Snapshot):
+                        # La instantánea incluye todo lo anterior: el diario empieza de cero
+                        self._write_snapshot_file(item.state)
+                        pending.clear()
+                        f.truncate(0)
+                    else:
+                        waiters.append(item)
+                if pending:
+                    f.write(pending)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self.commits += 1
+                for waiter in waiters:
+                    waiter.set()
@@ -0,0 +1,126 @@
+"""
+Límites de entrada por conexión para el servidor multijugador (token bucket)
+
+Cada conexión tiene un cubo para todos sus frames, que se consulta antes de decodificar
+(junto con MAX_MESSAGE_SIZE), y un cubo por tipo de mensaje, que se consulta en cuanto
+se conoce el tipo. Un cubo de capacidad burst se rellena a rate fichas por segundo y
+cada mensaje gasta una; sin fichas el mensaje se descarta sin respuesta, así que una
+pestaña que inunda de ping o mark_number no consigue que el servidor trabaje por ella.
+
+Los tipos que no están en MESSAGE_LIMITS comparten un único cubo (DEFAULT_LIMIT): un
+cliente no puede crear cubos inventando tipos.
+"""
+
+import time
+
+MAX_MESSAGE_SIZE = 4096  # Bytes de un mensaje entrante (el mayor legítimo es el registro)
+MAX_FRAME_SIZE = 64 * 1024  # max_size de websockets: por encima se cierra la conexión sin leerlo
+FRAME_LIMIT = (30.0, 60)  # (fichas por segundo, capacidad) para frames de cualquier tipo
+MESSAGE_LIMITS = {
+    "register": (1.0, 3),
+    "ping": (0.5, 3),  # Los clientes envían uno cada 15 s
+    "resync": (2.0, 5),
+    "mark_number": (5.0, 30),
+    "bingo_claim": (0.5, 2),
+    "verify_serial": (5.0, 20),
+}
+DEFAULT_LIMIT = (10.0, 30)
+OTHER = "other"  # Clave de los tipos sin límite propio en las estadísticas
+
+
+class TokenBucket:
+    """Cubo de fichas: rate fichas por segundo hasta un máximo de burst"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'stamp')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.stamp = now
+
+    def take(self, now):
+        """Gasta una ficha si la hay (True) o deja el cubo como está (False)"""
+        tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if tokens < 1:
+            self.tokens = tokens
+            return False
+        self.tokens = tokens - 1
+        return True
+
+
+class InputLimiter:
+    """Límites y contadores de los mensajes que envía una conexión"""
+
+    def __init__(self, max_size=MAX_MESSAGE_SIZE, frame_limit=FRAME_LIMIT, limits=MESSAGE_LIMITS,
+                 default_limit=DEFAULT_LIMIT, clock=time.monotonic):
+        """
+        Args:
+            max_size: Tamaño máximo de un frame (bytes o caracteres)
+            frame_limit: (rate, burst) del cubo común a todos los frames
+            limits: {tipo de mensaje: (rate, burst)}
+            default_limit: (rate, burst) del cubo compartido por los demás tipos
+            clock: Reloj en segundos (monotónico)
+        """
+        self.max_size = max_size
+        self.limits = limits
+        self.default_limit = default_limit
+        self.clock = clock
+        self.frames = TokenBucket(*frame_limit, clock())
+        self.buckets = {}  # {tipo o OTHER: TokenBucket}, se crean con el primer mensaje
+        self.accepted = 0
+        self.dropped = 0  # Frames demasiado grandes o que no son un mensaje válido
+        self.throttled = {}  # {tipo o OTHER, o "frame" para el cubo común: mensajes descartados}
+
+    def _throttle(self, key):
+        self.throttled[key] = self.throttled.get(key, 0) + 1
+
+    def admit_frame(self, frame):
+        """
+        Comprueba un frame antes de decodificarlo
+
+        Returns:
+            True si se puede decodificar; False si se descarta (ya contado)
+        """
+        if len(frame) > self.max_size:
+            self.dropped += 1
+            return False
+        if not self.frames.take(self.clock()):
+            self._throttle("frame")
+            return False
+        return True
+
+    def admit(self, data):
+        """
+        Comprueba un mensaje ya decodificado contra el cubo de su tipo
+
+        Returns:
+            El tipo del mensaje si se acepta; None si se descarta (ya contado)
+        """
+        msg_type = data.get("type") if isinstance(data, dict) else None
+        if not isinstance(msg_type, str):
+            self.dropped += 1
+            return None
+        key = msg_type if msg_type in self.limits else OTHER
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(*self.limits.get(key, self.default_limit), self.clock())
+        if not bucket.take(self.clock()):
+            self._throttle(key)
+            return None
+        self.accepted += 1
+        return msg_type
+
+    def reject(self):
+        """Cuenta como descartado un frame que no se pudo decodificar"""
+        self.dropped += 1
+
+    def stats(self):
+        """Diccionario con los mensajes aceptados, descartados y limitados (total y por tipo)"""
+        return {
+            'accepted': self.accepted,
+            'dropped': self.dropped,
+            'throttled': sum(self.throttled.values()),
+            'throttled_by_type': dict(self.throttled),
+        }
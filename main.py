@@ -1778,7 +1778,7 @@ def reset_game():
     
     # Si estamos en modo cliente, reiniciar la cartilla
     if multiplayer_manager.is_client_mode() and multiplayer_manager.player_card:
-        multiplayer_manager.player_card.marked.clear()
+        multiplayer_manager.player_card.reset_marks()
         print("Cartilla reiniciada")
     
     # Reproducir sonido de reinicio
@@ -2118,7 +2118,7 @@ while game_state.running:
                 if claim['valid']:
                     # BINGO válido: Activar victoria en el host
                     game_state.bingo_called = True
-                    game_state.winner_name = claim['player']
+                    game_state.winner_name = ', '.join(claim.get('winners') or [claim['player']])
                     game_state.show_confetti = True
                     game_state.confetti_particles = create_confetti()
                     game_state.bingo_animation_start = pygame.time.get_ticks()
@@ -8,20 +8,25 @@ import websockets
 import json
 import threading
 from queue import Queue
+from wire_codec import decode, encode, iter_messages
 
 class BingachoClient:
     """Cliente para conectarse a partidas multijugador de Bingacho"""
     
-    def __init__(self, server_url, nickname):
+    def __init__(self, server_url, nickname, codec="json", room=None):
         """
         Inicializa el cliente
         
         Args:
             server_url: URL del servidor WebSocket (ej: ws://192.168.1.100:8765)
             nickname: Nickname del jugador
+            codec: 'json' o 'binary' (ver wire_codec); se negocia en el registro
+            room: Sala a la que unirse (None para la sala por defecto del servidor)
         """
         self.server_url = server_url
         self.nickname = nickname
+        self.codec = codec
+        self.room = room
         self.websocket = None
         self.connected = False
         self.message_queue = Queue()  # Cola para mensajes recibidos
@@ -33,6 +38,8 @@ class BingachoClient:
         self.drawn_numbers = []
         self.current_number = None
         self.total_players = 0
+        self.game_id = None  # Partida del servidor a la que corresponde drawn_numbers
+        self.seq = 0  # Último sorteo aplicado (== len(drawn_numbers))
     
     async def connect_async(self):
         """Conecta al servidor de forma asíncrona"""
@@ -41,10 +48,15 @@ class BingachoClient:
             self.connected = True
             
             # Enviar mensaje de registro
+            # El registro siempre va en JSON: anuncia el códec del resto de la sesión
             register_message = {
                 "type": "register",
-                "nickname": self.nickname
+                "nickname": self.nickname,
+                "codec": self.codec,
+                "batch": True
             }
+            if self.room:
+                register_message["room"] = self.room
             await self.websocket.send(json.dumps(register_message))
             
             print(f"Conectado al servidor como {self.nickname}")
@@ -59,14 +71,14 @@ class BingachoClient:
     async def listen_messages(self):
         """Escucha mensajes del servidor"""
         try:
-            async for message in self.websocket:
-                data = json.loads(message)
-                
-                # Poner el mensaje en la cola para procesarlo en el thread principal
-                self.message_queue.put(data)
-                
-                # Procesar mensaje en el thread async
-                await self.handle_message(data)
+            async for frame in self.websocket:
+                # Un frame puede traer varios mensajes agrupados
+                for data in iter_messages(decode(frame)):
+                    # Poner el mensaje en la cola para procesarlo en el thread principal
+                    self.message_queue.put(data)
+                    
+                    # Procesar mensaje en el thread async
+                    await self.handle_message(data)
                 
         except websockets.exceptions.ConnectionClosed:
             print("Conexión cerrada por el servidor")
@@ -90,14 +102,29 @@ class BingachoClient:
             self.drawn_numbers = data["drawn_numbers"]
             self.current_number = data["current_number"]
             self.total_players = data["total_players"]
+            self.game_id = data.get("game_id")
+            self.seq = data.get("seq", len(self.drawn_numbers))
             print(f"Estado del juego recibido: {len(self.drawn_numbers)} números sorteados")
             
         elif msg_type == "new_number":
-            # Nuevo número sorteado
+            # Nuevo número sorteado: solo llega el delta {seq, number}
             self.current_number = data["number"]
-            self.drawn_numbers = data["drawn_numbers"]
+            if data.get("game_id") == self.game_id and data.get("seq") == self.seq + 1:
+                self.drawn_numbers.append(data["number"])
+                self.seq = data["seq"]
+            elif data.get("game_id") != self.game_id or data.get("seq", 0) > self.seq:
+                # Faltan sorteos intermedios (o no vimos el reinicio): pedir resincronización
+                await self.request_resync()
             print(f"Nuevo número: {self.current_number}")
             
+        elif msg_type == "draws":
+            # Respuesta a resync: los sorteos desde nuestro seq
+            start = data["seq"] - len(data["numbers"])
+            if data.get("game_id") == self.game_id and start <= self.seq:
+                self.drawn_numbers.extend(data["numbers"][self.seq - start:])
+                self.seq = data["seq"]
+                self.current_number = data.get("current_number", self.current_number)
+            
         elif msg_type == "game_started":
             # Juego iniciado
             self.game_started = True
@@ -108,6 +135,8 @@ class BingachoClient:
             self.game_started = False
             self.drawn_numbers = []
             self.current_number = None
+            self.game_id = data.get("game_id")
+            self.seq = 0
             print("Juego reiniciado")
             
         elif msg_type == "player_joined":
@@ -119,6 +148,14 @@ class BingachoClient:
             # Jugador se fue
             self.total_players = data["total_players"]
             print(f"Jugador {data['nickname']} se fue ({self.total_players} jugadores)")
+            
+        elif msg_type == "room_unavailable":
+            # El servidor ya tiene el máximo de salas: no quedamos registrados
+            print(f"No se pudo entrar en la sala {data.get('room')}: el servidor está lleno")
+    
+    async def request_resync(self):
+        """Pide al servidor los sorteos posteriores al último seq aplicado"""
+        await self.send_message_async({"type": "resync", "game_id": self.game_id, "seq": self.seq})
     
     async def send_message_async(self, message):
         """
@@ -129,7 +166,7 @@ class BingachoClient:
         """
         if self.connected and self.websocket:
             try:
-                await self.websocket.send(json.dumps(message))
+                await self.websocket.send(encode(message, self.codec))
             except Exception as e:
                 print(f"Error enviando mensaje: {e}")
     
@@ -189,19 +226,21 @@ def get_client_instance():
     global _client_instance
     return _client_instance
 
-def create_client(server_url, nickname):
+def create_client(server_url, nickname, codec="json", room=None):
     """
     Crea una nueva instancia del cliente
     
     Args:
         server_url: URL del servidor
         nickname: Nickname del jugador
+        codec: 'json' o 'binary'
+        room: Sala a la que unirse (opcional)
         
     Returns:
         Instancia del cliente
     """
     global _client_instance
-    _client_instance = BingachoClient(server_url, nickname)
+    _client_instance = BingachoClient(server_url, nickname, codec, room)
     return _client_instance
 
 def disconnect_client():
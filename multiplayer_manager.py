@@ -14,10 +14,14 @@ import queue
 from http.server import HTTPServer, SimpleHTTPRequestHandler
 from multiplayer_server import BingachoServer, get_server_instance
 from multiplayer_client import BingachoClient, create_client, get_client_instance
-from bingo_card import BingoCard, generate_unique_cards
+from fanout_worker import start_workers
+from bingo_card import card_class_for_mode, generate_unique_cards
 from bingo_card_renderer import BingoCardRenderer
 import config as cfg
 
+FANOUT_UPSTREAM_OFFSET = 100  # Puerto interno del servidor cuando hay procesos de reparto
+
+
 class MultiplayerManager:
     """Gestiona el modo multijugador del juego"""
     
@@ -29,6 +33,8 @@ class MultiplayerManager:
         self.http_server = None
         self.http_thread = None
         self.http_port = 8080 # Puerto por defecto
+        self.ws_port = None  # Puerto WS público (el de los procesos de reparto si los hay)
+        self.fanout_processes = []  # Procesos de reparto (ver fanout_worker)
         self.player_card = None  # Cartilla del jugador (solo en modo cliente)
         self.card_renderer = None  # Renderizador de la cartilla
         self.nickname = ""
@@ -41,13 +47,19 @@ class MultiplayerManager:
         self._last_frame_time = 0
         self._stream_interval = 0.05
         
-    def start_server_mode(self, nickname, port=8765):
+    def start_server_mode(self, nickname, port=8765, workers=0, journal_path=None):
         """
         Inicia el modo servidor
         
         Args:
             nickname: Nickname del host
             port: Puerto del servidor
+            workers: Procesos de reparto en el puerto público (0 = el servidor atiende
+                todas las conexiones). Con workers > 0 el servidor escucha solo en
+                127.0.0.1:port+FANOUT_UPSTREAM_OFFSET y publica sus eventos en un bus local
+            journal_path: Diario de la partida (ver game_journal). Si el servidor se cayó a
+                mitad de partida, al reiniciar con la misma ruta se recuperan los sorteos y
+                las cartillas de los jugadores
             
         Returns:
             True si se inició correctamente, False si hubo error
@@ -61,6 +73,12 @@ class MultiplayerManager:
             self.server = get_server_instance()
             self.server.port = port
             self.server.game_mode = cfg.TOTAL_NUMBERS
+            if journal_path and self.server.journal is None:
+                self.server.open_journal(journal_path)
+            if workers:
+                self.server.host = '127.0.0.1'
+                self.server.port = port + FANOUT_UPSTREAM_OFFSET
+                self.server.bus_path = os.path.join(tempfile.gettempdir(), f"bingacho-{os.getpid()}.sock")
             
             # Iniciar servidor en un thread separado
             def run_server():
@@ -82,6 +100,12 @@ class MultiplayerManager:
                 print("ADVERTENCIA: El servidor WS parece no haber arrancado correctamente (posible puerto en uso)")
                 # No retornamos False aquí porque puede tardar un poco más, pero avisamos
 
+            self.ws_port = port if workers else self.server.port
+            if workers:
+                upstream_url = f"ws://127.0.0.1:{self.server.port}"
+                self.fanout_processes = start_workers(workers, self.server.bus_path, upstream_url, '0.0.0.0', port)
+                print(f"{workers} procesos de reparto en el puerto {port}")
+
             # Iniciar servidor HTTP para servir el cliente web
             self._start_http_server(port=8080)
 
@@ -118,12 +142,12 @@ class MultiplayerManager:
             # Crear URL del servidor
             server_url = f"ws://{server_ip}:{port}"
             
-            # Crear cliente
-            self.client = create_client(server_url, nickname)
+            # Crear cliente (servidor y cliente son nuestros: códec binario)
+            self.client = create_client(server_url, nickname, codec="binary")
             self.client.start_connection_thread()
             
             # Generar cartilla para el jugador
-            self.player_card = BingoCard(card_id=nickname)
+            self.player_card = card_class_for_mode(cfg.TOTAL_NUMBERS)(card_id=nickname)
             
             # Crear renderizador si se proporcionó screen
             if screen:
@@ -140,6 +164,11 @@ class MultiplayerManager:
     def stop(self):
         """Detiene el modo multijugador actual"""
         if self.mode == "server" and self.server:
+            # Detener procesos de reparto
+            for process in self.fanout_processes:
+                process.terminate()
+            self.fanout_processes = []
+            
             # Detener servidor HTTP
             if self.http_server:
                 try:
@@ -217,6 +246,25 @@ class MultiplayerManager:
                     asyncio.run_coroutine_threadsafe(send(), self.server.loop)
             except Exception as e:
                 print(f"Error enviando reinicio de juego: {e}")
+    
+    def send_patterns(self, names):
+        """
+        Activa los patrones ganadores de una partida especial (solo en modo servidor)
+        
+        Args:
+            names: Lista de nombres de patrones (ver patterns.PATTERNS), ej. ['two_lines']
+        """
+        if self.mode == "server" and self.server:
+            try:
+                async def send():
+                    try:
+                        await self.server.handle_set_patterns(names)
+                    except ValueError as e:
+                        print(f"Patrones no válidos: {e}")
+                if hasattr(self.server, 'loop') and self.server.loop:
+                    asyncio.run_coroutine_threadsafe(send(), self.server.loop)
+            except Exception as e:
+                print(f"Error configurando patrones: {e}")
 
     def set_server_screen(self, screen, interval=0.05):
         """
@@ -341,7 +389,7 @@ class MultiplayerManager:
                         self.end_headers()
                         
                         # Obtener el puerto WS actual del servidor
-                        ws_port = manager_instance.server.port if manager_instance.server else 8765
+                        ws_port = manager_instance.ws_port or (manager_instance.server.port if manager_instance.server else 8765)
                         
                         response = json.dumps({"ws_port": ws_port, "game_mode": manager_instance.server.game_mode if manager_instance.server else 90})
                         self.wfile.write(response.encode('utf-8'))
@@ -403,10 +451,16 @@ class MultiplayerManager:
                             elif self.player_card.check_line():
                                 print("¡LÍNEA!")
                 
+                elif msg_type == "draws":
+                    # Sorteos recuperados tras una resincronización
+                    if self.player_card:
+                        for number in msg["numbers"]:
+                            self.player_card.mark_number(number)
+                
                 elif msg_type == "game_reset":
                     # Reiniciar cartilla
                     if self.player_card:
-                        self.player_card.marked.clear()
+                        self.player_card.reset_marks()
                         print("Juego reiniciado, cartilla limpiada")
     
     def draw_card(self, screen):
@@ -431,7 +485,7 @@ class MultiplayerManager:
                 "mode": "server",
                 "active": self.is_active,
                 "nickname": self.nickname,
-                "connected_clients": len(self.server.clients) if self.server else 0,
+                "connected_clients": len(self.server.connections) if self.server else 0,
                 "ip": local_ip,
                 "http_url": f"http://{local_ip}:{self.http_port}" if self.http_server else "Iniciando...",
                 "interactive_players": len(self.server.interactive_players) if self.server else 0
@@ -471,9 +525,11 @@ class MultiplayerManager:
         return [
             {
                 'nickname': info['nickname'],
-                'marked_count': len(info['card'].marked),
-                'has_line': info['card'].check_line(),
-                'has_bingo': info['card'].check_bingo()
+                'marked_count': info['card'].marked_count(),
+                'remaining': info['card'].remaining(),
+                'best_row_remaining': info['card'].best_row_remaining(),
+                'has_line': info['card'].has_line(),
+                'has_bingo': info['card'].remaining() == 0
             }
             for info in self.server.interactive_players.values()
         ]
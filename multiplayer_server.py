@@ -5,151 +5,524 @@ El servidor gestiona la partida, distribuye números y sincroniza con los client
 
 import asyncio
 import websockets
-import json
+from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+import random
+import secrets
 import socket
 import time
 from datetime import datetime
-from bingo_card import BingoCard
+from bingo_card import card_class_for_mode, mask_to_numbers, numbers_to_mask
+from client_outbox import COALESCE_KEYS, ClientOutbox
+from event_bus import EventBus
+from game_journal import GameJournal
+from input_limits import MAX_FRAME_SIZE, InputLimiter
+from patterns import find_pattern_winners, get_pattern
+from wire_codec import CODECS, DECODE_ERRORS, decode, encode
 
-class BingachoServer:
-    """Servidor para gestionar partidas multijugador de Bingacho"""
+DEFAULT_ROOM = "main"  # Sala del anfitrión (la pantalla de la TV/proyector)
+MAX_ROOMS = 64  # Salas simultáneas como máximo en un servidor
+MAX_ROOM_ID_LENGTH = 32
+RESUME_GRACE = 120.0  # Segundos que se guarda la cartilla de un jugador interactivo desconectado
+SUPERSEDED_CLOSE = (4000, "superseded")  # Cierre de una conexión reemplazada por una reanudación
+CLAIM_WINDOW = 0.05  # Segundos que se esperan otros reclamos antes de verificar un lote
+HOST_MESSAGES = ("new_number", "game_start", "game_reset")  # Solo los acepta de un cliente 'host'
+
+
+class GameRoom:
+    """
+    Una partida con su propio estado y su propio conjunto de clientes
+    
+    Cada sala tiene sus números sorteados, su pausa por reclamo de bingo, sus cartillas
+    interactivas e índices, y reparte solo a sus clientes: sortear en una sala recorre
+    únicamente las conexiones y cartillas de esa sala. Las colas de salida (outboxes)
+    son por conexión y se comparten con el servidor que aloja la sala. Si hay bus de
+    eventos, cada broadcast se publica también para los procesos de reparto; si hay
+    diario, cada cambio de estado se registra en él (ver game_journal).
+    
+    Cada jugador interactivo recibe con su cartilla un token de sesión. Si se desconecta,
+    la cartilla y sus marcas se guardan resume_grace segundos: al volver con el token
+    recibe solo los sorteos que se perdió, sin game_state ni cartilla nueva.
     
-    def __init__(self, host='0.0.0.0', port=8765):
+    Los reclamos de bingo no se verifican en el handler de cada cliente: se encolan con
+    su hora de llegada y una única tarea por sala los verifica por lotes, todos contra el
+    mismo sorteo, y publica un solo bingo_result por lote (con todos los ganadores si hay
+    empate). Solo esa tarea cambia game_paused por un reclamo.
+    """
+    
+    def __init__(self, room_id=DEFAULT_ROOM, game_mode=90, seeded_cards=False, card_database=None,
+                 auto_detect=False, outboxes=None, bus=None, journal=None, resume_grace=RESUME_GRACE):
         """
-        Inicializa el servidor
-        
         Args:
-            host: Dirección IP del servidor (0.0.0.0 para todas las interfaces)
-            port: Puerto del servidor
+            room_id: Identificador de la sala (el que envían los clientes en el registro)
+            game_mode: 90 o 75 bolas
+            seeded_cards: Cartillas por semilla (ver BingachoServer)
+            card_database: card_db.CardDatabase con las cartillas impresas (opcional)
+            auto_detect: Detección automática de líneas y bingos (ver BingachoServer)
+            outboxes: Diccionario {websocket: ClientOutbox} compartido con el servidor
+            bus: event_bus.EventBus donde publicar los broadcasts (opcional)
+            journal: game_journal.GameJournal donde registrar los cambios de estado (opcional)
+            resume_grace: Segundos que un jugador interactivo desconectado puede reanudar su sesión
         """
-        self.host = host
-        self.port = port
+        self.room_id = room_id
         self.clients = {}  # {websocket: {"nickname": str, "connected_at": datetime, "role": "player"|"spectator"}}
-        self.drawn_numbers = []  # Números sorteados en orden
+        # Conexiones por rol: broadcasts filtrados en O(destinos) y conteos en O(1)
+        self.roles = {"player": set(), "interactive_player": set(), "spectator": set(), "host": set()}
+        self.drawn_numbers = []  # Números sorteados en orden (seq del sorteo i = i + 1)
+        self.drawn_mask = 0  # Máscara de bits de drawn_numbers (pertenencia en O(1))
+        self.game_id = 1  # Identifica la partida en curso: cambia en cada reinicio
         self.current_number = None  # Número actual
         self.game_started = False
-        self.server = None
-        self.interactive_players = {}  # {websocket: {'card': BingoCard, 'nickname': str}}
+        self.outboxes = {} if outboxes is None else outboxes  # {websocket: ClientOutbox} cola de salida de cada conexión
+        self.interactive_players = {}  # {websocket: {'card': BingoCard, 'nickname': str, 'called_mask': int}}
+        self.number_index = {}  # {número: set(websocket)} cartillas interactivas que contienen cada número
         self.game_paused = False
-        self.game_mode = 90  # Número total: 90 o 75
+        self.game_mode = game_mode  # Número total: 90 o 75
         self.latest_bingo_claim = None  # { 'player': str, 'valid': bool, 'reason': str, 'timestamp': float }
-        
-    def get_local_ip(self):
-        """Obtiene la IP local del servidor"""
-        try:
-            # Crear un socket y conectarse a una dirección externa
-            # No se envía nada, solo se usa para obtener la IP local
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect(("8.8.8.8", 80))
-            local_ip = s.getsockname()[0]
-            s.close()
-            return local_ip
-        except Exception:
-            return "localhost"
+        self.winning_seq = None  # Sorteo del primer bingo válido de la partida (los empates son de ese sorteo)
+        self.seeded_cards = seeded_cards
+        self.active_patterns = []  # Patrones de la partida especial en curso (objetos Pattern)
+        self.pattern_winners = {}  # {nombre del patrón: set(websocket)} ganadores ya anunciados
+        self.game_seed = random.getrandbits(53)  # 53 bits: viaja en JSON sin perder precisión
+        self.next_serial = 0
+        self.card_database = card_database
+        self.auto_detect = auto_detect
+        self.auto_winners = {'line': set(), 'bingo': set()}  # websockets ya anunciados
+        self.bus = bus
+        self.journal = journal
+        self.resume_grace = resume_grace
+        self.sessions = {}  # {token: websocket} sesiones de jugadores interactivos conectados
+        # {token: {'nickname', 'card', 'websocket', 'expires'}} desconectados (o recuperados del
+        # diario, con websocket None), en orden de caducidad
+        self.suspended = {}
+        self.claims = None  # asyncio.Queue de reclamos (se crea con el primero, ya dentro del event loop)
+        self.claim_task = None
+        self.claim_window = CLAIM_WINDOW
+        self.idle_since = None  # Desde cuándo la sala no tiene clientes ni sesiones suspendidas
+    
+    def _record(self, op, **fields):
+        """Añade un registro de esta sala al diario (si lo hay)"""
+        if self.journal is not None:
+            self.journal.append({"op": op, "room": self.room_id, **fields})
     
-    async def register_client(self, websocket, nickname):
+    def _journal_card(self, card):
+        """Cartilla serializada para el diario (con sus marcas)"""
+        return card.to_dict(compact=True) if self.seeded_cards else card.to_packed_dict()
+    
+    def join(self, websocket, nickname, role="player", **options):
         """
-        Registra un nuevo cliente
+        Añade una conexión a los clientes de la sala y a su índice por rol
         
         Args:
             websocket: Conexión WebSocket del cliente
             nickname: Nickname del cliente
+            role: 'player', 'interactive_player', 'spectator' o 'host'
+            options: Datos adicionales del cliente (ej. packed_cards=True)
         """
-        # Por defecto el cliente es un jugador; si envía role en el primer mensaje, será actualizado
+        self.leave(websocket)
         self.clients[websocket] = {
             "nickname": nickname,
             "connected_at": datetime.now(),
-            "role": "player"
+            "role": role,
+            **options
         }
+        self.roles.setdefault(role, set()).add(websocket)
+    
+    def leave(self, websocket):
+        """
+        Quita una conexión de la sala: del índice por rol y, si tenía cartilla, del índice de números
         
-        print(f"Cliente conectado: {nickname} ({len(self.clients)} clientes totales)")
+        Returns:
+            Los datos del cliente, o None si no estaba en la sala
+        """
+        info = self.clients.pop(websocket, None)
+        if info is not None:
+            self.roles[info["role"]].discard(websocket)
+            token = info.get("resume_token")
+            player = self.interactive_players.pop(websocket, None)
+            if player is not None:
+                self.unindex_card(websocket, player['card'])
+            if player is not None and self.sessions.get(token) is websocket:
+                # La cartilla espera a que el jugador vuelva con su token (sigue en el diario)
+                del self.sessions[token]
+                self.suspend(token, player['nickname'], player['card'], websocket)
+        self.expire_sessions()
+        return info
+    
+    def count_role(self, role):
+        """Cantidad de clientes conectados con un rol (O(1))"""
+        return len(self.roles.get(role, ()))
+    
+    def index_card(self, websocket, card):
+        """
+        Registra una cartilla interactiva en el índice invertido número -> cartillas
         
-        # Enviar estado actual del juego al nuevo cliente
-        await self.send_game_state(websocket)
+        Args:
+            websocket: Conexión WebSocket del jugador dueño de la cartilla
+            card: BingoCard asignada
+            
+        Returns:
+            Máscara de bits con los números de la cartilla que ya fueron sorteados
+        """
+        for number in mask_to_numbers(card.mask):
+            self.number_index.setdefault(number, set()).add(websocket)
+        return card.mask & self.drawn_mask
+    
+    def unindex_card(self, websocket, card):
+        """Elimina una cartilla del índice invertido"""
+        for number in mask_to_numbers(card.mask):
+            holders = self.number_index.get(number)
+            if holders is not None:
+                holders.discard(websocket)
+    
+    def assign_card(self, websocket, nickname):
+        """
+        Crea e indexa una cartilla nueva para un jugador interactivo
+        (de 90 o 75 bolas según game_mode)
+        
+        La cartilla queda en el diario con el token de sesión del jugador (open_session),
+        que es lo que permite devolvérsela tras una caída.
+        
+        Args:
+            websocket: Conexión WebSocket del jugador
+            nickname: Nickname del jugador
+            
+        Returns:
+            La BingoCard asignada
+        """
+        previous = self.interactive_players.get(websocket)
+        if previous is not None:
+            self.unindex_card(websocket, previous['card'])
+        card_class = card_class_for_mode(self.game_mode)
+        if self.seeded_cards:
+            card = card_class.from_seed(self.game_seed, self.next_serial, card_id=nickname, keep_grid=False)
+            self.next_serial += 1
+        else:
+            card = card_class(card_id=nickname)
+        token = self.clients.get(websocket, {}).get("resume_token")
+        self._record("assign", token=token, nickname=nickname, card=self._journal_card(card),
+                     next_serial=self.next_serial)
+        self.attach_card(websocket, nickname, card)
+        return card
+    
+    def attach_card(self, websocket, nickname, card):
+        """Indexa una cartilla (nueva o reanudada) como la de un jugador interactivo"""
+        called_mask = self.index_card(websocket, card)
+        self.interactive_players[websocket] = {
+            'card': card,
+            'nickname': nickname,
+            'called_mask': called_mask,
+            'patterns': {}  # Máscaras compiladas de cada patrón para esta cartilla
+        }
+        if self.auto_detect:
+            # Contadores de números aún no cantados, por línea y en toda la cartilla
+            pending = card.mask & ~called_mask
+            self.interactive_players[websocket]['called_lines'] = [
+                (line & pending).bit_count() for line in card.line_masks
+            ]
+            self.interactive_players[websocket]['called_remaining'] = pending.bit_count()
+    
+    def open_session(self, websocket):
+        """
+        Crea el token de sesión de un jugador interactivo ya registrado en la sala
+        (antes de asignarle la cartilla, para que el diario la guarde con ese token)
+        
+        Returns:
+            El token (se envía al cliente junto con su cartilla)
+        """
+        token = secrets.token_urlsafe(16)
+        self.sessions[token] = websocket
+        self.clients[websocket]["resume_token"] = token
+        return token
+    
+    def suspend(self, token, nickname, card, websocket=None):
+        """Deja la cartilla de un token a la espera de que el jugador la reanude (resume_grace segundos)"""
+        self.suspended.pop(token, None)
+        self.suspended[token] = {
+            'nickname': nickname,
+            'card': card,
+            'websocket': websocket,
+            'expires': time.monotonic() + self.resume_grace
+        }
+    
+    def expire_sessions(self):
+        """Libera las cartillas de los jugadores que no volvieron dentro del periodo de gracia"""
+        now = time.monotonic()
+        while self.suspended:
+            token, session = next(iter(self.suspended.items()))
+            if session['expires'] > now:
+                break
+            del self.suspended[token]
+            self._record("leave", token=token)
+    
+    def take_session(self, token):
+        """Saca la sesión suspendida de ese token (None si no existe o ya caducó)"""
+        self.expire_sessions()
+        return self.suspended.pop(token, None)
+    
+    def resume_session(self, websocket, token, session):
+        """
+        Devuelve a una conexión ya registrada en la sala la cartilla de una sesión suspendida
         
-        # Notificar a todos los clientes sobre el nuevo jugador
+        Los ganadores ya anunciados con la conexión anterior pasan a la nueva. Si la cartilla
+        viene del diario (sin conexión anterior), lo que ya cumplía se marca como anunciado
+        sin volver a anunciarlo: se anunció antes de la caída.
+        
+        Args:
+            websocket: Conexión nueva del jugador
+            token: Token de sesión que envió el cliente
+            session: Sesión retornada por take_session
+            
+        Returns:
+            La BingoCard reanudada
+        """
+        previous = session['websocket']
+        for winners in (*self.pattern_winners.values(), *self.auto_winners.values()):
+            if previous in winners:
+                winners.discard(previous)
+                winners.add(websocket)
+        self.attach_card(websocket, session['nickname'], session['card'])
+        if previous is None:
+            self.restore_winners(websocket)
+        self.sessions[token] = websocket
+        self.clients[websocket]["resume_token"] = token
+        return session['card']
+    
+    def restore_winners(self, websocket):
+        """Marca como ya anunciados los patrones, la línea y el bingo que una cartilla ya cumple"""
+        for name, winners in self.find_pattern_winners([websocket]).items():
+            self.pattern_winners[name].update(winners)
+        info = self.interactive_players[websocket]
+        if self.auto_detect:
+            if 0 in info['called_lines']:
+                self.auto_winners['line'].add(websocket)
+            if info['called_remaining'] == 0:
+                self.auto_winners['bingo'].add(websocket)
+    
+    def card_payload(self, websocket, card):
+        """
+        Serializa una cartilla para enviarla a un cliente
+        
+        Con cartillas por semilla basta con game_seed y serial. Si el cliente anunció
+        packed_cards en el registro se envía el formato binario compacto en base64;
+        si no, la grilla completa en JSON.
+        """
+        if self.seeded_cards:
+            return card.to_dict(compact=True)
+        if self.clients.get(websocket, {}).get("packed_cards"):
+            return card.to_packed_dict()
+        return card.to_dict()
+    
+    def set_patterns(self, names):
+        """
+        Configura los patrones ganadores de una partida especial
+        
+        Args:
+            names: Lista de nombres de patrones (ver patterns.PATTERNS), ej. ['two_lines']
+            
+        Raises:
+            ValueError: Si algún patrón no existe para el modo de juego actual (no se cambia nada)
+        """
+        self.active_patterns = [get_pattern(self.game_mode, name) for name in names]
+        self.pattern_winners = {pattern.name: set() for pattern in self.active_patterns}
+        self._record("patterns", names=list(names))
+    
+    async def handle_set_patterns(self, names):
+        """
+        Activa los patrones de una partida especial y los anuncia a la sala
+        
+        Raises:
+            ValueError: Si names no es una lista de patrones del modo de juego actual
+        """
+        if not isinstance(names, list):
+            raise ValueError("names debe ser una lista de nombres de patrones")
+        self.set_patterns(names)
         await self.broadcast_message({
-            "type": "player_joined",
-            "nickname": nickname,
-            "total_players": len(self.clients)
+            "type": "patterns_set",
+            "patterns": [
+                {"name": pattern.name, "description": pattern.description}
+                for pattern in self.active_patterns
+            ]
         })
+        print(f"Patrones activos: {', '.join(names) or 'ninguno'}")
     
-    async def unregister_client(self, websocket):
+    def find_pattern_winners(self, websockets=None, patterns=None):
         """
-        Desregistra un cliente
+        Evalúa los patrones sobre las cartillas interactivas en una sola pasada
+        
+        Se usa la máscara de números sorteados de cada cartilla (called_mask), es decir,
+        gana quien tiene el patrón cubierto por números ya cantados.
         
         Args:
-            websocket: Conexión WebSocket del cliente
+            websockets: Conexiones a evaluar (por defecto, todas las interactivas)
+            patterns: Patrones a evaluar (por defecto, active_patterns)
+            
+        Returns:
+            Diccionario {nombre del patrón: [websocket, ...]}
         """
-        if websocket in self.clients:
-            nickname = self.clients[websocket]["nickname"]
-            del self.clients[websocket]
-            if websocket in self.interactive_players:
-                del self.interactive_players[websocket]
-            print(f"Cliente desconectado: {nickname} ({len(self.clients)} clientes restantes)")
+        if websockets is None:
+            websockets = self.interactive_players.keys()
+        players = self.interactive_players
+        entries = (
+            (ws, players[ws]['card'], players[ws]['called_mask'], players[ws]['patterns'])
+            for ws in websockets if ws in players
+        )
+        return find_pattern_winners(entries, self.active_patterns if patterns is None else patterns)
+    
+    def update_pattern_winners(self, websockets):
+        """
+        Evalúa los patrones activos sobre las cartillas indicadas y registra los ganadores nuevos
+        
+        Returns:
+            Diccionario {nombre del patrón: [nickname, ...]} solo con los ganadores nuevos
+        """
+        new_winners = {}
+        for name, winners in self.find_pattern_winners(websockets).items():
+            fresh = [ws for ws in winners if ws not in self.pattern_winners[name]]
+            if fresh:
+                self.pattern_winners[name].update(fresh)
+                new_winners[name] = [self.interactive_players[ws]['nickname'] for ws in fresh]
+        return new_winners
+    
+    def update_auto_winners(self, websockets, bit):
+        """
+        Descuenta un número cantado de los contadores de las cartillas que lo contienen
+        y registra las que completan línea o cartilla
+        
+        Args:
+            websockets: Conexiones cuyas cartillas contienen el número
+            bit: Bit del número sorteado (1 << (número - 1))
             
-            # Notificar a todos los clientes
-            await self.broadcast_message({
-                "type": "player_left",
-                "nickname": nickname,
-                "total_players": len(self.clients)
-            })
+        Returns:
+            Diccionario {'line': [nickname, ...], 'bingo': [nickname, ...]} con los ganadores nuevos
+        """
+        new_winners = {'line': [], 'bingo': []}
+        for ws in websockets:
+            info = self.interactive_players[ws]
+            info['called_remaining'] -= 1
+            lines = info['called_lines']
+            for i, line in enumerate(info['card'].line_masks):
+                if line & bit:
+                    lines[i] -= 1
+            if ws not in self.auto_winners['line'] and 0 in lines:
+                self.auto_winners['line'].add(ws)
+                new_winners['line'].append(info['nickname'])
+            if info['called_remaining'] == 0 and ws not in self.auto_winners['bingo']:
+                self.auto_winners['bingo'].add(ws)
+                new_winners['bingo'].append(info['nickname'])
+        return new_winners
     
-    async def send_game_state(self, websocket):
+    def verify_paper_card(self, serial, kind='bingo'):
         """
-        Envía el estado actual del juego a un cliente específico
+        Verifica una cartilla impresa por su número de serie contra los números sorteados
         
         Args:
-            websocket: Conexión WebSocket del cliente
+            serial: Número de serie cantado en el salón
+            kind: 'line' o 'bingo'
+            
+        Returns:
+            Diccionario de CardDatabase.verify, o None si no hay base de datos cargada
         """
-        state = {
+        if self.card_database is None:
+            return None
+        return self.card_database.verify(serial, self.drawn_mask, kind)
+    
+    def cards_with_number(self, number):
+        """Retorna las conexiones cuyas cartillas contienen el número (sin recorrer todas)"""
+        return self.number_index.get(number, ())
+    
+    def game_state(self):
+        """Mensaje game_state con el estado actual de la partida"""
+        return {
             "type": "game_state",
+            "room": self.room_id,
             "game_started": self.game_started,
             "drawn_numbers": self.drawn_numbers,
             "current_number": self.current_number,
-            "total_players": len([c for c in self.clients.values() if c.get("role") == "player"]),
+            "game_id": self.game_id,
+            "seq": len(self.drawn_numbers),
+            "total_players": self.count_role("player"),
             "game_mode": self.game_mode
         }
-        await websocket.send(json.dumps(state))
+    
+    async def send_game_state(self, websocket):
+        """
+        Envía el estado actual del juego a un cliente específico
+        
+        Args:
+            websocket: Conexión WebSocket del cliente
+        """
+        self.send_to(websocket, self.game_state())
+    
+    def outbox(self, websocket):
+        """
+        Retorna la cola de salida de una conexión (la crea si no existe)
+        
+        Los clientes que anunciaron batch en el registro reciben agrupado en un solo
+        frame todo lo que se encola para ellos en el mismo tick del event loop.
+        """
+        outbox = self.outboxes.get(websocket)
+        if outbox is None:
+            info = self.clients.get(websocket, {})
+            batch_codec = info.get("codec", "json") if info.get("batch") else None
+            outbox = self.outboxes[websocket] = ClientOutbox(websocket, batch_codec=batch_codec)
+        return outbox
+    
+    def send_to(self, websocket, message):
+        """
+        Encola un mensaje para un cliente sin esperar a que lo reciba
+        
+        Args:
+            websocket: Conexión destino
+            message: Diccionario (se serializa con el códec del cliente) o mensaje ya serializado
+        """
+        outbox = self.outbox(websocket)
+        if isinstance(message, dict):
+            coalesce_key = COALESCE_KEYS.get(message.get("type"))
+            message = encode(message, self.clients.get(websocket, {}).get("codec", "json"))
+        else:
+            coalesce_key = None
+        outbox.put(message, coalesce_key)
+    
+    def _enqueue_all(self, message, targets):
+        """Serializa una vez por códec y encola el mensaje en la cola de cada destino"""
+        frames = {}
+        coalesce_key = COALESCE_KEYS.get(message.get("type"))
+        for ws in targets:
+            codec = self.clients.get(ws, {}).get("codec", "json")
+            frame = frames.get(codec)
+            if frame is None:
+                frame = frames[codec] = encode(message, codec)
+            self.outbox(ws).put(frame, coalesce_key)
     
     async def broadcast_message(self, message, exclude=None):
         """
         Envía un mensaje a todos los clientes conectados
         
+        Solo encola en la cola de cada cliente: nunca espera al cliente más lento.
+        
         Args:
             message: Diccionario con el mensaje a enviar
             exclude: WebSocket a excluir (opcional)
         """
         if self.clients:
-            message_json = json.dumps(message)
-            # Enviar a todos los clientes excepto el excluido
-            websockets_to_send = [ws for ws in self.clients.keys() if ws != exclude]
-            
-            # Usar gather para enviar a todos simultáneamente
-            if websockets_to_send:
-                await asyncio.gather(
-                    *[ws.send(message_json) for ws in websockets_to_send],
-                    return_exceptions=True
-                )
+            self._enqueue_all(message, [ws for ws in self.clients if ws != exclude])
+        if self.bus is not None:
+            self.bus.publish(self.room_id, message)
 
     async def broadcast_message_filtered(self, message, role_filter=None, exclude=None):
         """
         Envía un mensaje JSON a los clientes que coincidan con el role_filter.
-        role_filter: None (todos), 'player' o 'spectator'
+        role_filter: None (todos), 'player', 'interactive_player' o 'spectator'
         """
-        if not self.clients:
+        if role_filter is None:
+            await self.broadcast_message(message, exclude)
             return
 
-        message_json = json.dumps(message)
-        targets = []
-        for ws, meta in self.clients.items():
-            if ws == exclude:
-                continue
-            if role_filter is None or meta.get("role") == role_filter:
-                targets.append(ws)
-
+        targets = [ws for ws in self.roles.get(role_filter, ()) if ws != exclude]
         if targets:
-            await asyncio.gather(*[ws.send(message_json) for ws in targets], return_exceptions=True)
+            self._enqueue_all(message, targets)
+        if self.bus is not None:
+            self.bus.publish(self.room_id, message, role_filter)
     
     async def handle_new_number(self, number):
         """
@@ -157,23 +530,219 @@ class BingachoServer:
         
         Args:
             number: Número sorteado
+            
+        Returns:
+            False si el número no es válido para el modo de juego (no cambia nada)
         """
+        # Antes de tocar el estado o el diario: un número inválido no debe dejar nada a medias
+        if type(number) is not int or not 0 < number <= self.game_mode:
+            print(f"Número no válido ignorado: {number!r}")
+            return False
         self.current_number = number
-        if number not in self.drawn_numbers:
+        self._record("draw", number=number)
+        new_winners = {}
+        auto_winners = None
+        bit = 1 << (number - 1)
+        if not self.drawn_mask & bit:
             self.drawn_numbers.append(number)
+            self.drawn_mask |= bit
+            # Solo se actualizan las cartillas que contienen el número
+            affected = self.cards_with_number(number)
+            for ws in affected:
+                self.interactive_players[ws]['called_mask'] |= bit
+            # Y solo ellas pueden completar un patrón, una línea o la cartilla en este sorteo
+            if self.active_patterns and affected:
+                new_winners = self.update_pattern_winners(affected)
+            if self.auto_detect:
+                auto_winners = self.update_auto_winners(affected, bit)
         
-        # Broadcast a todos los clientes
+        # Solo el delta: seq es la posición del número en drawn_numbers; si un cliente
+        # ve un salto en seq pide 'resync' y recibe lo que le falta
         await self.broadcast_message({
             "type": "new_number",
-            "number": number,
-            "drawn_numbers": self.drawn_numbers
+            "game_id": self.game_id,
+            "seq": len(self.drawn_numbers),
+            "number": number
         })
         
+        if new_winners:
+            await self.broadcast_message({
+                "type": "pattern_winners",
+                "number": number,
+                "winners": new_winners
+            })
+        
+        # Todos los ganadores simultáneos del sorteo van en un único mensaje
+        if auto_winners and (auto_winners['line'] or auto_winners['bingo']):
+            await self.broadcast_message({
+                "type": "winners",
+                "number": number,
+                "line": auto_winners['line'],
+                "bingo": auto_winners['bingo']
+            })
+        
         print(f"Número sorteado: {number}")
+        return True
+    
+    async def handle_resync(self, websocket, game_id, seq):
+        """
+        Reenvía a un cliente los sorteos que se perdió
+        
+        Args:
+            websocket: Conexión del cliente
+            game_id: Partida que el cliente cree que está en curso
+            seq: Último seq que el cliente aplicó
+        """
+        if game_id != self.game_id or not isinstance(seq, int) or not 0 <= seq <= len(self.drawn_numbers):
+            # Otra partida o estado irreconocible: estado completo
+            await self.send_game_state(websocket)
+            return
+        self.send_to(websocket, {
+            "type": "draws",
+            "game_id": self.game_id,
+            "seq": len(self.drawn_numbers),
+            "numbers": self.drawn_numbers[seq:],
+            "current_number": self.current_number
+        })
+    
+    def submit_claim(self, websocket):
+        """
+        Encola un reclamo de bingo con la hora de llegada al servidor
+        
+        Se guarda cómo estaba la partida en ese momento (seq, números cantados y marcas de
+        la cartilla): el reclamo se verifica contra eso, aunque se sortee otro número antes
+        de verificarlo o el jugador se desconecte. Se descarta si la partida se reinicia.
+        """
+        player_info = self.interactive_players.get(websocket)
+        if player_info is None:
+            return
+        if self.claims is None:
+            self.claims = asyncio.Queue()
+            self.claim_task = asyncio.create_task(self._claim_verifier())
+        card = player_info['card']
+        self.claims.put_nowait({
+            'received_at': time.time(),
+            'game_id': self.game_id,
+            'seq': len(self.drawn_numbers),
+            'websocket': websocket,
+            'nickname': player_info['nickname'],
+            'mask': card.mask,
+            'marked_mask': card.marked_mask,
+            'called_mask': player_info['called_mask'],
+            'auto_bingo': websocket in self.auto_winners['bingo'],
+            'card': card.to_dict()
+        })
+    
+    async def drain_claims(self):
+        """Espera a que se verifiquen todos los reclamos encolados (pruebas y apagado)"""
+        if self.claims is not None:
+            await self.claims.join()
+    
+    def stop_claims(self):
+        """Detiene la tarea verificadora (los reclamos pendientes se descartan)"""
+        if self.claim_task is not None:
+            self.claim_task.cancel()
+        self.claims = None
+        self.claim_task = None
+    
+    async def _claim_verifier(self):
+        """Único consumidor de la cola: junta los reclamos que llegan juntos y los verifica"""
+        while True:
+            batch = [await self.claims.get()]
+            await asyncio.sleep(self.claim_window)
+            while not self.claims.empty():
+                batch.append(self.claims.get_nowait())
+            try:
+                await self.verify_claims(batch)
+            except Exception as e:
+                print(f"Error verificando reclamos: {e}")
+            finally:
+                for _ in batch:
+                    self.claims.task_done()
+    
+    async def verify_claims(self, batch):
+        """
+        Verifica un lote de reclamos y publica un único resultado
+        
+        Cada reclamo se evalúa con lo que había al recibirlo (ver submit_claim). Empatan
+        solo los bingos válidos del primer sorteo con ganador (winning_seq); uno válido de
+        un sorteo posterior llegó tarde y se rechaza. Los reclamos se ordenan por hora de
+        llegada; los de otra partida y los repetidos del mismo jugador se descartan. Si
+        ninguno es válido la partida se reanuda, salvo que ya estuviera pausada por un bingo
+        válido anterior.
+        
+        Args:
+            batch: Lista de reclamos encolados por submit_claim
+        """
+        valid = []
+        rejected = []
+        claimed = set()
+        for claim in sorted(batch, key=lambda claim: claim['received_at']):
+            if claim['game_id'] != self.game_id or claim['websocket'] in claimed:
+                continue
+            claimed.add(claim['websocket'])
+            if self.auto_detect:
+                # El ganador ya se detectó al sortear: basta con lo que había al reclamar
+                complete = all_valid = claim['auto_bingo']
+            else:
+                complete = claim['mask'] & ~claim['marked_mask'] == 0
+                # Verificar que todos los números marcados fueron sorteados
+                all_valid = claim['marked_mask'] & ~claim['called_mask'] == 0
+            if complete and all_valid:
+                valid.append(claim)
+            else:
+                reason = 'Números marcados no válidos' if complete else 'No todos los números están marcados'
+                rejected.append({'player': claim['nickname'], 'reason': reason})
+        if not claimed:
+            return
+        
+        if valid and self.winning_seq is None:
+            self.winning_seq = min(claim['seq'] for claim in valid)
+        winners = [claim for claim in valid if claim['seq'] <= self.winning_seq]
+        rejected += [{'player': claim['nickname'], 'reason': 'Bingo posterior al del ganador'}
+                     for claim in valid if claim['seq'] > self.winning_seq]
+        seq = self.winning_seq if winners else len(self.drawn_numbers)
+        
+        was_paused = self.game_paused
+        self.game_paused = was_paused or bool(winners)
+        self.latest_bingo_claim = {
+            'player': winners[0]['nickname'] if winners else rejected[0]['player'],
+            'winners': [claim['nickname'] for claim in winners],
+            'valid': bool(winners),
+            'reason': None if winners else rejected[0]['reason'],
+            'seq': seq,
+            'timestamp': time.time()
+        }
+        self._record("claim", claim=self.latest_bingo_claim)
+        
+        if not was_paused:
+            await self.broadcast_message({
+                'type': 'game_paused',
+                'reason': 'bingo_claim',
+                'player': self.latest_bingo_claim['player']
+            })
+        result = {
+            'type': 'bingo_result',
+            'game_id': self.game_id,
+            'seq': seq,
+            'valid': bool(winners),
+            'player': self.latest_bingo_claim['player'],
+            'rejected': rejected
+        }
+        if winners:
+            result['card'] = winners[0]['card']
+            result['winners'] = [{'player': claim['nickname'], 'card': claim['card']} for claim in winners]
+            print(f"¡BINGO VÁLIDO! Ganadores: {', '.join(self.latest_bingo_claim['winners'])}")
+        else:
+            result['reason'] = rejected[0]['reason']
+        await self.broadcast_message(result)
+        if not self.game_paused:
+            await self.broadcast_message({'type': 'game_resumed'})
     
     async def handle_game_start(self):
         """Maneja el inicio del juego"""
         self.game_started = True
+        self._record("start")
         await self.broadcast_message({
             "type": "game_started"
         })
@@ -183,27 +752,572 @@ class BingachoServer:
         """Maneja el reinicio del juego"""
         self.game_started = False
         self.drawn_numbers = []
+        self.drawn_mask = 0
+        self.game_id += 1
         self.current_number = None
         self.game_paused = False
         self.latest_bingo_claim = None
+        self.winning_seq = None
+        self.game_seed = random.getrandbits(53)
+        self.next_serial = 0
+        self.pattern_winners = {pattern.name: set() for pattern in self.active_patterns}
+        self.auto_winners = {'line': set(), 'bingo': set()}
+        self.suspended = {}  # Sus cartillas eran de la partida anterior: volverán a registrarse
+        self._record("reset", game_id=self.game_id, game_seed=self.game_seed)
         
-        # Regenerar cartillas para jugadores interactivos
-        for ws, info in self.interactive_players.items():
-            new_card = BingoCard(card_id=info['nickname'])
-            info['card'] = new_card
-            try:
-                await ws.send(json.dumps({
-                    'type': 'assign_card',
-                    'card': new_card.to_dict()
-                }))
-            except:
-                pass
+        # Regenerar cartillas para jugadores interactivos y reconstruir el índice
+        self.number_index = {}
+        for ws, info in list(self.interactive_players.items()):
+            new_card = self.assign_card(ws, info['nickname'])
+            self.send_to(ws, {
+                'type': 'assign_card',
+                'card': self.card_payload(ws, new_card)
+            })
         
         await self.broadcast_message({
-            "type": "game_reset"
+            "type": "game_reset",
+            "game_id": self.game_id
         })
         print("Juego reiniciado")
     
+    def journal_state(self):
+        """
+        Estado completo de la sala para la instantánea del diario (copias, no referencias)
+        
+        Las cartillas se guardan por token de sesión (los nicknames se pueden repetir): tras
+        una caída el jugador la recupera reanudando la sesión con su token.
+        """
+        players = {
+            token: {"nickname": session['nickname'], "card": self._journal_card(session['card'])}
+            for token, session in self.suspended.items()
+        }
+        for token, websocket in self.sessions.items():
+            info = self.interactive_players.get(websocket)
+            if info is not None:
+                players[token] = {"nickname": info['nickname'], "card": self._journal_card(info['card'])}
+        return {
+            "game_id": self.game_id,
+            "game_mode": self.game_mode,
+            "game_started": self.game_started,
+            "game_paused": self.game_paused,
+            "drawn_numbers": list(self.drawn_numbers),
+            "current_number": self.current_number,
+            "latest_bingo_claim": dict(self.latest_bingo_claim) if self.latest_bingo_claim else None,
+            "winning_seq": self.winning_seq,
+            "game_seed": self.game_seed,
+            "next_serial": self.next_serial,
+            "patterns": [pattern.name for pattern in self.active_patterns],
+            "players": players,
+        }
+    
+    def restore_state(self, state):
+        """Carga una instantánea de journal_state (las cartillas quedan suspendidas a la espera de su token)"""
+        self.game_id = state["game_id"]
+        self.game_mode = state["game_mode"]
+        self.game_started = state["game_started"]
+        self.game_paused = state["game_paused"]
+        self.drawn_numbers = list(state["drawn_numbers"])
+        self.drawn_mask = numbers_to_mask(self.drawn_numbers)
+        self.current_number = state["current_number"]
+        self.latest_bingo_claim = state["latest_bingo_claim"]
+        self.winning_seq = state.get("winning_seq")
+        self.game_seed = state["game_seed"]
+        self.next_serial = state["next_serial"]
+        self.active_patterns = [get_pattern(self.game_mode, name) for name in state["patterns"]]
+        self.pattern_winners = {pattern.name: set() for pattern in self.active_patterns}
+        self.suspended = {}
+        card_class = card_class_for_mode(self.game_mode)
+        for token, player in state["players"].items():
+            self.suspend(token, player["nickname"], card_class.from_dict(player["card"]))
+    
+    def replay(self, record):
+        """Aplica un registro del diario posterior a la instantánea (mismo efecto que en vivo)"""
+        op = record["op"]
+        if op == "open":
+            self.game_seed = record["game_seed"]
+            self.game_mode = record["game_mode"]
+        elif op == "draw":
+            self.current_number = record["number"]
+            bit = 1 << (record["number"] - 1)
+            if not self.drawn_mask & bit:
+                self.drawn_numbers.append(record["number"])
+                self.drawn_mask |= bit
+        elif op == "start":
+            self.game_started = True
+        elif op == "reset":
+            self.game_started = False
+            self.drawn_numbers = []
+            self.drawn_mask = 0
+            self.current_number = None
+            self.game_paused = False
+            self.latest_bingo_claim = None
+            self.winning_seq = None
+            self.game_id = record["game_id"]
+            self.game_seed = record["game_seed"]
+            self.next_serial = 0
+            self.suspended = {}
+        elif op == "assign":
+            if record["token"] is not None:
+                card = card_class_for_mode(self.game_mode).from_dict(record["card"])
+                self.suspend(record["token"], record["nickname"], card)
+            self.next_serial = record["next_serial"]
+        elif op == "mark":
+            session = self.suspended.get(record["token"])
+            if session is not None:
+                session['card'].mark_number(record["number"])
+        elif op == "claim":
+            self.latest_bingo_claim = record["claim"]
+            if record["claim"]["valid"] and self.winning_seq is None:
+                self.winning_seq = record["claim"]["seq"]
+            # Un lote rechazado no reanuda una partida ya pausada por un bingo válido
+            self.game_paused = self.game_paused or record["claim"]["valid"]
+        elif op == "leave":
+            self.suspended.pop(record["token"], None)
+        elif op == "patterns":
+            self.active_patterns = [get_pattern(self.game_mode, name) for name in record["names"]]
+            self.pattern_winners = {pattern.name: set() for pattern in self.active_patterns}
+    
+    async def handle_message(self, websocket, data):
+        """
+        Procesa un mensaje de un cliente ya registrado en la sala
+        
+        Args:
+            websocket: Conexión del cliente
+            data: Mensaje decodificado
+        """
+        msg_type = data.get("type")
+        if msg_type in HOST_MESSAGES and self.clients[websocket].get("role") != "host":
+            return
+        
+        if msg_type == "new_number":
+            await self.handle_new_number(data.get("number"))
+        elif msg_type == "game_start":
+            await self.handle_game_start()
+        elif msg_type == "game_reset":
+            await self.handle_game_reset()
+        elif msg_type == "resync":
+            await self.handle_resync(websocket, data.get("game_id"), data.get("seq"))
+        elif msg_type == "ping":
+            # Responder con pong
+            self.send_to(websocket, {"type": "pong"})
+        elif msg_type == "verify_serial":
+            # Solo el anfitrión/pantallas: los jugadores no pueden sondear series
+            if self.clients[websocket].get("role") != "interactive_player":
+                kind = data.get("kind") if data.get("kind") in ("line", "bingo") else "bingo"
+                try:
+                    serial = int(data.get("serial"))
+                except (TypeError, ValueError, OverflowError):
+                    serial = None
+                # Se responde con la serie interpretada: un valor arbitrario del cliente no
+                # tiene por qué caber en su códec (el binario solo admite enteros de 64 bits)
+                if serial is not None and not 0 <= serial < 1 << 63:
+                    serial = None
+                result = self.verify_paper_card(serial, kind) if serial is not None else None
+                self.send_to(websocket, {
+                    'type': 'serial_verification',
+                    'serial': serial,
+                    'kind': kind,
+                    'result': result
+                })
+        elif msg_type == "mark_number":
+            number = data.get("number")
+            if websocket in self.interactive_players:
+                player_info = self.interactive_players[websocket]
+                card = player_info['card']
+                valid = type(number) is int and 0 < number <= self.game_mode
+                if not valid or not self.drawn_mask >> (number - 1) & 1:
+                    self.send_to(websocket, {
+                        'type': 'mark_rejected',
+                        'number': number,
+                        'reason': 'not_called'
+                    })
+                elif not card.mark_number(number):
+                    self.send_to(websocket, {
+                        'type': 'mark_rejected',
+                        'number': number,
+                        'reason': 'not_on_card'
+                    })
+                else:
+                    self._record("mark", token=self.clients[websocket].get("resume_token"), number=number)
+                    self.send_to(websocket, {
+                        'type': 'mark_confirmed',
+                        'number': number,
+                        'marked_count': card.marked_count(),
+                        'total': card.total_numbers()
+                    })
+        elif msg_type == "bingo_claim":
+            self.submit_claim(websocket)
+
+
+class BingachoServer(GameRoom):
+    """
+    Servidor para gestionar partidas multijugador de Bingacho
+    
+    El servidor es a la vez la sala por defecto (DEFAULT_ROOM, la que maneja el anfitrión
+    desde el juego) y el registro de las demás salas: un cliente que indica "room" en el
+    registro entra en esa sala. Solo un cliente con role 'host' (y la host_key del
+    servidor) puede crear salas y sortear, iniciar o reiniciar por WebSocket. Una sala sin
+    clientes ni sesiones suspendidas se cierra (y sale del diario) si no tiene sorteos o
+    tras resume_grace segundos así.
+    """
+    
+    def __init__(self, host='0.0.0.0', port=8765, seeded_cards=False, card_database=None, auto_detect=False,
+                 compression=True, deflate_window_bits=11, deflate_mem_level=4, deflate_level=6,
+                 max_rooms=MAX_ROOMS, bus_path=None, journal_path=None, resume_grace=RESUME_GRACE,
+                 host_key=None):
+        """
+        Inicializa el servidor
+        
+        Args:
+            host: Dirección IP del servidor (0.0.0.0 para todas las interfaces)
+            port: Puerto del servidor
+            seeded_cards: Si es True, cada cartilla queda determinada por
+                (game_seed, serial): el servidor no guarda la grilla y assign_card
+                envía solo la semilla y el número de serie
+            card_database: card_db.CardDatabase con las cartillas impresas del salón
+                (opcional) para verificar por número de serie
+            auto_detect: Si es True, el servidor detecta en cada sorteo las líneas y
+                bingos completados con números cantados y los anuncia sin esperar a
+                bingo_claim; validar un reclamo pasa a ser una consulta en un conjunto
+            compression: Activa permessage-deflate en websockets.serve
+            deflate_window_bits: Ventana de deflate (9-15) en ambos sentidos. Los mensajes
+                del bingo son de pocos cientos de bytes: 11 bits (2 KiB) comprime igual que
+                la ventana por defecto y reduce la memoria por conexión
+            deflate_mem_level: memLevel de zlib (1-9); 4 deja ~16 KiB por conexión frente
+                a ~32 KiB con los valores por defecto de websockets
+            deflate_level: Nivel de compresión de zlib (1-9)
+            max_rooms: Salas simultáneas como máximo (incluida la sala por defecto)
+            bus_path: Ruta del socket UNIX del bus de eventos (ver event_bus). Si se indica,
+                start() publica ahí los broadcasts de todas las salas para los procesos de
+                reparto (fanout_worker), que atienden a los espectadores
+            journal_path: Ruta del diario de la partida (ver game_journal). Si existe, el
+                estado de las salas se recupera de él al crear el servidor
+            resume_grace: Segundos que un jugador interactivo desconectado puede volver con
+                su token de sesión y recuperar su cartilla
+            host_key: Clave que debe enviar en el registro un cliente con role 'host'
+                (si no se indica se genera una al azar)
+        """
+        super().__init__(DEFAULT_ROOM, seeded_cards=seeded_cards, card_database=card_database,
+                         auto_detect=auto_detect, resume_grace=resume_grace)
+        self.host = host
+        self.port = port
+        self.server = None
+        self.rooms = {DEFAULT_ROOM: self}  # {room_id: GameRoom}
+        self.connections = {}  # {websocket: GameRoom} sala de cada conexión registrada
+        self.max_rooms = max_rooms
+        self.bus_path = bus_path
+        self.compression = compression
+        self.deflate_window_bits = deflate_window_bits
+        self.deflate_mem_level = deflate_mem_level
+        self.deflate_level = deflate_level
+        self.closed_outbox_stats = {}  # Estadísticas de transporte de conexiones ya cerradas
+        self.closing = set()  # Tareas que cierran conexiones reemplazadas
+        self.limiters = {}  # {websocket: InputLimiter} límites de entrada de cada conexión abierta
+        self.closed_input_stats = {}  # Totales de entrada de conexiones ya cerradas
+        self.host_key = host_key or secrets.token_urlsafe(16)
+        if journal_path:
+            self.open_journal(journal_path)
+        
+    def get_local_ip(self):
+        """Obtiene la IP local del servidor"""
+        try:
+            # Crear un socket y conectarse a una dirección externa
+            # No se envía nada, solo se usa para obtener la IP local
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            s.connect(("8.8.8.8", 80))
+            local_ip = s.getsockname()[0]
+            s.close()
+            return local_ip
+        except Exception:
+            return "localhost"
+    
+    def room(self, room_id=None):
+        """
+        Retorna la sala con ese identificador, creándola si no existe
+        
+        Las salas nuevas heredan la configuración del servidor (modo de juego, cartillas
+        por semilla, base de datos de cartillas impresas y detección automática).
+        
+        Args:
+            room_id: Identificador de la sala (None para la sala por defecto)
+            
+        Returns:
+            La GameRoom, o None si no existe y ya se alcanzó max_rooms
+        """
+        if room_id is None:
+            return self
+        room = self.rooms.get(room_id)
+        if room is None:
+            if len(self.rooms) >= self.max_rooms:
+                self.expire_rooms()
+            if len(self.rooms) >= self.max_rooms:
+                return None
+            room = self.rooms[room_id] = GameRoom(
+                room_id, game_mode=self.game_mode, seeded_cards=self.seeded_cards,
+                card_database=self.card_database, auto_detect=self.auto_detect, outboxes=self.outboxes,
+                bus=self.bus, journal=self.journal, resume_grace=self.resume_grace
+            )
+            room._record("open", game_seed=room.game_seed, game_mode=room.game_mode)
+            if self.bus is not None:
+                self.bus.publish_state(room_id, room.game_state())
+            print(f"Sala creada: {room_id} ({len(self.rooms)} salas)")
+        return room
+    
+    def close_room(self, room):
+        """Elimina una sala del servidor, del diario y de los procesos de reparto"""
+        room.stop_claims()
+        del self.rooms[room.room_id]
+        room._record("close")
+        if self.bus is not None:
+            self.bus.publish_closed(room.room_id)
+        print(f"Sala cerrada: {room.room_id} ({len(self.rooms)} salas)")
+    
+    def expire_rooms(self):
+        """
+        Cierra las salas sin clientes ni sesiones suspendidas: enseguida si no tienen
+        sorteos y, si tienen partida, cuando llevan resume_grace segundos así
+        """
+        now = time.monotonic()
+        for room in list(self.rooms.values()):
+            if room is self:
+                continue
+            room.expire_sessions()
+            if room.clients or room.suspended:
+                room.idle_since = None
+                continue
+            if room.idle_since is None:
+                room.idle_since = now
+            if not room.drawn_numbers or now - room.idle_since >= self.resume_grace:
+                self.close_room(room)
+    
+    def open_journal(self, path):
+        """
+        Recupera el estado de las salas desde el diario y empieza a registrar en él
+        
+        Las cartillas recuperadas quedan suspendidas (resume_grace segundos desde la
+        recuperación): el jugador las reanuda registrándose con su resume_token.
+        
+        Args:
+            path: Ruta del diario (se crea si no existe)
+        """
+        journal = GameJournal(path, self.journal_snapshot)
+        rooms, records = journal.load()
+        for room_id, state in rooms.items():
+            room = self.room(room_id)
+            if room is not None:
+                room.restore_state(state)
+        for record in records:
+            if record["op"] == "close":
+                if record["room"] != DEFAULT_ROOM:
+                    self.rooms.pop(record["room"], None)
+                continue
+            room = self.room(record["room"])
+            if room is not None:
+                room.replay(record)
+        # Salas que solo tuvieron entradas y salidas: no hay nada que recuperar
+        for room_id, room in list(self.rooms.items()):
+            if room is not self and not room.drawn_numbers and not room.suspended:
+                del self.rooms[room_id]
+        if rooms or records:
+            print(f"Partida recuperada del diario: {len(rooms)} salas, {len(records)} eventos posteriores")
+        self.journal = journal
+        for room in self.rooms.values():
+            room.journal = journal
+        journal.open()
+        # El diario empieza desde el estado recuperado (y con la semilla de cada sala)
+        journal.write_snapshot()
+    
+    def journal_snapshot(self):
+        """Estado de todas las salas para la instantánea del diario"""
+        return {room_id: room.journal_state() for room_id, room in self.rooms.items()}
+    
+    def add_client(self, websocket, nickname, role="player", room=None, **options):
+        """
+        Registra una conexión en una sala (la saca de la sala anterior si estaba en otra)
+        
+        Args:
+            websocket: Conexión WebSocket del cliente
+            nickname: Nickname del cliente
+            role: 'player', 'interactive_player', 'spectator' o 'host'
+            room: GameRoom o identificador de sala (por defecto, la sala del servidor)
+            options: Datos adicionales del cliente (ej. packed_cards=True)
+            
+        Returns:
+            La GameRoom en la que quedó el cliente
+        """
+        if not isinstance(room, GameRoom):
+            room = self.room(room)
+        previous = self.connections.get(websocket)
+        if previous is not None and previous is not room:
+            previous.leave(websocket)
+        room.join(websocket, nickname, role, **options)
+        self.connections[websocket] = room
+        return room
+    
+    def remove_client(self, websocket):
+        """
+        Quita una conexión del registro y de su sala
+        
+        Returns:
+            Los datos del cliente, o None si no estaba registrado
+        """
+        room = self.connections.pop(websocket, None)
+        if room is None:
+            return None
+        return room.leave(websocket)
+    
+    async def register_client(self, websocket, nickname, role="player", room=None, **options):
+        """
+        Registra un nuevo cliente
+        
+        Args:
+            websocket: Conexión WebSocket del cliente
+            nickname: Nickname del cliente
+            role: Rol indicado por el cliente en el mensaje de registro
+            room: GameRoom o identificador de sala (por defecto, la sala del servidor)
+            options: Datos adicionales del cliente (ej. packed_cards=True)
+            
+        Returns:
+            La GameRoom en la que quedó el cliente
+        """
+        room = self.add_client(websocket, nickname, role, room, **options)
+        
+        print(f"Cliente conectado: {nickname} en {room.room_id} ({len(self.connections)} clientes totales)")
+        
+        # Enviar estado actual del juego al nuevo cliente
+        await room.send_game_state(websocket)
+        
+        # Notificar a los clientes de la sala sobre el nuevo jugador
+        await room.broadcast_message({
+            "type": "player_joined",
+            "nickname": nickname,
+            "total_players": len(room.clients)
+        })
+        return room
+    
+    async def resume_client(self, websocket, token, room, game_id=None, seq=None, **options):
+        """
+        Reconecta a un jugador interactivo con su token de sesión
+        
+        En lugar de game_state y una cartilla nueva recibe 'resumed' con su cartilla (y sus
+        marcas) y, como en un resync, solo los sorteos posteriores a su seq. Si la conexión
+        anterior sigue abierta (todavía no se detectó la caída) se la saca de la sala, se
+        descarta su cola de salida y se cierra con SUPERSEDED_CLOSE.
+        
+        Args:
+            websocket: Conexión nueva
+            token: Token de sesión que recibió el cliente con su cartilla
+            room: GameRoom en la que estaba el jugador
+            game_id: Partida que el cliente tenía
+            seq: Último sorteo que el cliente aplicó
+            options: Datos adicionales del cliente (ej. packed_cards=True)
+            
+        Returns:
+            True si se reanudó la sesión; False si el token no es válido o caducó
+        """
+        if not isinstance(token, str):
+            return False
+        previous = room.sessions.get(token)
+        if previous is not None:
+            # Deja de repartirle y la cierra sin esperar al cliente (puede estar ya caído)
+            self.remove_client(previous)
+            self.drop_outbox(previous)
+            task = asyncio.create_task(previous.close(*SUPERSEDED_CLOSE))
+            self.closing.add(task)
+            task.add_done_callback(self.closing.discard)
+        session = room.take_session(token)
+        if session is None:
+            return False
+        nickname = session['nickname']
+        room = self.add_client(websocket, nickname, 'interactive_player', room, **options)
+        card = room.resume_session(websocket, token, session)
+        print(f"Sesión reanudada: {nickname} en {room.room_id} ({len(self.connections)} clientes totales)")
+        room.send_to(websocket, {
+            'type': 'resumed',
+            'room': room.room_id,
+            'game_id': room.game_id,
+            'game_started': room.game_started,
+            'game_paused': room.game_paused,
+            'total_players': room.count_role("player"),
+            'card': room.card_payload(websocket, card)
+        })
+        await room.handle_resync(websocket, game_id, seq)
+        await room.broadcast_message({
+            "type": "player_joined",
+            "nickname": nickname,
+            "total_players": len(room.clients)
+        }, exclude=websocket)
+        return True
+    
+    def drop_outbox(self, websocket):
+        """Cierra la cola de salida de una conexión y suma sus estadísticas a las de las cerradas"""
+        outbox = self.outboxes.pop(websocket, None)
+        if outbox is not None:
+            outbox.close()
+            for key, value in outbox.stats().items():
+                self.closed_outbox_stats[key] = self.closed_outbox_stats.get(key, 0) + value
+    
+    async def unregister_client(self, websocket):
+        """
+        Desregistra un cliente
+        
+        Args:
+            websocket: Conexión WebSocket del cliente
+        """
+        self.drop_outbox(websocket)
+        room = self.connections.get(websocket)
+        info = self.remove_client(websocket)
+        if info is not None:
+            nickname = info["nickname"]
+            print(f"Cliente desconectado: {nickname} ({len(self.connections)} clientes restantes)")
+            
+            # Notificar a los clientes de la sala
+            await room.broadcast_message({
+                "type": "player_left",
+                "nickname": nickname,
+                "total_players": len(room.clients)
+            })
+            # Una sala vacía sin partida en curso no guarda nada: se libera
+            self.expire_rooms()
+    
+    def transport_stats(self):
+        """
+        Totales de mensajes, frames y bytes enviados (todas las salas, conexiones activas y cerradas)
+        
+        Returns:
+            Diccionario con messages, frames, frames_saved, bytes y bytes_saved (cabeceras
+            WebSocket y de paquete ahorradas al agrupar; la compresión no se cuenta)
+        """
+        totals = dict(self.closed_outbox_stats)
+        for outbox in self.outboxes.values():
+            for key, value in outbox.stats().items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+    
+    def input_stats(self):
+        """
+        Mensajes entrantes aceptados, descartados y limitados
+        
+        Returns:
+            Diccionario con 'clients' (una entrada por conexión abierta, con su nickname y
+            sala si ya se registró) y 'totals' (todas las conexiones, también las cerradas)
+        """
+        clients = []
+        totals = dict(self.closed_input_stats)
+        for websocket, limiter in self.limiters.items():
+            stats = limiter.stats()
+            room = self.connections.get(websocket)
+            info = room.clients.get(websocket, {}) if room is not None else {}
+            clients.append({'nickname': info.get('nickname'), 'room': room.room_id if room else None, **stats})
+            for key, value in stats.items():
+                if key != 'throttled_by_type':
+                    totals[key] = totals.get(key, 0) + value
+        return {'clients': clients, 'totals': totals}
+    
+    async def flush_outboxes(self):
+        """Espera a que todas las colas de salida se vacíen (pruebas y apagado)"""
+        await asyncio.gather(*[outbox.drain() for outbox in list(self.outboxes.values())])
+    
     async def handle_client(self, websocket):
         """
         Maneja la conexión de un cliente
@@ -211,132 +1325,81 @@ class BingachoServer:
         Args:
             websocket: Conexión WebSocket
         """
+        limiter = self.limiters[websocket] = InputLimiter()
         try:
             # Esperar mensaje de registro del cliente
             async for message in websocket:
-                data = json.loads(message)
+                # Descarte barato antes de decodificar: tamaño y ritmo de frames
+                if not limiter.admit_frame(message):
+                    continue
+                # Texto = JSON, binario = códec binario (ver wire_codec)
+                try:
+                    data = decode(message)
+                except DECODE_ERRORS:
+                    limiter.reject()
+                    continue
+                # Y el cubo de su tipo, antes de hacer nada por él
+                msg_type = limiter.admit(data)
+                if msg_type is None:
+                    continue
                 
                 # Primer mensaje debe ser el registro
-                if websocket not in self.clients:
-                    if data.get("type") == "register":
+                if websocket not in self.connections:
+                    if msg_type == "register":
                         nickname = data.get("nickname", "anon")
                         role = data.get("role", "player")
-                        await self.register_client(websocket, nickname)
-                        # Actualizar role si el cliente lo especificó
-                        if websocket in self.clients:
-                            self.clients[websocket]["role"] = role
-                        print(f"Registro: {nickname} role={role}")
+                        if not isinstance(role, str):
+                            role = "player"
+                        host_key = data.get("host_key")
+                        if role == 'host' and not (isinstance(host_key, str)
+                                                   and secrets.compare_digest(host_key, self.host_key)):
+                            self.send_to(websocket, {"type": "host_rejected"})
+                            continue
+                        room_id = data.get("room")
+                        if not isinstance(room_id, str) or not 0 < len(room_id) <= MAX_ROOM_ID_LENGTH:
+                            room_id = None
+                        # Solo el anfitrión crea salas: los demás entran en una que ya exista
+                        room = self.room(room_id) if role == 'host' or room_id is None else self.rooms.get(room_id)
+                        if room is None:
+                            self.send_to(websocket, {"type": "room_unavailable", "room": room_id})
+                            continue
+                        codec = data.get("codec") if data.get("codec") in CODECS else "json"
+                        options = {"codec": codec, "batch": bool(data.get("batch")),
+                                   "packed_cards": bool(data.get("packed_cards"))}
+                        if role == 'interactive_player' and "resume_token" in data:
+                            # Reconexión: si la sesión sigue viva basta con lo que se perdió
+                            if await self.resume_client(websocket, data["resume_token"], room,
+                                                        data.get("game_id"), data.get("seq"), **options):
+                                continue
+                        await self.register_client(websocket, nickname, role, room, **options)
+                        print(f"Registro: {nickname} role={role} room={room.room_id}")
                         # Asignar cartilla a jugadores interactivos
                         if role == 'interactive_player':
-                            card = BingoCard(card_id=nickname)
-                            self.interactive_players[websocket] = {'card': card, 'nickname': nickname}
-                            await websocket.send(json.dumps({
+                            token = room.open_session(websocket)
+                            card = room.assign_card(websocket, nickname)
+                            room.send_to(websocket, {
                                 'type': 'assign_card',
-                                'card': card.to_dict()
-                            }))
+                                'card': room.card_payload(websocket, card),
+                                'resume_token': token
+                            })
                     continue
                 
-                # Manejar diferentes tipos de mensajes
-                msg_type = data.get("type")
-                
-                if msg_type == "new_number":
-                    await self.handle_new_number(data["number"])
-                elif msg_type == "game_start":
-                    await self.handle_game_start()
-                elif msg_type == "game_reset":
-                    await self.handle_game_reset()
-                elif msg_type == "ping":
-                    # Responder con pong
-                    await websocket.send(json.dumps({"type": "pong"}))
-                elif msg_type == "mark_number":
-                    number = data.get("number")
-                    if websocket in self.interactive_players:
-                        player_info = self.interactive_players[websocket]
-                        card = player_info['card']
-                        if number not in self.drawn_numbers:
-                            await websocket.send(json.dumps({
-                                'type': 'mark_rejected',
-                                'number': number,
-                                'reason': 'not_called'
-                            }))
-                        elif not card.mark_number(number):
-                            await websocket.send(json.dumps({
-                                'type': 'mark_rejected',
-                                'number': number,
-                                'reason': 'not_on_card'
-                            }))
-                        else:
-                            all_numbers = [n for row in card.numbers for n in row if n is not None]
-                            await websocket.send(json.dumps({
-                                'type': 'mark_confirmed',
-                                'number': number,
-                                'marked_count': len(card.marked),
-                                'total': len(all_numbers)
-                            }))
-                elif msg_type == "bingo_claim":
-                    if websocket in self.interactive_players and not self.game_paused:
-                        player_info = self.interactive_players[websocket]
-                        card = player_info['card']
-                        nickname = player_info['nickname']
-                        self.game_paused = True
-                        await self.broadcast_message({
-                            'type': 'game_paused',
-                            'reason': 'bingo_claim',
-                            'player': nickname
-                        })
-                        if card.check_bingo():
-                            # Verificar que todos los números marcados están en drawn_numbers
-                            all_valid = all(n in self.drawn_numbers for n in card.marked)
-                            if all_valid:
-                                self.latest_bingo_claim = {
-                                    'player': nickname,
-                                    'valid': True,
-                                    'reason': None,
-                                    'timestamp': time.time()
-                                }
-                                await self.broadcast_message({
-                                    'type': 'bingo_result',
-                                    'valid': True,
-                                    'player': nickname,
-                                    'card': card.to_dict()
-                                })
-                                print(f"¡BINGO VÁLIDO! Ganador: {nickname}")
-                            else:
-                                self.game_paused = False
-                                self.latest_bingo_claim = {
-                                    'player': nickname,
-                                    'valid': False,
-                                    'reason': 'Números marcados no válidos',
-                                    'timestamp': time.time()
-                                }
-                                await self.broadcast_message({
-                                    'type': 'bingo_result',
-                                    'valid': False,
-                                    'player': nickname,
-                                    'reason': 'Números marcados no válidos'
-                                })
-                                await self.broadcast_message({'type': 'game_resumed'})
-                        else:
-                            self.game_paused = False
-                            self.latest_bingo_claim = {
-                                'player': nickname,
-                                'valid': False,
-                                'reason': 'No todos los números de tu cartilla están marcados',
-                                'timestamp': time.time()
-                            }
-                            await self.broadcast_message({
-                                'type': 'bingo_result',
-                                'valid': False,
-                                'player': nickname,
-                                'reason': 'No todos los números están marcados'
-                            })
-                            await self.broadcast_message({'type': 'game_resumed'})
+                await self.connections[websocket].handle_message(websocket, data)
                 
         except websockets.exceptions.ConnectionClosed:
             pass
         except Exception as e:
             print(f"Error en cliente: {e}")
         finally:
+            stats = self.limiters.pop(websocket).stats()
+            if stats['dropped'] or stats['throttled']:
+                room = self.connections.get(websocket)
+                nickname = room.clients[websocket]["nickname"] if room is not None else "sin registrar"
+                print(f"Entrada limitada de {nickname}: {stats['dropped']} descartados, "
+                      f"{stats['throttled']} limitados {stats['throttled_by_type']}")
+            for key, value in stats.items():
+                if key != 'throttled_by_type':
+                    self.closed_input_stats[key] = self.closed_input_stats.get(key, 0) + value
             await self.unregister_client(websocket)
     
     async def start(self):
@@ -350,6 +1413,13 @@ class BingachoServer:
             if not self.host:
                 self.host = '0.0.0.0'
             
+            if self.bus_path:
+                self.bus = EventBus(self.bus_path, self.bus_snapshot)
+                for room in self.rooms.values():
+                    room.bus = self.bus
+                await self.bus.start()
+                print(f"Bus de eventos en {self.bus_path}")
+            
             # Intentar encontrar un puerto libre comenzando desde self.port
             start_port = self.port
             max_attempts = 10
@@ -364,7 +1434,9 @@ class BingachoServer:
                         self.host, 
                         current_port,
                         ping_interval=20,  # Keep-alive ping every 20s
-                        ping_timeout=20    # Timeout after 20s
+                        ping_timeout=20,   # Timeout after 20s
+                        max_size=MAX_FRAME_SIZE,
+                        **self.compression_options()
                     )
                     # Si llegamos aquí, el puerto funcionó
                     self.port = current_port
@@ -384,6 +1456,7 @@ class BingachoServer:
             print(f"IP Local: {local_ip}")
             print(f"Puerto: {self.port}")
             print(f"Los clientes deben conectarse a: ws://{local_ip}:{self.port}")
+            print(f"Clave de anfitrión (role 'host', para crear salas y sortear): {self.host_key}")
             print(f"{'='*60}\n")
             
             # Mantener el servidor corriendo
@@ -395,14 +1468,53 @@ class BingachoServer:
             traceback.print_exc()
             self.server = None
     
+    def compression_options(self):
+        """Argumentos de compresión para websockets.serve (permessage-deflate ajustado)"""
+        if not self.compression:
+            return {"compression": None}
+        return deflate_options(self.deflate_window_bits, self.deflate_mem_level, self.deflate_level)
+    
+    def bus_snapshot(self):
+        """Estado de todas las salas para un proceso de reparto que se suscribe al bus"""
+        return {room_id: room.game_state() for room_id, room in self.rooms.items()}
+    
     async def stop(self):
         """Detiene el servidor"""
         if self.server:
             self.server.close()
             await self.server.wait_closed()
+            if self.bus is not None:
+                await self.bus.stop()
+            for room in self.rooms.values():
+                room.stop_claims()
+            if self.journal is not None:
+                self.journal.close()
+                for room in self.rooms.values():
+                    room.journal = None
+            stats = self.transport_stats()
+            if stats:
+                print(f"Transporte: {stats['messages']} mensajes en {stats['frames']} frames "
+                      f"({stats['frames_saved']} frames y ~{stats['bytes_saved']} bytes ahorrados)")
             print("Servidor detenido")
 
 
+def deflate_options(window_bits=11, mem_level=4, level=6):
+    """
+    Argumentos de websockets.serve para permessage-deflate con ventana y memoria reducidas
+    
+    Ver BingachoServer: con mensajes de pocos cientos de bytes, 11 bits de ventana y
+    memLevel 4 comprimen igual que los valores por defecto con la mitad de memoria.
+    """
+    return {
+        "compression": None,
+        "extensions": [ServerPerMessageDeflateFactory(
+            server_max_window_bits=window_bits,
+            client_max_window_bits=window_bits,
+            compress_settings={"memLevel": mem_level, "level": level},
+        )],
+    }
+
+
 # Variable global para el servidor
 _server_instance = None
 
@@ -0,0 +1,180 @@
+"""
+Motor de patrones ganadores para partidas especiales (dos líneas, cuatro esquinas, X, marco...)
+
+Cada patrón se define sobre las celdas de la cartilla (bit fila*COLUMNAS+columna) como
+una o varias alternativas: basta con completar una de ellas. Al compilarlo contra una
+cartilla, cada alternativa se convierte en una máscara de números, así que comprobar si
+una cartilla cumple el patrón es una sola operación de bits por alternativa:
+    marcados & máscara == máscara
+Las celdas vacías (huecos del bingo de 90 bolas o el centro libre del de 75) no forman
+parte de la máscara y se consideran cumplidas.
+"""
+
+from itertools import combinations
+
+
+class Pattern:
+    """Patrón ganador definido por alternativas de celdas"""
+
+    def __init__(self, name, alternatives, rows, columns, description=""):
+        """
+        Args:
+            name: Identificador del patrón (ej. 'four_corners')
+            alternatives: Lista de máscaras de celdas; gana quien complete cualquiera
+            rows: Filas de la cartilla a la que aplica
+            columns: Columnas de la cartilla a la que aplica
+            description: Texto para mostrar
+        """
+        self.name = name
+        self.alternatives = tuple(alternatives)
+        self.rows = rows
+        self.columns = columns
+        self.description = description
+
+    @classmethod
+    def from_grid(cls, name, grid, description=""):
+        """
+        Crea un patrón de una sola alternativa a partir de un dibujo
+
+        Args:
+            name: Identificador del patrón
+            grid: Lista de strings, 'X' para celda requerida y '.' para libre
+        """
+        mask = 0
+        for r, row in enumerate(grid):
+            for c, cell in enumerate(row):
+                if cell in 'Xx':
+                    mask |= 1 << (r * len(row) + c)
+        return cls(name, [mask], len(grid), len(grid[0]), description)
+
+    def applies_to(self, card):
+        """Verifica si el patrón es para el formato de la cartilla"""
+        return card.ROWS == self.rows and card.COLUMNS == self.columns
+
+    def compile(self, card):
+        """
+        Convierte las alternativas de celdas en máscaras de números de la cartilla
+
+        Returns:
+            Tupla de máscaras de números (una por alternativa)
+        """
+        numbers = [number for row in card.numbers for number in row]
+        compiled = []
+        for cells in self.alternatives:
+            mask = 0
+            for index, number in enumerate(numbers):
+                if cells >> index & 1 and number is not None:
+                    mask |= 1 << (number - 1)
+            compiled.append(mask)
+        return tuple(compiled)
+
+    def matches(self, card, marked_mask=None, compiled=None):
+        """
+        Verifica si la cartilla cumple el patrón
+
+        Args:
+            card: Cartilla a comprobar
+            marked_mask: Máscara de números a usar (por defecto, los marcados de la cartilla)
+            compiled: Resultado de compile(card) si ya se calculó
+        """
+        if marked_mask is None:
+            marked_mask = card.marked_mask
+        for mask in compiled if compiled is not None else self.compile(card):
+            if marked_mask & mask == mask:
+                return True
+        return False
+
+
+def _row_mask(row, columns):
+    return ((1 << columns) - 1) << (row * columns)
+
+
+def _column_mask(col, rows, columns):
+    return sum(1 << (r * columns + col) for r in range(rows))
+
+
+def _build_patterns_90():
+    """
+    Patrones para la cartilla 3x9 de 90 bolas
+
+    Sin cuatro esquinas, X ni marco: las esquinas y los bordes de una cartilla de 90 suelen
+    ser huecos, que cuentan como cumplidos, así que esos patrones se ganarían casi sin números.
+    """
+    rows = [_row_mask(r, 9) for r in range(3)]
+    return {
+        'line': Pattern('line', rows, 3, 9, "Una línea"),
+        'two_lines': Pattern('two_lines', [a | b for a, b in combinations(rows, 2)], 3, 9, "Dos líneas"),
+        'full_house': Pattern('full_house', [rows[0] | rows[1] | rows[2]], 3, 9, "Cartilla completa"),
+    }
+
+
+def _build_patterns_75():
+    """Patrones para la cartilla 5x5 de 75 bolas"""
+    rows = [_row_mask(r, 5) for r in range(5)]
+    columns = [_column_mask(c, 5, 5) for c in range(5)]
+    diagonals = [sum(1 << (i * 5 + i) for i in range(5)), sum(1 << (i * 5 + 4 - i) for i in range(5))]
+    lines = rows + columns + diagonals
+    full = (1 << 25) - 1
+    patterns = {
+        'line': Pattern('line', lines, 5, 5, "Una línea (fila, columna o diagonal)"),
+        'two_lines': Pattern('two_lines', [a | b for a, b in combinations(lines, 2)], 5, 5, "Dos líneas"),
+        'x': Pattern('x', [diagonals[0] | diagonals[1]], 5, 5, "X"),
+        'frame': Pattern('frame', [rows[0] | rows[4] | columns[0] | columns[4]], 5, 5, "Marco"),
+        'full_house': Pattern('full_house', [full], 5, 5, "Cartilla completa"),
+    }
+    patterns['four_corners'] = Pattern.from_grid('four_corners', [
+        "X...X",
+        ".....",
+        ".....",
+        ".....",
+        "X...X",
+    ], "Cuatro esquinas")
+    return patterns
+
+
+# Patrones disponibles por modo de juego
+PATTERNS = {
+    90: _build_patterns_90(),
+    75: _build_patterns_75(),
+}
+
+
+def get_pattern(game_mode, name):
+    """
+    Retorna un patrón por nombre
+
+    Raises:
+        ValueError: Si el patrón no existe para ese modo de juego
+    """
+    patterns = PATTERNS.get(game_mode, {})
+    if not isinstance(name, str) or name not in patterns:
+        raise ValueError(f"Patrón desconocido para {game_mode} bolas: {name!r} "
+                         f"(disponibles: {', '.join(patterns)})")
+    return patterns[name]
+
+
+def find_pattern_winners(entries, patterns):
+    """
+    Evalúa varios patrones sobre muchas cartillas en una sola pasada
+
+    Args:
+        entries: Iterable de tuplas (clave, cartilla, máscara de números a usar, compilados)
+            donde compilados es un diccionario {nombre: compile(cartilla)}
+        patterns: Lista de objetos Pattern
+
+    Returns:
+        Diccionario {nombre del patrón: [claves de las cartillas que lo cumplen]}
+    """
+    winners = {pattern.name: [] for pattern in patterns}
+    for key, card, marked_mask, compiled in entries:
+        for pattern in patterns:
+            masks = compiled.get(pattern.name)
+            if masks is None:
+                if not pattern.applies_to(card):
+                    continue
+                masks = compiled[pattern.name] = pattern.compile(card)
+            for mask in masks:
+                if marked_mask & mask == mask:
+                    winners[pattern.name].append(key)
+                    break
+    return winners
@@ -0,0 +1,193 @@
+"""
+Simulador Monte Carlo de partidas de bingo para planificar premios y duración
+
+Juega millones de partidas contra salones de distintos tamaños y reporta en cuántos
+sorteos aparece la primera línea y el primer BINGO, y cuántos ganadores simultáneos
+hay en ese momento. Las cartillas se generan con CardStore (mismas reglas que
+BingoCard) y el orden de sorteo es una permutación uniforme de los números, que es
+exactamente lo que produce select_number en main.py al elegir al azar entre los
+números que aún no han salido.
+
+El trabajo se reparte en bloques de partidas con semillas derivadas de --seed
+(numpy.random.SeedSequence), así que el resultado es el mismo con cualquier número
+de procesos y escala de forma lineal con --workers.
+
+Uso:
+    python simulator.py --games 1000000 --halls 100,500,2000 --workers 8
+"""
+
+import argparse
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+from card_store import CardStore, np, _require_numpy
+
+TOTAL_NUMBERS = 90
+
+
+class SimulationResult:
+    """Histogramas acumulados de un conjunto de partidas"""
+
+    def __init__(self, hall_size):
+        self.hall_size = hall_size
+        self.games = 0
+        # Índice = número de sorteos hasta el evento (1-90)
+        self.first_line = np.zeros(TOTAL_NUMBERS + 1, dtype=np.int64)
+        self.first_bingo = np.zeros(TOTAL_NUMBERS + 1, dtype=np.int64)
+        # Índice = cantidad de ganadores simultáneos
+        self.line_winners = np.zeros(hall_size + 1, dtype=np.int64)
+        self.bingo_winners = np.zeros(hall_size + 1, dtype=np.int64)
+
+    def merge(self, other):
+        """Suma los histogramas de otro resultado del mismo tamaño de salón"""
+        self.games += other.games
+        self.first_line += other.first_line
+        self.first_bingo += other.first_bingo
+        self.line_winners += other.line_winners
+        self.bingo_winners += other.bingo_winners
+        return self
+
+    @staticmethod
+    def _percentile(histogram, fraction):
+        cumulative = np.cumsum(histogram)
+        return int(np.searchsorted(cumulative, fraction * cumulative[-1]))
+
+    @staticmethod
+    def _mean(histogram):
+        return float((histogram * np.arange(len(histogram))).sum() / max(histogram.sum(), 1))
+
+    def summary(self):
+        """Retorna un diccionario con las métricas principales"""
+        result = {'hall_size': self.hall_size, 'games': self.games}
+        for name, histogram in (('first_line', self.first_line), ('first_bingo', self.first_bingo)):
+            result[name] = {
+                'mean': self._mean(histogram),
+                'p10': self._percentile(histogram, 0.10),
+                'p50': self._percentile(histogram, 0.50),
+                'p90': self._percentile(histogram, 0.90),
+                'p99': self._percentile(histogram, 0.99),
+            }
+        for name, histogram in (('line_winners', self.line_winners), ('bingo_winners', self.bingo_winners)):
+            result[name] = {
+                'mean': self._mean(histogram),
+                'p_shared': float(histogram[2:].sum() / max(histogram.sum(), 1)),
+                'max': int(np.nonzero(histogram)[0].max()) if histogram.any() else 0,
+            }
+        return result
+
+
+def simulate_chunk(task):
+    """
+    Simula un bloque de partidas (se ejecuta en un proceso del pool)
+
+    Args:
+        task: Tupla (seed_sequence, games, hall_size, games_per_hall)
+
+    Returns:
+        SimulationResult del bloque
+    """
+    seed_sequence, games, hall_size, games_per_hall = task
+    rng = np.random.default_rng(seed_sequence)
+    result = SimulationResult(hall_size)
+    # Partidas jugadas a la vez: acota la memoria del arreglo (partidas, cartillas, 3, 5)
+    batch = max(1, min(games_per_hall, 2_000_000 // (hall_size * 15)))
+
+    played = 0
+    while played < games:
+        store = CardStore.generate(hall_size, seed=rng.integers(1 << 63))
+        # Los ceros (huecos) quedan al principio al ordenar cada fila: las 5 últimas son números
+        cells = np.sort(store.numbers, axis=2)[:, :, 4:]
+        hall_games = min(games_per_hall, games - played)
+        for start in range(0, hall_games, batch):
+            count = min(batch, hall_games - start)
+            # Posición (1-90) en que sale cada número, para count partidas a la vez
+            order = rng.permuted(np.tile(np.arange(1, TOTAL_NUMBERS + 1, dtype=np.uint8), (count, 1)), axis=1)
+            draw_at = np.empty((count, TOTAL_NUMBERS + 1), dtype=np.uint8)
+            np.put_along_axis(draw_at, order.astype(np.intp), np.arange(1, TOTAL_NUMBERS + 1, dtype=np.uint8)[None, :], axis=1)
+
+            row_done = draw_at[:, cells].max(axis=3)  # (partidas, cartillas, 3)
+            for times, first_hist, winners_hist in (
+                (row_done.min(axis=2), result.first_line, result.line_winners),
+                (row_done.max(axis=2), result.first_bingo, result.bingo_winners),
+            ):
+                first = times.min(axis=1)
+                winners = (times == first[:, None]).sum(axis=1)
+                first_hist += np.bincount(first, minlength=TOTAL_NUMBERS + 1)
+                winners_hist += np.bincount(winners, minlength=hall_size + 1)
+        played += hall_games
+
+    result.games = games
+    return result
+
+
+def run_simulation(games, hall_size, workers=None, seed=0, chunk_games=20000, games_per_hall=100):
+    """
+    Ejecuta la simulación completa repartida en un pool de procesos
+
+    Args:
+        games: Número total de partidas
+        hall_size: Cartillas en juego por partida
+        workers: Procesos del pool (por defecto, todos los núcleos)
+        seed: Semilla base; el mismo valor da el mismo resultado con cualquier workers
+        chunk_games: Partidas por bloque de trabajo
+        games_per_hall: Partidas que se juegan con las mismas cartillas antes de regenerarlas
+
+    Returns:
+        SimulationResult acumulado
+    """
+    _require_numpy()
+    chunks = [chunk_games] * (games // chunk_games)
+    if games % chunk_games:
+        chunks.append(games % chunk_games)
+    seeds = np.random.SeedSequence([seed, hall_size]).spawn(len(chunks))
+    tasks = [(seeds[i], chunks[i], hall_size, games_per_hall) for i in range(len(chunks))]
+
+    total = SimulationResult(hall_size)
+    if workers == 1:
+        for task in tasks:
+            total.merge(simulate_chunk(task))
+    else:
+        with Pool(processes=workers) as pool:
+            for partial in pool.imap_unordered(simulate_chunk, tasks):
+                total.merge(partial)
+    return total
+
+
+def print_summary(summary, elapsed):
+    """Imprime el resumen de una simulación"""
+    line, bingo = summary['first_line'], summary['first_bingo']
+    line_w, bingo_w = summary['line_winners'], summary['bingo_winners']
+    print(f"\nSalón de {summary['hall_size']} cartillas · {summary['games']:,} partidas "
+          f"({summary['games'] / elapsed:,.0f} partidas/s)")
+    print(f"  Primera línea : media {line['mean']:5.1f} sorteos · p10 {line['p10']} · "
+          f"p50 {line['p50']} · p90 {line['p90']} · p99 {line['p99']}")
+    print(f"  Primer BINGO  : media {bingo['mean']:5.1f} sorteos · p10 {bingo['p10']} · "
+          f"p50 {bingo['p50']} · p90 {bingo['p90']} · p99 {bingo['p99']}")
+    print(f"  Ganadores de línea : media {line_w['mean']:.2f} · compartida {line_w['p_shared']:.1%} · máx {line_w['max']}")
+    print(f"  Ganadores de BINGO : media {bingo_w['mean']:.2f} · compartido {bingo_w['p_shared']:.1%} · máx {bingo_w['max']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulador Monte Carlo de partidas de Bingacho")
+    parser.add_argument('--games', type=int, default=100000, help="Partidas por tamaño de salón")
+    parser.add_argument('--halls', default="50,200,1000", help="Tamaños de salón separados por comas")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Procesos del pool")
+    parser.add_argument('--seed', type=int, default=0, help="Semilla base (resultados reproducibles)")
+    parser.add_argument('--chunk-games', type=int, default=20000, help="Partidas por bloque de trabajo")
+    parser.add_argument('--games-per-hall', type=int, default=100,
+                        help="Partidas jugadas con las mismas cartillas antes de regenerarlas")
+    args = parser.parse_args(argv)
+
+    print(f"=== Simulador Bingacho: {args.games:,} partidas por salón, {args.workers} procesos ===")
+    for hall_size in (int(h) for h in args.halls.split(',')):
+        start = time.perf_counter()
+        result = run_simulation(args.games, hall_size, args.workers, args.seed,
+                                args.chunk_games, args.games_per_hall)
+        print_summary(result.summary(), time.perf_counter() - start)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
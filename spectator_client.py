@@ -11,11 +11,13 @@ import tempfile
 import threading
 import pygame
 import os
+from wire_codec import decode
 
 class SpectatorClient:
-    def __init__(self, server_url, nickname="spectator"):
+    def __init__(self, server_url, nickname="spectator", codec="binary"):
         self.server_url = server_url
         self.nickname = nickname
+        self.codec = codec  # 'binary': los frames viajan como bytes crudos en vez de base64
         self.websocket = None
         self.loop = None
         self.thread = None
@@ -30,7 +32,8 @@ class SpectatorClient:
             self.websocket = await websockets.connect(self.server_url)
             self.connected = True
             # Enviar registro con role spectator
-            register_message = {"type": "register", "nickname": self.nickname, "role": "spectator"}
+            register_message = {"type": "register", "nickname": self.nickname, "role": "spectator",
+                                "codec": self.codec}
             await self.websocket.send(json.dumps(register_message))
             print(f"Conectado al servidor como espectador {self.nickname}")
             await self.listen_messages()
@@ -41,11 +44,11 @@ class SpectatorClient:
     async def listen_messages(self):
         try:
             async for message in self.websocket:
-                # Mensaje puede ser JSON string
+                # Texto JSON o binario según el códec negociado
                 try:
-                    data = json.loads(message)
+                    data = decode(message)
                 except Exception:
-                    # No es JSON string; ignorar
+                    # Frame no válido; ignorar
                     continue
 
                 msg_type = data.get('type')
@@ -0,0 +1,354 @@
+"""
+Pruebas del generador de cartillas de bingo (bingo_card.py)
+"""
+
+import sys
+import random
+from bingo_card import (
+    BingoCard, BingoCard75, CardIndex, COLUMN_RANGES, COLUMN_RANGES_75, generate_cards, generate_strips, generate_unique_cards,
+    get_layout_table, pack_cards, random_layout, unpack_cards
+)
+
+
+def assert_valid_grid(numbers):
+    """Verifica las reglas oficiales de una cartilla 3x9"""
+    assert len(numbers) == 3, "La cartilla debe tener 3 filas"
+    for row in numbers:
+        assert len(row) == 9, "Cada fila debe tener 9 columnas"
+        assert sum(1 for n in row if n is not None) == 5, "Cada fila debe tener 5 números"
+    for col in range(9):
+        column = [numbers[r][col] for r in range(3) if numbers[r][col] is not None]
+        assert column, f"La columna {col} no puede estar vacía"
+        assert column == sorted(column) and len(set(column)) == len(column), "Columna desordenada"
+        assert all(n in COLUMN_RANGES[col] for n in column), f"Número fuera de rango en columna {col}"
+
+
+def test_layout_table():
+    """La tabla contiene todas las distribuciones válidas y solo ellas"""
+    table = get_layout_table()
+    assert len(table) == 735210, f"Se esperaban 735210 distribuciones, hay {len(table)}"
+    assert len(set(table)) == len(table), "La tabla no debe tener duplicados"
+    for layout in table[::997]:
+        rows = [(layout >> (9 * r)) & 0x1FF for r in range(3)]
+        assert all(bin(row).count("1") == 5 for row in rows)
+        assert rows[0] | rows[1] | rows[2] == 0x1FF
+    assert random_layout() in table
+    print(f"✅ Tabla de distribuciones: {len(table)} entradas")
+
+
+def test_generate_card():
+    """BingoCard() produce cartillas válidas"""
+    for i in range(200):
+        assert_valid_grid(BingoCard(card_id=i).numbers)
+    print("✅ BingoCard(): 200 cartillas válidas")
+
+
+def test_generate_cards_batch():
+    """generate_cards(n) produce n cartillas válidas con IDs consecutivos"""
+    cards = generate_cards(500, start_id=10)
+    assert len(cards) == 500
+    assert [c.card_id for c in cards] == list(range(10, 510))
+    for card in cards:
+        assert_valid_grid(card.numbers)
+        assert card.marked == set()
+        # Las máscaras y contadores precalculados coinciden con los de una cartilla normal
+        same = BingoCard.__new__(BingoCard)
+        same.numbers = card.numbers
+        assert card.line_masks == same.line_masks and card.mask == same.mask
+        assert card.line_remaining() == same.line_remaining() and card.remaining() == 15
+    print("✅ generate_cards(500): cartillas válidas")
+
+
+def test_generate_strips():
+    """Cada serie tiene 6 cartillas válidas con los números 1-90 exactamente una vez"""
+    strips = generate_strips(300, start_id=6, rng=random.Random(42))
+    assert len(strips) == 300
+    for strip in strips:
+        assert len(strip) == 6
+        numbers = sorted(n for card in strip for row in card.numbers for n in row if n is not None)
+        assert numbers == list(range(1, 91)), "La serie debe cubrir 1-90 sin repetir"
+        for card in strip:
+            assert_valid_grid(card.numbers)
+    assert [card.card_id for card in strips[0]] == list(range(6, 12))
+    print("✅ generate_strips(300): series completas y válidas")
+
+
+def test_unique_cards():
+    """generate_unique_cards no repite cartillas y respeta max_shared"""
+    cards = generate_unique_cards(2000, rng=random.Random(1))
+    assert len({card.fingerprint() for card in cards}) == 2000
+    assert [card.card_id for card in cards] == list(range(2000))
+    
+    index = CardIndex()
+    assert index.add(cards[0]) and not index.add(BingoCard.from_dict(cards[0].to_dict()))
+    bloom = CardIndex(bloom_bits=1 << 16)
+    assert bloom.add(cards[1]) and cards[1] in bloom and not bloom.add(cards[1])
+    
+    premium = generate_unique_cards(60, max_shared=5, rng=random.Random(2))
+    for i, a in enumerate(premium):
+        for b in premium[i + 1:]:
+            assert (a.mask & b.mask).bit_count() <= 5
+    # El índice por número decide lo mismo que comparar contra cada cartilla aceptada
+    index = CardIndex(max_shared=6)
+    accepted = []
+    for card in generate_cards(400, rng=random.Random(3)):
+        expected = all((card.mask & other.mask).bit_count() <= 6 for other in accepted)
+        assert index.add(card) == expected
+        if expected:
+            accepted.append(card)
+    assert len(index) == len(accepted) > 1
+    index.MAX_SHARED_CARDS = len(index)
+    try:
+        index.add(generate_cards(1, rng=random.Random(4))[0])
+        assert False, "Debía rechazar pasar de MAX_SHARED_CARDS"
+    except ValueError:
+        pass
+    print("✅ generate_unique_cards: sin duplicados y con max_shared")
+
+
+def test_mark_line_bingo():
+    """Marcado, línea y bingo sobre las máscaras de bits"""
+    card = BingoCard(card_id="bits")
+    assert not card.mark_number(None) and not card.mark_number(0) and not card.mark_number(91)
+    on_card = {n for row in card.numbers for n in row if n is not None}
+    outside = next(n for n in range(1, 91) if n not in on_card)
+    assert not card.mark_number(outside), "Un número fuera de la cartilla no se marca"
+    first_row = [n for n in card.numbers[0] if n is not None]
+    for number in first_row[:-1]:
+        assert card.mark_number(number)
+    assert not card.check_line()
+    card.mark_number(first_row[-1])
+    assert card.check_line() and not card.check_bingo()
+    for row in card.numbers:
+        for number in row:
+            if number is not None:
+                card.mark_number(number)
+    assert card.check_bingo()
+    assert card.marked_count() == card.total_numbers() == 15
+    card.reset_marks()
+    assert card.marked == set() and not card.check_line()
+    print("✅ Marcado, línea y bingo con máscaras de bits")
+
+
+def test_remaining_counters():
+    """Los contadores de pendientes por fila y cartilla se mantienen al marcar"""
+    card = BingoCard(card_id="counters")
+    assert card.remaining() == 15 and card.row_remaining() == (5, 5, 5)
+    second_row = [n for n in card.numbers[1] if n is not None]
+    for i, number in enumerate(second_row):
+        card.mark_number(number)
+        card.mark_number(number)  # Marcar dos veces no descuenta de nuevo
+        assert card.remaining() == 15 - (i + 1)
+        assert card.best_row_remaining() == 5 - (i + 1)
+    assert card.has_line() and card.lines_count() == 1 and card.row_remaining() == (5, 0, 5)
+    
+    restored = BingoCard.from_dict(card.to_dict())
+    assert restored.row_remaining() == card.row_remaining() and restored.has_line()
+    card.reset_marks()
+    assert card.remaining() == 15 and not card.has_line()
+    print("✅ Contadores de números pendientes")
+
+
+def test_dict_roundtrip():
+    """to_dict / from_dict conservan grilla y marcas"""
+    card = BingoCard(card_id="json")
+    numbers = [n for row in card.numbers for n in row if n is not None]
+    for number in numbers[:4]:
+        card.mark_number(number)
+    data = card.to_dict()
+    assert data['marked'] == sorted(numbers[:4])
+    copy = BingoCard.from_dict(data)
+    assert copy.card_id == "json" and copy.numbers == card.numbers
+    assert copy.marked == card.marked and copy.mask == card.mask
+    # Marcas fuera de rango o de otro tipo se ignoran
+    data['marked'] = [0, -3, 91, "7", None, 2.0] + numbers[:1]
+    assert BingoCard.from_dict(data).marked == {numbers[0]}
+    print("✅ to_dict / from_dict compatibles")
+
+
+def test_binary_format():
+    """to_bytes / from_bytes y pack_cards reconstruyen grilla y marcas exactas"""
+    card = BingoCard(card_id=7)
+    for number in [n for row in card.numbers for n in row if n is not None][::3]:
+        card.mark_number(number)
+    assert len(card.to_bytes()) == 15 and len(card.to_bytes(include_marks=True)) == 27
+    copy = BingoCard.from_bytes(card.to_bytes(include_marks=True), card_id=7)
+    assert copy.numbers == card.numbers and copy.marked == card.marked
+    restored = BingoCard.from_dict(card.to_packed_dict())
+    assert restored.card_id == 7 and restored.marked == card.marked
+    
+    card75 = BingoCard75()
+    card75.mark_number(card75.numbers[4][4])
+    copy75 = BingoCard.from_bytes(card75.to_bytes(include_marks=True))
+    assert isinstance(copy75, BingoCard75) and copy75.numbers == card75.numbers and copy75.marked == card75.marked
+    
+    cards = generate_cards(50, rng=random.Random(5))
+    buffer = pack_cards(cards)
+    assert len(buffer) == 50 * 15
+    assert [c.numbers for c in unpack_cards(buffer)] == [c.numbers for c in cards]
+    try:
+        BingoCard.from_bytes(b"\x01" * 16)
+        assert False, "Debe rechazar longitudes no válidas"
+    except ValueError:
+        pass
+    print("✅ Formato binario compacto")
+
+
+def test_card_database():
+    """Base de datos mmap: búsqueda por serie y verificación contra los sorteados"""
+    import os
+    import tempfile
+    from bingo_card import mask_to_numbers
+    from card_db import CardDatabase, create_database, generate_database
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "salon.db")
+        assert generate_database(path, 5000, seed=3, first_serial=1000, chunk=700) == 5000
+        with CardDatabase(path) as db:
+            assert len(db) == 5000 and 1000 in db and 5999 in db and 6000 not in db
+            card = db.card(4321)
+            assert_valid_grid(card.numbers)
+            numbers = mask_to_numbers(card.mask)
+            assert db.verify(4321, numbers)['valid']
+            result = db.verify(4321, numbers[:-1], kind='bingo')
+            assert not result['valid'] and result['missing'] == numbers[-1:]
+            first_row = [n for n in card.numbers[0] if n is not None]
+            assert db.verify(4321, first_row, kind='line')['valid']
+            assert not db.verify(6000, numbers)['found']
+        
+        try:
+            create_database(path, [BingoCard(card_id=1), BingoCard(card_id=1)])
+            assert False, "Debe rechazar series repetidas"
+        except ValueError:
+            pass
+    print("✅ Base de datos de cartillas impresas")
+
+
+def test_seeded_cards():
+    """Una cartilla queda determinada por (game_seed, serial)"""
+    card = BingoCard.from_seed(123456789, 42)
+    assert_valid_grid(card.numbers)
+    assert card.numbers == BingoCard.from_seed(123456789, 42).numbers
+    assert card.numbers != BingoCard.from_seed(123456789, 43).numbers
+    # Valor de referencia: si cambia, las cartillas impresas y web/player.html dejan de coincidir
+    assert card.numbers[0] == [1, None, 25, None, None, 53, None, 74, 84]
+    
+    light = BingoCard.from_seed(123456789, 42, card_id="ana", keep_grid=False)
+    light.mark_number(25)
+    compact = light.to_dict(compact=True)
+    assert 'numbers' not in compact and compact['serial'] == 42
+    restored = BingoCard.from_dict(compact)
+    assert restored.numbers == card.numbers and restored.marked == {25} and restored.card_id == "ana"
+    print("✅ Cartillas direccionables por semilla")
+
+
+def test_card_75():
+    """Cartilla de 75 bolas: 5x5, centro libre y líneas en filas, columnas y diagonales"""
+    card = BingoCard75(card_id="us")
+    assert len(card.numbers) == 5 and all(len(row) == 5 for row in card.numbers)
+    assert card.numbers[2][2] is None and card.total_numbers() == 24
+    for col in range(5):
+        column = [card.numbers[r][col] for r in range(5) if card.numbers[r][col] is not None]
+        assert all(n in COLUMN_RANGES_75[col] for n in column) and len(set(column)) == len(column)
+    
+    # La diagonal pasa por el centro libre: bastan 4 números
+    for i in (0, 1, 3, 4):
+        assert card.mark_number(card.numbers[i][i])
+    assert card.has_line() and card.best_row_remaining() == 0 and not card.check_bingo()
+    assert not card.mark_number(76)
+    
+    restored = BingoCard.from_dict(card.to_dict())
+    assert isinstance(restored, BingoCard75) and restored.has_line()
+    seeded = BingoCard75.from_seed(99, 3, keep_grid=False)
+    assert isinstance(BingoCard.from_dict(seeded.to_dict(compact=True)), BingoCard75)
+    print("✅ Cartilla de 75 bolas")
+
+
+def test_patterns():
+    """Los patrones compilados coinciden con la comprobación celda a celda"""
+    from patterns import PATTERNS, find_pattern_winners
+    card = BingoCard75(card_id="pat")
+    corners = PATTERNS[75]['four_corners']
+    for r, c in ((0, 0), (0, 4), (4, 0)):
+        card.mark_number(card.numbers[r][c])
+    assert not corners.matches(card)
+    card.mark_number(card.numbers[4][4])
+    assert corners.matches(card) and not PATTERNS[75]['x'].matches(card)
+    for i in (1, 3):
+        card.mark_number(card.numbers[i][i])
+        card.mark_number(card.numbers[i][4 - i])
+    assert PATTERNS[75]['x'].matches(card), "La X usa el centro libre"
+    
+    card90 = BingoCard(card_id="pat90")
+    for number in (n for row in card90.numbers[:2] for n in row if n is not None):
+        card90.mark_number(number)
+    winners = find_pattern_winners(
+        [("a", card90, card90.marked_mask, {}), ("b", card, card.marked_mask, {})],
+        list(PATTERNS[90].values())
+    )
+    assert winners == {'line': ["a"], 'two_lines': ["a"], 'full_house': []}
+    print("✅ Motor de patrones")
+
+
+def test_card_store():
+    """El almacén vectorizado coincide con BingoCard al marcar y buscar ganadores"""
+    try:
+        from card_store import CardStore
+        store = CardStore.generate(300, seed=7)
+    except ImportError:
+        print("⚠️  NumPy no disponible: se omite el test de CardStore")
+        return
+    cards = [store.card(i) for i in range(len(store))]
+    for card in cards:
+        assert_valid_grid(card.numbers)
+    for number in range(1, 91, 2):
+        hits = set(store.mark(number).tolist())
+        assert hits == {i for i, card in enumerate(cards) if card.mark_number(number)}
+        assert set(store.winners('line').tolist()) == {i for i, c in enumerate(cards) if c.check_line()}
+    assert store.card(3).marked == cards[3].marked
+    assert (CardStore.from_cards(cards[:20]).marked == store.marked[:20]).all()
+    from patterns import PATTERNS
+    two_lines = PATTERNS[90]['two_lines']
+    assert set(store.pattern_winners(two_lines).tolist()) == {i for i, c in enumerate(cards) if two_lines.matches(c)}
+    print("✅ CardStore: marcado y ganadores coinciden con BingoCard")
+
+
+def test_simulator():
+    """El simulador es reproducible y sus histogramas cuadran con el número de partidas"""
+    try:
+        from simulator import run_simulation
+        first = run_simulation(600, 30, workers=1, seed=5, chunk_games=200).summary()
+    except ImportError:
+        print("⚠️  NumPy no disponible: se omite el test del simulador")
+        return
+    again = run_simulation(600, 30, workers=1, seed=5, chunk_games=200).summary()
+    assert first == again, "La misma semilla debe dar el mismo resultado"
+    assert first['games'] == 600
+    assert 1 <= first['first_line']['p50'] <= first['first_bingo']['p50'] <= 90
+    assert first['line_winners']['mean'] >= 1
+    print("✅ Simulador Monte Carlo reproducible")
+
+
+def run_all_tests():
+    """Ejecuta todos los tests"""
+    tests = [
+        test_layout_table, test_generate_card, test_generate_cards_batch, test_generate_strips,
+        test_unique_cards,
+        test_mark_line_bingo, test_remaining_counters, test_dict_roundtrip, test_binary_format, test_card_database,
+        test_seeded_cards,
+        test_card_75, test_patterns,
+        test_card_store, test_simulator,
+    ]
+    failed = 0
+    for test_func in tests:
+        try:
+            test_func()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test_func.__name__}: {e}")
+    print(f"\nRESULTADO FINAL: {len(tests) - failed}/{len(tests)} tests pasados")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
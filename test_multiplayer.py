@@ -87,6 +87,971 @@ def test_server_import():
     
     return True
 
+class FakeWebSocket:
+    """WebSocket simulado que guarda los mensajes enviados por el servidor"""
+    
+    def __init__(self, incoming=()):
+        self.sent = []
+        self.close_code = None
+        self.incoming = list(incoming)  # Mensajes que el "cliente" envía al servidor (str/bytes: frame tal cual)
+    
+    async def send(self, message):
+        self.sent.append(message)
+    
+    async def close(self, code=1000, reason=""):
+        self.close_code = code
+    
+    async def __aiter__(self):
+        import json
+        import asyncio
+        for message in self.incoming:
+            yield message if isinstance(message, (str, bytes)) else json.dumps(message)
+        # Mantener la conexión abierta un momento para que el servidor vacíe su cola
+        for _ in range(5):
+            await asyncio.sleep(0)
+    
+    def messages(self, msg_type=None):
+        from wire_codec import decode, iter_messages
+        decoded = [m for frame in self.sent for m in iter_messages(decode(frame))]
+        return [m for m in decoded if msg_type is None or m.get("type") == msg_type]
+
+
+def test_server_card_index():
+    """El índice invertido del servidor solo toca las cartillas que tienen el número"""
+    print("\n" + "="*60)
+    print("TEST: Índice número -> cartillas del servidor")
+    print("="*60)
+    
+    import asyncio
+    from multiplayer_server import BingachoServer
+    
+    async def scenario():
+        server = BingachoServer(port=8766)
+        players = [FakeWebSocket() for _ in range(30)]
+        for i, ws in enumerate(players):
+            server.add_client(ws, f"p{i}", "interactive_player")
+            server.assign_card(ws, f"p{i}")
+        
+        for number in (7, 33, 90):
+            expected = {ws for ws, info in server.interactive_players.items()
+                        if info['card'].mask >> (number - 1) & 1}
+            assert set(server.cards_with_number(number)) == expected
+            await server.handle_new_number(number)
+            for ws, info in server.interactive_players.items():
+                called = info['called_mask'] >> (number - 1) & 1
+                assert bool(called) == (ws in expected)
+        
+        await server.unregister_client(players[0])
+        assert all(players[0] not in holders for holders in server.number_index.values())
+        
+        await server.handle_game_reset()
+        for ws, info in server.interactive_players.items():
+            assert info['called_mask'] == 0
+            for number in (n for row in info['card'].numbers for n in row if n is not None):
+                assert ws in server.cards_with_number(number)
+    
+    asyncio.run(scenario())
+    print("✅ Índice invertido actualizado en asignación, sorteo y reinicio")
+
+
+def test_server_seeded_cards():
+    """En modo seeded_cards el servidor envía solo semilla y número de serie"""
+    import asyncio
+    from bingo_card import BingoCard
+    from multiplayer_server import BingachoServer
+    
+    async def scenario():
+        server = BingachoServer(port=8766, seeded_cards=True)
+        ws = FakeWebSocket()
+        server.add_client(ws, "ana", "interactive_player")
+        server.assign_card(ws, "ana")
+        await server.handle_game_reset()
+        await server.flush_outboxes()
+        sent = ws.messages("assign_card")[-1]["card"]
+        assert "numbers" not in sent and sent["game_seed"] == server.game_seed
+        card = server.interactive_players[ws]['card']
+        assert BingoCard.from_dict(sent).numbers == card.numbers
+    
+    asyncio.run(scenario())
+    print("✅ Cartillas por semilla en el servidor")
+
+
+def test_server_packed_cards():
+    """Los clientes que anuncian packed_cards reciben la cartilla en binario compacto"""
+    import asyncio
+    from bingo_card import BingoCard
+    from multiplayer_server import BingachoServer
+    
+    async def scenario():
+        server = BingachoServer(port=8766)
+        packed, plain = FakeWebSocket(), FakeWebSocket()
+        server.add_client(packed, "ana", "interactive_player", packed_cards=True)
+        server.add_client(plain, "luis", "interactive_player")
+        for ws in (packed, plain):
+            server.assign_card(ws, server.clients[ws]["nickname"])
+        await server.handle_game_reset()
+        await server.flush_outboxes()
+        sent = packed.messages("assign_card")[-1]["card"]
+        assert "packed" in sent and "numbers" not in sent
+        assert BingoCard.from_dict(sent).numbers == server.interactive_players[packed]['card'].numbers
+        assert "numbers" in plain.messages("assign_card")[-1]["card"]
+    
+    asyncio.run(scenario())
+    print("✅ Cartillas empaquetadas para clientes compatibles")
+
+
+def test_server_verify_serial():
+    """El servidor verifica cartillas impresas por serie con los números sorteados"""
+    import asyncio
+    import os
+    import tempfile
+    from bingo_card import BingoCard
+    from card_db import CardDatabase, create_database
+    from multiplayer_server import BingachoServer
+    
+    async def scenario(db, card):
+        server = BingachoServer(port=8766, card_database=db)
+        for number in (n for row in card.numbers for n in row if n is not None):
+            assert not server.verify_paper_card(77)['valid']
+            await server.handle_new_number(number)
+        assert server.verify_paper_card(77)['valid']
+        assert not server.verify_paper_card(78)['found']
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "salon.db")
+        card = BingoCard(card_id=77)
+        create_database(path, [card, BingoCard(card_id=5)])
+        with CardDatabase(path) as db:
+            asyncio.run(scenario(db, card))
+    print("✅ Verificación de cartillas impresas por serie")
+
+
+def test_server_auto_detect():
+    """Con auto_detect el servidor anuncia líneas y bingos en el mismo sorteo, juntos"""
+    import asyncio
+    from bingo_card import BingoCard, mask_to_numbers
+    from multiplayer_server import BingachoServer
+    
+    async def scenario():
+        server = BingachoServer(port=8766, auto_detect=True)
+        ana, luis, eva = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        for ws, nickname in ((ana, "ana"), (luis, "luis"), (eva, "eva")):
+            server.add_client(ws, nickname, "interactive_player")
+            server.assign_card(ws, nickname)
+        # Ana y Luis comparten cartilla: deben ganar en el mismo sorteo
+        card = BingoCard.from_dict(server.interactive_players[ana]['card'].to_dict())
+        server.unindex_card(luis, server.interactive_players[luis]['card'])
+        server.interactive_players[luis]['card'] = card
+        server.interactive_players[luis]['called_mask'] = server.index_card(luis, card)
+        
+        first_row = [n for n in card.numbers[0] if n is not None]
+        for number in first_row:
+            await server.handle_new_number(number)
+        await server.flush_outboxes()
+        winners = eva.messages("winners")
+        assert len(winners) == 1 and winners[0]["number"] == first_row[-1]
+        assert sorted(winners[0]["line"]) == ["ana", "luis"] and winners[0]["bingo"] == []
+        
+        for number in mask_to_numbers(card.mask):
+            await server.handle_new_number(number)
+        await server.flush_outboxes()
+        bingo = [m for m in eva.messages("winners") if m["bingo"]]
+        assert len(bingo) == 1 and sorted(bingo[0]["bingo"]) == ["ana", "luis"]
+        assert "ana" not in bingo[0]["line"]
+        
+        # El reclamo se valida con la detección automática
+        await server.handle_message(ana, {"type": "bingo_claim"})
+        await server.drain_claims()
+        await server.flush_outboxes()
+        assert [m["valid"] for m in ana.messages("bingo_result")] == [True]
+    
+    asyncio.run(scenario())
+    print("✅ Detección automática de ganadores")
+
+
+def test_delta_protocol():
+    """new_number solo lleva {seq, number}; un salto de seq se recupera con resync"""
+    import asyncio
+    import json
+    from multiplayer_client import BingachoClient
+    from multiplayer_server import BingachoServer
+    
+    async def scenario():
+        server = BingachoServer(port=8766)
+        screen = FakeWebSocket()
+        server.add_client(screen, "hud", "spectator")
+        client = BingachoClient("ws://localhost:8766", "hud")
+        client.websocket, client.connected = FakeWebSocket(), True
+        
+        await server.send_game_state(screen)
+        for number in (10, 20, 30, 40):
+            await server.handle_new_number(number)
+        await server.flush_outboxes()
+        deltas = screen.messages("new_number")
+        assert [m["seq"] for m in deltas] == [1, 2, 3, 4]
+        assert all("drawn_numbers" not in m for m in deltas)
+        
+        # El cliente pierde el sorteo 2
+        for message in [screen.messages("game_state")[0]] + deltas[:1] + deltas[2:]:
+            await client.handle_message(message)
+        assert client.drawn_numbers == [10] and client.seq == 1
+        resync = json.loads(client.websocket.sent[-1])
+        assert resync == {"type": "resync", "game_id": server.game_id, "seq": 1}
+        
+        await server.handle_resync(screen, resync["game_id"], resync["seq"])
+        await server.flush_outboxes()
+        await client.handle_message(screen.messages("draws")[-1])
+        assert client.drawn_numbers == server.drawn_numbers and client.seq == 4
+        
+        # Tras un reinicio el seq vuelve a empezar en otra partida
+        await server.handle_game_reset()
+        await server.flush_outboxes()
+        await client.handle_message(screen.messages("game_reset")[-1])
+        await server.handle_new_number(7)
+        await server.flush_outboxes()
+        await client.handle_message(screen.messages("new_number")[-1])
+        assert client.drawn_numbers == [7] and client.game_id == server.game_id
+        
+        # Un número fuera de rango o de otro tipo se rechaza sin tocar el estado
+        for number in (0, -5, 91, "7", 7.0, None, True):
+            assert await server.handle_new_number(number) is False
+        await server.handle_message(screen, {"type": "new_number"})
+        assert server.drawn_numbers == [7] and server.current_number == 7
+        
+        # Un resync de otra partida recibe el estado completo
+        await server.handle_resync(screen, 0, 3)
+        await server.flush_outboxes()
+        assert screen.messages()[-1]["type"] == "game_state"
+    
+    asyncio.run(scenario())
+    print("✅ Protocolo incremental con seq y resync")
+
+
+def test_client_outbox():
+    """Un cliente atascado no frena el broadcast, la presencia se fusiona y el lento se desaloja"""
+    import asyncio
+    from multiplayer_server import BingachoServer
+    
+    class StuckWebSocket(FakeWebSocket):
+        """Cliente que nunca termina de recibir"""
+        def __init__(self):
+            super().__init__()
+            self.closed_with = None
+        
+        async def send(self, message):
+            await asyncio.Event().wait()
+        
+        async def close(self, code=1000, reason=""):
+            self.closed_with = code
+    
+    async def scenario():
+        server = BingachoServer(port=8766)
+        fast, stuck = FakeWebSocket(), StuckWebSocket()
+        server.add_client(fast, "ana", "player")
+        server.add_client(stuck, "lento", "player")
+        
+        for i in range(10):
+            await server.broadcast_message({"type": "player_joined", "nickname": f"p{i}", "total_players": i})
+        await server.handle_new_number(5)
+        await asyncio.wait_for(server.outboxes[fast].drain(), 1)
+        # Las 10 actualizaciones de presencia pendientes quedan en la última
+        presence = fast.messages("player_joined")
+        assert presence[-1]["total_players"] == 9 and len(presence) < 10
+        assert fast.messages("new_number")[0]["number"] == 5
+        assert len(server.outboxes[stuck]) <= 2
+        
+        # Por encima del límite duro se desconecta
+        outbox = server.outboxes[stuck]
+        for number in range(6, 6 + outbox.max_pending + 1):
+            await server.handle_new_number(number % 90 + 1)
+        await asyncio.sleep(0)
+        assert outbox.evicted and stuck.closed_with == 1008 and len(outbox) == 0
+    
+    asyncio.run(scenario())
+    print("✅ Colas de salida acotadas por cliente")
+
+
+def test_role_registry():
+    """El registro por rol mantiene conteos y destinos de los broadcasts filtrados"""
+    import asyncio
+    from multiplayer_server import BingachoServer
+    
+    async def scenario():
+        server = BingachoServer(port=8766)
+        hud, ana, luis = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await server.register_client(hud, "hud", "spectator")
+        await server.register_client(ana, "ana", "player")
+        await server.register_client(luis, "luis", "interactive_player")
+        assert server.count_role("player") == 1 and server.count_role("spectator") == 1
+        await server.flush_outboxes()
+        assert ana.messages("game_state")[0]["total_players"] == 1
+        
+        await server.broadcast_message_filtered({"type": "spectator_frame", "data": ""}, role_filter="spectator")
+        await server.flush_outboxes()
+        assert len(hud.messages("spectator_frame")) == 1
+        assert not ana.messages("spectator_frame") and not luis.messages("spectator_frame")
+        
+        await server.unregister_client(hud)
+        assert server.count_role("spectator") == 0 and hud not in server.clients
+        # Volver a registrar con otro rol no deja la conexión en dos índices
+        server.add_client(ana, "ana", "spectator")
+        assert server.count_role("player") == 0 and server.count_role("spectator") == 1
+    
+    asyncio.run(scenario())
+    print("✅ Registro de clientes por rol")
+
+
+def test_multi_room():
+    """Cada sala tiene su propio estado y solo reparte a sus clientes"""
+    import asyncio
+    import os
+    import tempfile
+    from multiplayer_server import DEFAULT_ROOM, BingachoServer
+    
+    async def scenario():
+        server = BingachoServer(port=8766, max_rooms=3)
+        hud, ana, luis, eva = FakeWebSocket(), FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await server.register_client(hud, "hud", "spectator")
+        room_a = await server.register_client(ana, "ana", "interactive_player", "a")
+        room_b = await server.register_client(luis, "luis", "interactive_player", "b")
+        await server.register_client(eva, "eva", "player", "a")
+        assert server.rooms[DEFAULT_ROOM] is server and set(server.rooms) == {DEFAULT_ROOM, "a", "b"}
+        assert len(server.connections) == 4 and len(room_a.clients) == 2 and len(server.clients) == 1
+        room_a.assign_card(ana, "ana")
+        room_b.assign_card(luis, "luis")
+        
+        number = next(n for n in range(1, 91) if not room_b.interactive_players[luis]['card'].mask >> (n - 1) & 1)
+        await room_a.handle_new_number(number)
+        await room_b.handle_game_reset()
+        await server.flush_outboxes()
+        assert room_a.drawn_numbers == [number] and not room_b.drawn_numbers and not server.drawn_numbers
+        assert room_a.game_id == 1 and room_b.game_id == 2 and server.game_id == 1
+        assert [m["number"] for m in ana.messages("new_number")] == [number] == [m["number"] for m in eva.messages("new_number")]
+        assert not luis.messages("new_number") and not hud.messages("new_number")
+        assert not ana.messages("game_reset") and len(luis.messages("game_reset")) == 1
+        assert ana.messages("game_state")[0]["room"] == "a"
+        assert eva.messages("player_joined")[-1]["total_players"] == 2
+        
+        # Los mensajes de un cliente se aplican en su sala
+        await server.connections[luis].handle_message(luis, {"type": "mark_number", "number": number})
+        await server.flush_outboxes()
+        assert luis.messages("mark_rejected")[0]["reason"] == "not_called"
+        
+        # Límite de salas: la cuarta no se crea
+        assert server.room("c") is None
+        late = FakeWebSocket([{"type": "register", "nickname": "zoe", "room": "c"}])
+        await server.handle_client(late)
+        assert late.messages("room_unavailable") and late not in server.connections
+        
+        # Una sala vacía sin sorteos se libera; una con partida en curso se conserva
+        await server.unregister_client(luis)
+        await server.unregister_client(ana)
+        await server.unregister_client(eva)
+        assert "b" not in server.rooms and "a" in server.rooms and not room_a.number_index.get(number)
+    
+    async def host_rooms(path):
+        # Solo el anfitrión crea salas y sortea; una sala abandonada se cierra y sale del diario
+        server = BingachoServer(port=8766, max_rooms=3, journal_path=path, resume_grace=0)
+        for i in range(5):
+            drive_by = FakeWebSocket([{"type": "register", "nickname": "x", "room": f"z{i}"},
+                                      {"type": "new_number", "number": 5}])
+            await server.handle_client(drive_by)
+            assert drive_by.messages("room_unavailable")
+        assert set(server.rooms) == {DEFAULT_ROOM} and not server.drawn_numbers
+        
+        impostor = FakeWebSocket([{"type": "register", "nickname": "h", "role": "host", "room": "z", "host_key": "no"}])
+        await server.handle_client(impostor)
+        assert impostor.messages("host_rejected") and "z" not in server.rooms
+        
+        host = FakeWebSocket([{"type": "register", "nickname": "h", "role": "host", "room": "z",
+                               "host_key": server.host_key}, {"type": "new_number", "number": 5}])
+        await server.handle_client(host)
+        assert "z" not in server.rooms
+        server.journal.flush()
+        recovered = BingachoServer(port=8766, journal_path=path, resume_grace=0)
+        assert set(recovered.rooms) == {DEFAULT_ROOM}
+        recovered.journal.close()
+        server.journal.close()
+        
+        # Con periodo de gracia la sala con partida espera a que alguien vuelva
+        server = BingachoServer(port=8766, resume_grace=60, host_key="clave")
+        host = FakeWebSocket([{"type": "register", "nickname": "h", "role": "host", "room": "z", "host_key": "clave"},
+                              {"type": "new_number", "number": 5}])
+        await server.handle_client(host)
+        room = server.rooms["z"]
+        assert room.drawn_numbers == [5] and room.idle_since is not None
+        room.idle_since -= 60
+        server.expire_rooms()
+        assert "z" not in server.rooms
+    
+    asyncio.run(scenario())
+    asyncio.run(host_rooms(os.path.join(tempfile.mkdtemp(), "salas.journal")))
+    print("✅ Salas independientes")
+
+
+def test_fanout_bus():
+    """Los procesos de reparto reciben los broadcasts por el bus y los reenvían a sus espectadores"""
+    import asyncio
+    import os
+    import tempfile
+    from event_bus import EventBus, subscribe
+    from fanout_worker import FanoutWorker
+    from multiplayer_server import BingachoServer
+    
+    async def follow(worker, path):
+        async for event in subscribe(path):
+            await worker.apply(event)
+    
+    async def settle(server, worker):
+        for _ in range(20):
+            await asyncio.sleep(0.01)
+        await server.flush_outboxes()
+        await asyncio.gather(*[outbox.drain() for outbox in worker.outboxes.values()])
+    
+    async def scenario(path):
+        server = BingachoServer(port=8766)
+        server.bus = EventBus(path, server.bus_snapshot)
+        await server.bus.start()
+        await server.handle_new_number(12)
+        
+        # Al suscribirse, el proceso recibe el estado de las salas
+        worker = FanoutWorker(path, "ws://127.0.0.1:8766")
+        task = asyncio.create_task(follow(worker, path))
+        await settle(server, worker)
+        assert worker.rooms["main"].drawn_numbers == [12]
+        
+        hud, ana = FakeWebSocket(), FakeWebSocket()
+        room = worker.room("main")
+        room.join(hud, "hud", "spectator", batch=True)
+        room.join(ana, "ana", "player", codec="binary")
+        await server.handle_new_number(40)
+        await server.broadcast_message_filtered({"type": "spectator_frame", "data": ""}, role_filter="spectator")
+        await server.handle_game_reset()
+        await server.handle_new_number(7)
+        await settle(server, worker)
+        assert [m["seq"] for m in hud.messages("new_number")] == [2, 1]
+        assert [m["number"] for m in ana.messages("new_number")] == [40, 7]
+        assert hud.messages("spectator_frame") and not ana.messages("spectator_frame")
+        assert room.game_id == server.game_id == 2 and room.drawn_numbers == server.drawn_numbers == [7]
+        
+        # El resync se responde en el proceso de reparto con su copia
+        await room.handle_resync(hud, 2, 0)
+        await settle(server, worker)
+        assert hud.messages("draws")[-1]["numbers"] == [7]
+        
+        # El proceso solo copia las salas del servidor y suelta las que el servidor cierra
+        assert worker.room("b") is None
+        server.room("b")
+        await settle(server, worker)
+        eva = FakeWebSocket()
+        worker.room("b").join(eva, "eva", "spectator")
+        worker.connections[eva] = worker.rooms["b"]
+        server.expire_rooms()
+        await settle(server, worker)
+        assert "b" not in server.rooms and set(worker.rooms) == {"main"}
+        assert eva.messages("room_closed") and eva not in worker.connections
+        
+        task.cancel()
+        await server.bus.stop()
+    
+    path = os.path.join(tempfile.mkdtemp(), "bus.sock")
+    asyncio.run(scenario(path))
+    print("✅ Reparto por bus de eventos")
+
+
+def test_game_journal():
+    """Tras una caída, el diario recupera sorteos, cartillas, marcas y reclamos de cada sala"""
+    import asyncio
+    import os
+    import tempfile
+    import time
+    from bingo_card import BingoCard
+    from multiplayer_server import BingachoServer
+    
+    path = os.path.join(tempfile.mkdtemp(), "partida.journal")
+    
+    async def before_crash():
+        # Sin periodo de gracia: la cartilla de luis se libera en cuanto se desconecta
+        server = BingachoServer(port=8766, journal_path=path, resume_grace=0)
+        ana, luis, anon1, anon2 = FakeWebSocket(), FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await server.register_client(ana, "ana", "interactive_player", "a")
+        await server.register_client(luis, "luis", "interactive_player", "a")
+        await server.register_client(anon1, "anon", "interactive_player", "a")
+        await server.register_client(anon2, "anon", "interactive_player", "a")
+        room = server.rooms["a"]
+        token = room.open_session(ana)
+        card = room.assign_card(ana, "ana")
+        room.open_session(luis)
+        room.assign_card(luis, "luis")
+        # Dos jugadores con el mismo nickname conservan cada uno su cartilla
+        anons = {}
+        for ws in (anon1, anon2):
+            key = room.open_session(ws)
+            anons[key] = room.assign_card(ws, "anon").numbers
+        numbers = [n for row in card.numbers for n in row if n is not None][:4]
+        for number in numbers + [numbers[0]]:
+            await room.handle_new_number(number)
+        for number in numbers[:3]:
+            await room.handle_message(ana, {"type": "mark_number", "number": number})
+        await room.handle_message(ana, {"type": "bingo_claim"})
+        await room.drain_claims()
+        await server.unregister_client(luis)
+        await server.handle_game_start()
+        await server.handle_new_number(33)
+        server.journal.flush()
+        return room.journal_state(), server.game_state(), card.marked_mask, token, anons
+    
+    room_state, main_state, marked_mask, token, anons = asyncio.run(before_crash())
+    
+    async def after_crash():
+        start = time.perf_counter()
+        server = BingachoServer(port=8766, journal_path=path)
+        elapsed = time.perf_counter() - start
+        room = server.rooms["a"]
+        assert room.journal_state() == room_state and server.game_state() == main_state
+        assert set(room.suspended) == {token, *anons} and room.latest_bingo_claim["valid"] is False
+        assert {key: room.suspended[key]['card'].numbers for key in anons} == anons
+        
+        # Otro "anon" sin token recibe una cartilla nueva, no la de un anon anterior
+        anon = FakeWebSocket([{"type": "register", "nickname": "anon", "role": "interactive_player", "room": "a"}])
+        await server.handle_client(anon)
+        fresh = BingoCard.from_dict(anon.messages("assign_card")[0]["card"])
+        assert fresh.numbers not in anons.values() and set(anons) <= set(room.suspended)
+        
+        # Al volver con su token, ana recibe su misma cartilla con sus marcas
+        ana = FakeWebSocket([{"type": "register", "nickname": "ana", "role": "interactive_player", "room": "a",
+                              "resume_token": token, "game_id": room.game_id, "seq": 0}])
+        await server.handle_client(ana)
+        card = BingoCard.from_dict(ana.messages("resumed")[0]["card"])
+        saved = BingoCard.from_dict(room_state["players"][token]["card"])
+        assert card.numbers == saved.numbers and card.marked_mask == saved.marked_mask == marked_mask
+        assert room.interactive_players == {} and room.suspended[token]['card'].numbers == card.numbers
+        server.journal.flush()
+        return elapsed, server
+    
+    elapsed, server = asyncio.run(after_crash())
+    print(f"   Recuperación sin instantánea: {elapsed * 1000:.1f} ms")
+    
+    # Instantáneas: el diario se vacía y una línea a medio escribir se descarta
+    async def with_snapshots():
+        server.journal.snapshot_every = 10
+        for number in range(1, 40):
+            await server.handle_new_number(number)
+        server.journal.flush()
+        assert server.journal.snapshots >= 3 and os.path.exists(path + ".snap")
+        with open(path, "ab") as f:
+            f.write(b'{"n": 99999, "op": "dr')
+        expected = server.game_state()
+        recovered = BingachoServer(port=8766, journal_path=path)
+        assert recovered.game_state() == expected
+        recovered.journal.close()
+    
+    asyncio.run(with_snapshots())
+    
+    # Los ganadores ya anunciados antes de la caída no se vuelven a anunciar
+    winners_path = os.path.join(tempfile.mkdtemp(), "ganadores.journal")
+    
+    async def winners_before_crash():
+        server = BingachoServer(port=8766, journal_path=winners_path, auto_detect=True)
+        ana = FakeWebSocket()
+        await server.register_client(ana, "ana", "interactive_player", "w")
+        room = server.rooms["w"]
+        room.set_patterns(["line"])
+        token = room.open_session(ana)
+        card = room.assign_card(ana, "ana")
+        for number in card.numbers[0]:
+            if number is not None:
+                await room.handle_new_number(number)
+        await server.flush_outboxes()
+        assert ana.messages("pattern_winners") and ana.messages("winners")
+        server.journal.flush()
+        return token, card
+    
+    async def winners_after_crash(token, card):
+        server = BingachoServer(port=8766, journal_path=winners_path, auto_detect=True)
+        room = server.rooms["w"]
+        ana = FakeWebSocket()
+        assert await server.resume_client(ana, token, room, room.game_id, len(room.drawn_numbers))
+        assert ana in room.pattern_winners["line"] and ana in room.auto_winners["line"]
+        await room.handle_new_number(next(n for n in card.numbers[1] if n is not None))
+        await server.flush_outboxes()
+        assert ana.messages("new_number") and not ana.messages("pattern_winners") and not ana.messages("winners")
+        server.journal.close()
+    
+    asyncio.run(winners_after_crash(*asyncio.run(winners_before_crash())))
+    print("✅ Diario de la partida")
+
+
+def test_resume_session():
+    """Un jugador que se reconecta con su token recupera su cartilla y solo los sorteos perdidos"""
+    import asyncio
+    from bingo_card import mask_to_numbers, numbers_to_mask
+    from multiplayer_server import BingachoServer
+    
+    async def scenario():
+        server = BingachoServer(port=8766, seeded_cards=True, resume_grace=60)
+        # La primera cartilla de la partida es la del serial 0: se sortean 5 de sus números
+        numbers = mask_to_numbers(BingoCard.from_seed(server.game_seed, 0).mask)
+        others = [n for n in range(1, 91) if n not in numbers]
+        drawn = numbers[:5] + others[:40]
+        for number in drawn:
+            await server.handle_new_number(number)
+        register = {"type": "register", "nickname": "ana", "role": "interactive_player", "batch": True}
+        first = FakeWebSocket([register] + [{"type": "mark_number", "number": n} for n in numbers[:5]])
+        await server.handle_client(first)
+        token = first.messages("assign_card")[0]["resume_token"]
+        assert [m["number"] for m in first.messages("mark_confirmed")] == numbers[:5]
+        assert first not in server.connections and not server.interactive_players
+        assert set(server.suspended) == {token}
+        
+        # Sorteos mientras el jugador está desconectado: su cartilla no está en el índice
+        missed = [numbers[5]] + others[40:44]
+        for number in missed:
+            await server.handle_new_number(number)
+        second = FakeWebSocket()
+        assert await server.resume_client(second, token, server, game_id=server.game_id, seq=45)
+        await server.flush_outboxes()
+        assert not second.messages("game_state") and not second.messages("assign_card")
+        resumed = second.messages("resumed")[0]
+        assert BingoCard.from_dict(resumed["card"]).marked_mask == numbers_to_mask(numbers[:5])
+        assert second.messages("draws")[0]["numbers"] == missed
+        card = server.interactive_players[second]['card']
+        assert server.interactive_players[second]['called_mask'] == numbers_to_mask(numbers[:6])
+        assert all(second in server.number_index[n] for n in mask_to_numbers(card.mask))
+        
+        # Con la conexión anterior todavía abierta, la nueva la sustituye
+        third = FakeWebSocket()
+        assert await server.resume_client(third, token, server, game_id=server.game_id, seq=50)
+        assert second not in server.connections and server.interactive_players[third]['card'] is card
+        await asyncio.sleep(0)
+        assert second.close_code == 4000 and second not in server.outboxes
+        assert not any(second in holders for holders in server.number_index.values())
+        
+        # Token desconocido o caducado: registro normal con cartilla nueva
+        server.resume_grace = 0
+        await server.unregister_client(third)
+        late = FakeWebSocket([{**register, "resume_token": token, "game_id": server.game_id, "seq": 50}])
+        await server.handle_client(late)
+        assert not late.messages("resumed") and late.messages("game_state") and late.messages("assign_card")
+        assert token not in server.suspended
+    
+    asyncio.run(scenario())
+    print("✅ Reanudación de sesiones")
+
+
+def test_input_limits():
+    """Los mensajes entrantes se limitan por tipo y los frames inválidos se descartan sin decodificar"""
+    import asyncio
+    from input_limits import MAX_MESSAGE_SIZE, InputLimiter
+    from multiplayer_server import BingachoServer
+    
+    now = [0.0]
+    limiter = InputLimiter(limits={"ping": (1.0, 2)}, clock=lambda: now[0])
+    assert [limiter.admit({"type": "ping"}) for _ in range(3)] == ["ping", "ping", None]
+    now[0] += 1.0
+    assert limiter.admit({"type": "ping"}) == "ping" and limiter.admit({"type": "ping"}) is None
+    assert not limiter.admit_frame("x" * (MAX_MESSAGE_SIZE + 1)) and limiter.admit({"type": 3}) is None
+    assert limiter.stats() == {'accepted': 3, 'dropped': 2, 'throttled': 2, 'throttled_by_type': {"ping": 2}}
+    
+    async def scenario():
+        server = BingachoServer(port=8766)
+        await server.handle_new_number(7)
+        spam = FakeWebSocket(
+            [{"type": "register", "nickname": "tab", "role": "interactive_player"}]
+            + [{"type": "ping"}] * 20
+            + [{"type": "mark_number", "number": 7}] * 35
+            + ["{", "[1]", "x" * (MAX_MESSAGE_SIZE + 1)]
+            # Anidación excesiva (RecursionError) y mapa binario con clave lista (TypeError)
+            + ["[" * 2000, b"\x81\x91\x01\x01"]
+        )
+        await server.handle_client(spam)
+        assert len(spam.messages("pong")) == 3
+        assert len(spam.messages("mark_rejected")) + len(spam.messages("mark_confirmed")) == 30
+        assert server.input_stats() == {
+            'clients': [],
+            'totals': {'accepted': 34, 'dropped': 5, 'throttled': 22}
+        }
+        
+        # Una marca con un número inválido se rechaza con la máscara de sorteados
+        player = FakeWebSocket()
+        server.add_client(player, "eva", "interactive_player")
+        server.assign_card(player, "eva")
+        for number in (-1, "7", 91, 8):
+            await server.handle_message(player, {"type": "mark_number", "number": number})
+        await server.flush_outboxes()
+        assert [m["reason"] for m in player.messages("mark_rejected")] == ["not_called"] * 4
+    
+    asyncio.run(scenario())
+    print("✅ Límites de entrada")
+
+
+def test_claim_queue():
+    """Los reclamos simultáneos se verifican en un lote y un empate da un solo bingo_result"""
+    import asyncio
+    from bingo_card import BingoCard, mask_to_numbers
+    from multiplayer_server import BingachoServer
+    
+    async def scenario():
+        server = BingachoServer(port=8766)
+        ana, luis, eva, hud = FakeWebSocket(), FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        server.add_client(hud, "hud", "spectator")
+        for ws, nickname in ((ana, "ana"), (luis, "luis"), (eva, "eva")):
+            server.add_client(ws, nickname, "interactive_player")
+            server.assign_card(ws, nickname)
+        # Luis tiene una copia de la cartilla de Ana: los dos completan el bingo a la vez
+        card = BingoCard.from_dict(server.interactive_players[ana]['card'].to_dict())
+        server.unindex_card(luis, server.interactive_players[luis]['card'])
+        server.interactive_players[luis]['card'] = card
+        server.interactive_players[luis]['called_mask'] = server.index_card(luis, card)
+        for number in mask_to_numbers(card.mask):
+            await server.handle_new_number(number)
+            for ws in (ana, luis):
+                await server.handle_message(ws, {"type": "mark_number", "number": number})
+        
+        for ws in (eva, luis, ana, ana):
+            await server.handle_message(ws, {"type": "bingo_claim"})
+        await server.drain_claims()
+        await server.flush_outboxes()
+        results = hud.messages("bingo_result")
+        assert len(results) == 1 and results[0]["valid"] and results[0]["seq"] == len(server.drawn_numbers)
+        assert [w["player"] for w in results[0]["winners"]] == ["luis", "ana"]
+        assert results[0]["rejected"] == [{"player": "eva", "reason": "No todos los números están marcados"}]
+        assert len(hud.messages("game_paused")) == 1 and not hud.messages("game_resumed")
+        assert server.game_paused and server.latest_bingo_claim["winners"] == ["luis", "ana"]
+        
+        # Un reclamo inválido posterior no reanuda la partida ya ganada
+        await server.handle_message(eva, {"type": "bingo_claim"})
+        await server.drain_claims()
+        await server.flush_outboxes()
+        assert [m["valid"] for m in hud.messages("bingo_result")] == [True, False]
+        assert len(hud.messages("game_paused")) == 1 and not hud.messages("game_resumed") and server.game_paused
+        
+        # Los reclamos de una partida reiniciada antes de verificarse se descartan
+        await server.handle_message(ana, {"type": "bingo_claim"})
+        await server.handle_game_reset()
+        await server.drain_claims()
+        await server.flush_outboxes()
+        assert len(hud.messages("bingo_result")) == 2 and not server.game_paused
+        server.stop_claims()
+    
+    async def draw_during_window():
+        # Sorteos entre la llegada de los reclamos y su verificación
+        server = BingachoServer(port=8766)
+        ana, luis, eva, hud = FakeWebSocket(), FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        server.add_client(hud, "hud", "spectator")
+        for ws, nickname in ((ana, "ana"), (luis, "luis"), (eva, "eva")):
+            server.add_client(ws, nickname, "interactive_player")
+            server.assign_card(ws, nickname)
+        original = server.interactive_players[ana]['card']
+        for ws in (luis, eva):
+            server.unindex_card(ws, server.interactive_players[ws]['card'])
+            server.interactive_players[ws]['card'] = BingoCard.from_dict(original.to_dict())
+            server.interactive_players[ws]['called_mask'] = server.index_card(ws, server.interactive_players[ws]['card'])
+        numbers = mask_to_numbers(original.mask)
+        
+        async def draw_and_mark(number):
+            await server.handle_new_number(number)
+            for ws in (ana, luis, eva):
+                await server.handle_message(ws, {"type": "mark_number", "number": number})
+        
+        for number in numbers[:-1]:
+            await draw_and_mark(number)
+        # Ana reclama con un número pendiente que sale antes de verificar: no vale
+        await server.handle_message(ana, {"type": "bingo_claim"})
+        await draw_and_mark(numbers[-1])
+        await server.handle_message(luis, {"type": "bingo_claim"})
+        winning_seq = len(server.drawn_numbers)
+        # Eva reclama después de otro sorteo: su bingo es válido pero no empata con Luis
+        await draw_and_mark(next(n for n in range(1, 91) if n not in numbers))
+        await server.handle_message(eva, {"type": "bingo_claim"})
+        await server.drain_claims()
+        await server.flush_outboxes()
+        
+        results = hud.messages("bingo_result")
+        assert len(results) == 1 and results[0]["seq"] == winning_seq
+        assert [w["player"] for w in results[0]["winners"]] == ["luis"]
+        assert results[0]["rejected"] == [
+            {"player": "ana", "reason": "No todos los números están marcados"},
+            {"player": "eva", "reason": "Bingo posterior al del ganador"},
+        ]
+        server.stop_claims()
+    
+    asyncio.run(scenario())
+    asyncio.run(draw_during_window())
+    print("✅ Cola de reclamos")
+
+
+def test_wire_codec():
+    """El códec binario se negocia en el registro y decodifica igual que JSON"""
+    import asyncio
+    import json
+    from bingo_card import BingoCard
+    from multiplayer_server import BingachoServer
+    from wire_codec import decode, encode
+    
+    card = BingoCard(card_id="ana")
+    card.mark_number(next(n for n in card.numbers[0] if n is not None))
+    samples = [
+        {"type": "game_state", "drawn_numbers": [90, 1, 45], "seq": 3, "current_number": None},
+        {"type": "assign_card", "card": card.to_dict()},
+        {"type": "assign_card", "card": card.to_packed_dict()},
+        {"type": "x", "f": 1.5, "n": -7, "big": 2 ** 40, "s": "ñandú" * 10, "l": list(range(300)), "e": [], "b": [True, None]},
+    ]
+    samples.append({"límites": [2 ** 64 - 1, 2 ** 63, -2 ** 63, -129, -33, 255, 65536], "ñ": {"a": "b" * 40}})
+    for message in samples:
+        frame = encode(message, "binary")
+        assert isinstance(frame, bytes) and decode(frame) == json.loads(json.dumps(message))
+        assert len(frame) < len(encode(message))
+        # Cualquier frame cortado se rechaza con ValueError
+        for end in range(len(frame)):
+            try:
+                decode(frame[:end])
+                assert False, "Un frame truncado no debería decodificarse"
+            except ValueError:
+                pass
+    # Un entero que no cabe en 64 bits no se serializa (ValueError, no struct.error)
+    for value in (2 ** 64, -2 ** 63 - 1, 10 ** 30):
+        try:
+            encode({"serial": value}, "binary")
+            assert False, "Debería rechazar un entero de más de 64 bits"
+        except ValueError:
+            pass
+    
+    async def scenario():
+        server = BingachoServer(port=8766)
+        ws = FakeWebSocket([
+            {"type": "register", "nickname": "ana", "role": "interactive_player", "codec": "binary"},
+        ])
+        await server.handle_client(ws)
+        assert ws.sent and all(isinstance(frame, bytes) for frame in ws.sent)
+        assert ws.messages("assign_card")[0]["card"]["card_id"] == "ana"
+        
+        # La verificación de series responde con la serie interpretada, que siempre cabe
+        screen = FakeWebSocket([
+            {"type": "register", "nickname": "tv", "role": "player", "codec": "binary"},
+            {"type": "verify_serial", "serial": 10 ** 30},
+            {"type": "verify_serial", "serial": "12"},
+        ])
+        await server.handle_client(screen)
+        assert [m["serial"] for m in screen.messages("serial_verification")] == [None, 12]
+        
+        # Infinity y NaN (JSON de Python los acepta) no tiran la conexión
+        screen = FakeWebSocket(['{"type": "register", "nickname": "tv", "role": "player"}',
+                                '{"type": "verify_serial", "serial": Infinity}',
+                                '{"type": "verify_serial", "serial": NaN}',
+                                '{"type": "verify_serial", "serial": 3}'])
+        await server.handle_client(screen)
+        assert [m["serial"] for m in screen.messages("serial_verification")] == [None, None, 3]
+    
+    asyncio.run(scenario())
+    print("✅ Códec binario negociado")
+
+
+def test_tick_batching():
+    """Los mensajes de un mismo tick salen en un solo frame para clientes con batch"""
+    import asyncio
+    from multiplayer_server import BingachoServer
+    
+    async def scenario():
+        server = BingachoServer(port=8766)
+        batched, plain = FakeWebSocket(), FakeWebSocket()
+        server.add_client(batched, "ana", "spectator", batch=True)
+        server.add_client(plain, "luis", "spectator")
+        for message in ({"type": "game_paused"}, {"type": "bingo_result", "valid": False},
+                        {"type": "game_resumed"}):
+            await server.broadcast_message(message)
+        await server.flush_outboxes()
+        assert len(batched.sent) == 1 and len(plain.sent) == 3
+        assert [m["type"] for m in batched.messages()] == ["game_paused", "bingo_result", "game_resumed"]
+        stats = server.transport_stats()
+        assert stats["messages"] == 6 and stats["frames"] == 4 and stats["frames_saved"] == 2
+        assert stats["bytes_saved"] > 0
+    
+    asyncio.run(scenario())
+    print("✅ Agrupación de mensajes por tick")
+
+
+def test_server_game_mode_75():
+    """En modo 75 el servidor asigna cartillas 5x5 al registrar y al reiniciar"""
+    import asyncio
+    from bingo_card import BingoCard75
+    from multiplayer_server import BingachoServer
+    
+    async def scenario():
+        server = BingachoServer(port=8766)
+        server.game_mode = 75
+        ws = FakeWebSocket()
+        server.add_client(ws, "ana", "interactive_player")
+        assert isinstance(server.assign_card(ws, "ana"), BingoCard75)
+        await server.handle_game_reset()
+        assert isinstance(server.interactive_players[ws]['card'], BingoCard75)
+        await server.flush_outboxes()
+        assert len(ws.messages("assign_card")[-1]["card"]["numbers"]) == 5
+    
+    asyncio.run(scenario())
+    print("✅ Cartillas de 75 bolas en el servidor")
+
+
+def test_server_pattern_winners():
+    """El servidor anuncia una sola vez a los ganadores de cada patrón activo"""
+    import asyncio
+    from multiplayer_server import BingachoServer
+    
+    async def scenario():
+        server = BingachoServer(port=8766)
+        server.game_mode = 75
+        server.set_patterns(['four_corners', 'x'])
+        players = [FakeWebSocket() for _ in range(5)]
+        for i, ws in enumerate(players):
+            server.add_client(ws, f"p{i}", "interactive_player")
+            server.assign_card(ws, f"p{i}")
+        target = server.interactive_players[players[0]]['card'].numbers
+        for r, c in ((0, 0), (0, 4), (4, 0), (4, 4)):
+            await server.handle_new_number(target[r][c])
+        await server.flush_outboxes()
+        announced = players[1].messages("pattern_winners")
+        assert any("p0" in m["winners"].get("four_corners", []) for m in announced)
+        batch = server.find_pattern_winners()
+        assert players[0] in batch["four_corners"]
+        # Volver a sortear no repite el anuncio
+        count = len(announced)
+        await server.handle_new_number(target[0][0])
+        await server.flush_outboxes()
+        assert len(players[1].messages("pattern_winners")) == count
+    
+    async def host_patterns():
+        # 90 bolas: la X no existe y se rechaza sin tocar los patrones activos
+        server = BingachoServer(port=8766)
+        display, spectator, player = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        server.add_client(display, "pantalla", "player")
+        server.add_client(spectator, "web", "spectator")
+        server.add_client(player, "ana", "interactive_player")
+        try:
+            server.set_patterns(['two_lines', 'x'])
+            assert False, "Debería rechazar un patrón que no es de 90 bolas"
+        except ValueError as e:
+            assert "'x'" in str(e) and "two_lines" in str(e)
+        assert server.active_patterns == []
+        
+        # Solo el anfitrión (en proceso) cambia los patrones: ningún cliente puede hacerlo
+        for ws in (display, spectator, player):
+            await server.handle_message(ws, {"type": "set_patterns", "names": ["line"]})
+        assert server.active_patterns == []
+        try:
+            await server.handle_set_patterns("two_lines")
+            assert False, "names debe ser una lista"
+        except ValueError:
+            pass
+        await server.handle_set_patterns(["two_lines"])
+        await server.flush_outboxes()
+        assert [pattern.name for pattern in server.active_patterns] == ["two_lines"]
+        assert player.messages("patterns_set")[0]["patterns"][0]["name"] == "two_lines"
+    
+    asyncio.run(scenario())
+    asyncio.run(host_patterns())
+    print("✅ Ganadores de patrones en el servidor")
+
+
 def test_client_import():
     """Prueba que el cliente se puede importar"""
     print("\n" + "="*60)
@@ -219,6 +1184,24 @@ def run_all_tests():
     tests = [
         ("Cartillas de Bingo", test_bingo_card),
         ("Servidor", test_server_import),
+        ("Índice de cartillas", test_server_card_index),
+        ("Cartillas por semilla", test_server_seeded_cards),
+        ("Cartillas empaquetadas", test_server_packed_cards),
+        ("Cartillas impresas", test_server_verify_serial),
+        ("Detección automática", test_server_auto_detect),
+        ("Protocolo incremental", test_delta_protocol),
+        ("Colas de salida", test_client_outbox),
+        ("Registro por rol", test_role_registry),
+        ("Salas", test_multi_room),
+        ("Bus de reparto", test_fanout_bus),
+        ("Diario de la partida", test_game_journal),
+        ("Reanudación de sesiones", test_resume_session),
+        ("Límites de entrada", test_input_limits),
+        ("Cola de reclamos", test_claim_queue),
+        ("Códec binario", test_wire_codec),
+        ("Agrupación por tick", test_tick_batching),
+        ("Modo 75 bolas", test_server_game_mode_75),
+        ("Patrones especiales", test_server_pattern_winners),
         ("Cliente", test_client_import),
         ("Gestor", test_manager_import),
         ("Selector de Modo", test_mode_selection_import),
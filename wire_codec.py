@@ -0,0 +1,371 @@
+"""
+Códecs del protocolo WebSocket de Bingacho: JSON (por defecto) y binario
+
+El cliente elige el códec en el mensaje de registro ({"type": "register", "codec": "binary"},
+que siempre viaja en JSON). El servidor responde a cada cliente con su códec y distingue
+los mensajes entrantes por el tipo de frame: texto = JSON, binario = códec binario.
+
+El códec binario es MessagePack estándar (decodificable con cualquier librería msgpack)
+con tres tipos de extensión para los datos típicos de una partida:
+    EXT_NUMBERS (1): lista de enteros 0-255 (números sorteados, seq...), un byte cada uno
+    EXT_BITMAP (2):  conjunto de números como máscara de bits little-endian (bit n-1 = n),
+                     para las claves de BITMAP_KEYS; se decodifica como lista ordenada
+    EXT_BASE64 (3):  bytes crudos de un campo base64 de BASE64_KEYS (cartilla empaquetada,
+                     frames del espectador); se decodifica de nuevo a base64
+Así decode(encode(m)) devuelve exactamente el mismo diccionario que JSON y los
+manejadores de mensajes no necesitan saber qué códec se usó. Como en MessagePack, los
+enteros deben caber en 64 bits (encode lanza ValueError si no).
+"""
+
+import base64
+import binascii
+import json
+import struct
+
+CODECS = ('json', 'binary')
+# Excepciones de decode ante un frame malformado (ver decode)
+DECODE_ERRORS = (ValueError, TypeError, RecursionError)
+
+EXT_NUMBERS = 1
+EXT_BITMAP = 2
+EXT_BASE64 = 3
+
+# Listas sin orden (siempre ordenadas de menor a mayor) que viajan como máscara de bits
+BITMAP_KEYS = frozenset({'marked'})
+# Campos de texto base64 que viajan como bytes crudos
+BASE64_KEYS = frozenset({'packed', 'data'})
+
+
+def encode(message, codec='json'):
+    """
+    Serializa un mensaje
+
+    Args:
+        message: Diccionario del mensaje
+        codec: 'json' (retorna str) o 'binary' (retorna bytes)
+
+    Raises:
+        TypeError: Si el mensaje contiene un valor no serializable
+        ValueError: Si el mensaje contiene un entero que no cabe en 64 bits (solo binario)
+    """
+    if codec == 'binary':
+        out = bytearray()
+        _pack(message, out)
+        return bytes(out)
+    return json.dumps(message)
+
+
+def decode(frame):
+    """
+    Deserializa un frame recibido: str se interpreta como JSON y bytes como binario
+
+    Raises:
+        ValueError: Si el frame no es válido
+        TypeError: Si un mapa binario usa como clave un valor no hashable
+        RecursionError: Si el frame anida demasiadas listas o mapas
+    """
+    if isinstance(frame, str):
+        return json.loads(frame)
+    data = frame if type(frame) is bytes else bytes(frame)
+    try:
+        value, offset = _unpack(data, 0)
+    except (IndexError, struct.error) as e:
+        raise ValueError("Mensaje binario truncado") from e
+    if offset > len(data):
+        raise ValueError("Mensaje binario truncado")
+    if offset < len(data):
+        raise ValueError("Bytes sobrantes al final del mensaje binario")
+    return value
+
+
+def _pack_ext(ext_type, payload, out):
+    size = len(payload)
+    fixed = {1: 0xd4, 2: 0xd5, 4: 0xd6, 8: 0xd7, 16: 0xd8}.get(size)
+    if fixed is not None:
+        out.append(fixed)
+    elif size < 0x100:
+        out += struct.pack('>BB', 0xc7, size)
+    elif size < 0x10000:
+        out += struct.pack('>BH', 0xc8, size)
+    else:
+        out += struct.pack('>BI', 0xc9, size)
+    out.append(ext_type)
+    out += payload
+
+
+def _as_bitmap(value):
+    """Máscara de bits de una lista estrictamente creciente de enteros positivos, o None"""
+    if not isinstance(value, list) or not value:
+        return None
+    previous = 0
+    mask = 0
+    for number in value:
+        if type(number) is not int or number <= previous:
+            return None
+        mask |= 1 << (number - 1)
+        previous = number
+    return mask.to_bytes((previous + 7) // 8, 'little')
+
+
+def _pack_int(value, out):
+    if value >= 0:
+        if value < 0x80:
+            out.append(value)
+        elif value < 0x100:
+            out += struct.pack('>BB', 0xcc, value)
+        elif value < 0x10000:
+            out += struct.pack('>BH', 0xcd, value)
+        elif value < 0x100000000:
+            out += struct.pack('>BI', 0xce, value)
+        elif value < 1 << 64:
+            out += struct.pack('>BQ', 0xcf, value)
+        else:
+            raise ValueError(f"Entero fuera del rango de MessagePack (64 bits): {value}")
+    elif value >= -32:
+        out.append(value & 0xff)
+    elif value >= -0x80:
+        out += struct.pack('>Bb', 0xd0, value)
+    elif value >= -0x8000:
+        out += struct.pack('>Bh', 0xd1, value)
+    elif value >= -0x80000000:
+        out += struct.pack('>Bi', 0xd2, value)
+    elif value >= -(1 << 63):
+        out += struct.pack('>Bq', 0xd3, value)
+    else:
+        raise ValueError(f"Entero fuera del rango de MessagePack (64 bits): {value}")
+
+
+def _pack_str(value, out, key):
+    if key in BASE64_KEYS:
+        try:
+            raw = base64.b64decode(value, validate=True)
+        except (binascii.Error, ValueError):
+            raw = None
+        if raw is not None and base64.b64encode(raw).decode('ascii') == value:
+            _pack_ext(EXT_BASE64, raw, out)
+            return
+    data = value.encode('utf-8')
+    size = len(data)
+    if size < 32:
+        out.append(0xa0 | size)
+    elif size < 0x100:
+        out += struct.pack('>BB', 0xd9, size)
+    elif size < 0x10000:
+        out += struct.pack('>BH', 0xda, size)
+    else:
+        out += struct.pack('>BI', 0xdb, size)
+    out += data
+
+
+def _pack(value, out, key=None):
+    """
+    Serializa un valor al final de out
+
+    Raises:
+        TypeError: Si el valor (o algo que contiene) no es serializable
+        ValueError: Si un entero no cabe en 64 bits
+    """
+    kind = type(value)
+    if kind is int:
+        if 0 <= value < 0x80:
+            out.append(value)
+        else:
+            _pack_int(value, out)
+    elif kind is str:
+        _pack_str(value, out, key)
+    elif kind is dict:
+        size = len(value)
+        if size < 16:
+            out.append(0x80 | size)
+        elif size < 0x10000:
+            out += struct.pack('>BH', 0xde, size)
+        else:
+            out += struct.pack('>BI', 0xdf, size)
+        for item_key, item in value.items():
+            # Claves cortas y enteros pequeños, los casos más comunes, sin otra llamada
+            if type(item_key) is str and len(item_key) < 32 and item_key.isascii():
+                out.append(0xa0 | len(item_key))
+                out += item_key.encode('ascii')
+            else:
+                _pack(item_key, out)
+            if type(item) is int and 0 <= item < 0x80:
+                out.append(item)
+            else:
+                _pack(item, out, item_key)
+    elif value is None:
+        out.append(0xc0)
+    elif value is True:
+        out.append(0xc3)
+    elif value is False:
+        out.append(0xc2)
+    elif isinstance(value, int):
+        _pack_int(int(value), out)
+    elif isinstance(value, float):
+        out += struct.pack('>Bd', 0xcb, value)
+    elif isinstance(value, str):
+        _pack_str(value, out, key)
+    elif isinstance(value, (bytes, bytearray)):
+        size = len(value)
+        if size < 0x100:
+            out += struct.pack('>BB', 0xc4, size)
+        elif size < 0x10000:
+            out += struct.pack('>BH', 0xc5, size)
+        else:
+            out += struct.pack('>BI', 0xc6, size)
+        out += value
+    elif isinstance(value, (list, tuple)):
+        if key in BITMAP_KEYS:
+            bitmap = _as_bitmap(value)
+            if bitmap is not None:
+                _pack_ext(EXT_BITMAP, bitmap, out)
+                return
+        if value and all(type(n) is int and 0 <= n < 0x100 for n in value):
+            _pack_ext(EXT_NUMBERS, bytes(value), out)
+            return
+        size = len(value)
+        if size < 16:
+            out.append(0x90 | size)
+        elif size < 0x10000:
+            out += struct.pack('>BH', 0xdc, size)
+        else:
+            out += struct.pack('>BI', 0xdd, size)
+        for item in value:
+            _pack(item, out)
+    elif isinstance(value, dict):
+        _pack(dict(value), out, key)
+    else:
+        raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+_FIXED = {
+    0xcc: struct.Struct('>B'), 0xcd: struct.Struct('>H'), 0xce: struct.Struct('>I'), 0xcf: struct.Struct('>Q'),
+    0xd0: struct.Struct('>b'), 0xd1: struct.Struct('>h'), 0xd2: struct.Struct('>i'), 0xd3: struct.Struct('>q'),
+    0xca: struct.Struct('>f'), 0xcb: struct.Struct('>d'),
+}
+_LENGTHS = {
+    0xc4: 1, 0xc5: 2, 0xc6: 4,  # bin
+    0xd9: 1, 0xda: 2, 0xdb: 4,  # str
+    0xdc: 2, 0xdd: 4,  # array
+    0xde: 2, 0xdf: 4,  # map
+    0xc7: 1, 0xc8: 2, 0xc9: 4,  # ext
+}
+_FIXEXT = {0xd4: 1, 0xd5: 2, 0xd6: 4, 0xd7: 8, 0xd8: 16}
+
+
+def _unpack_ext(ext_type, payload):
+    if ext_type == EXT_NUMBERS:
+        return list(payload)
+    if ext_type == EXT_BITMAP:
+        mask = int.from_bytes(payload, 'little')
+        return [bit + 1 for bit in range(mask.bit_length()) if mask >> bit & 1]
+    if ext_type == EXT_BASE64:
+        return base64.b64encode(payload).decode('ascii')
+    raise ValueError(f"Tipo de extensión desconocido: {ext_type}")
+
+
+# Los lectores no comprueban el final de data: un índice fuera de rango (IndexError,
+# struct.error) o un offset final mayor que el frame se traducen en decode a ValueError
+
+
+def _unpack(data, offset):
+    head = data[offset]
+    offset += 1
+    if head < 0x80:
+        return head, offset
+    if head < 0xc0:
+        if head < 0x90:
+            return _unpack_map(data, offset, head & 0x0f)
+        if head < 0xa0:
+            return _unpack_array(data, offset, head & 0x0f)
+        end = offset + (head & 0x1f)
+        return data[offset:end].decode('utf-8'), end
+    if head >= 0xe0:
+        return head - 0x100, offset
+    if head == 0xc0:
+        return None, offset
+    if head == 0xc2:
+        return False, offset
+    if head == 0xc3:
+        return True, offset
+    if head in _FIXED:
+        fmt = _FIXED[head]
+        return fmt.unpack_from(data, offset)[0], offset + fmt.size
+    if head in _FIXEXT:
+        end = offset + 1 + _FIXEXT[head]
+        return _unpack_ext(data[offset], data[offset + 1:end]), end
+    if head in _LENGTHS:
+        width = _LENGTHS[head]
+        size = int.from_bytes(data[offset:offset + width], 'big')
+        offset += width
+        if head in (0xdc, 0xdd):
+            return _unpack_array(data, offset, size)
+        if head in (0xde, 0xdf):
+            return _unpack_map(data, offset, size)
+        if head in (0xc7, 0xc8, 0xc9):
+            end = offset + 1 + size
+            return _unpack_ext(data[offset], data[offset + 1:end]), end
+        end = offset + size
+        raw = data[offset:end]
+        return (raw.decode('utf-8') if head >= 0xd9 else raw), end
+    raise ValueError(f"Byte de formato no válido: 0x{head:02x}")
+
+
+def _unpack_array(data, offset, size):
+    items = []
+    for _ in range(size):
+        item, offset = _unpack(data, offset)
+        items.append(item)
+    return items, offset
+
+
+def _unpack_map(data, offset, size):
+    result = {}
+    for _ in range(size):
+        # Claves fixstr y valores enteros pequeños o fixstr, los casos más comunes, sin otra llamada
+        head = data[offset]
+        if 0xa0 <= head < 0xc0:
+            end = offset + 1 + (head & 0x1f)
+            key = data[offset + 1:end].decode('utf-8')
+            offset = end
+        else:
+            key, offset = _unpack(data, offset)
+        head = data[offset]
+        if head < 0x80:
+            result[key] = head
+            offset += 1
+        elif 0xa0 <= head < 0xc0:
+            end = offset + 1 + (head & 0x1f)
+            result[key] = data[offset + 1:end].decode('utf-8')
+            offset = end
+        else:
+            result[key], offset = _unpack(data, offset)
+    return result, offset
+
+
+def join_frames(frames, codec='json'):
+    """
+    Une varios mensajes ya serializados en un único frame
+
+    El frame agrupado es una lista de mensajes en el nivel superior (ningún mensaje
+    individual es una lista), así que el sobre cuesta 1-2 bytes y los mensajes se
+    concatenan ya codificados, sin volver a serializarlos.
+
+    Args:
+        frames: Lista de frames producidos por encode con el mismo códec
+        codec: 'json' o 'binary'
+    """
+    if codec == 'binary':
+        size = len(frames)
+        if size < 16:
+            header = bytes([0x90 | size])
+        elif size < 0x10000:
+            header = struct.pack('>BH', 0xdc, size)
+        else:
+            header = struct.pack('>BI', 0xdd, size)
+        return header + b''.join(frames)
+    return '[' + ','.join(frames) + ']'
+
+
+def iter_messages(decoded):
+    """Recorre los mensajes de un frame decodificado (una lista si venían agrupados)"""
+    return decoded if isinstance(decoded, list) else [decoded]